@@ -8,6 +8,7 @@ from chalicelib.src.reports.jobs.load_online_report.methods import handle_load_o
 from chalicelib.src.publications.jobs.handle_action.methods import handle_publication_processing_request
 from chalicelib.src.publications.jobs.download_excel.methods import handle_publication_download_request
 from chalicelib.src.query_engine.jobs.execute_simple_query.methods import handle_simple_query_request
+from chalicelib.src.query_engine.jobs.execute_simple_query.queries import get_simple_query_cache_statistics
 from chalicelib.src.query_engine.jobs.execute_complex_query.methods import handle_complex_query_request
 from chalicelib.src.qc_analytics.jobs.recalculations_report.methods import handle_recalculations_report_request
 from chalicelib.src.qc_analytics.jobs.download_recalculations_excel.methods import handle_recalculations_excel_download_request
@@ -168,6 +169,13 @@ report_id_input_validation = {
     }
 }
 
+stream_input_validation = {
+    "stream": {
+        "required": False,
+        "type": bool
+    },
+}
+
 report_type_id_input_validation = {
     "report_type_id": {
         "required": True,
@@ -325,6 +333,16 @@ def welcome():
     )
 
 
+@app_base.route("/metadata-cache-statistics", methods=["GET"])
+def metadata_cache_statistics_endpoint():
+    return jsonify(db_methods.get_metadata_cache_statistics()), 200
+
+
+@app_base.route("/simple-query-cache-statistics", methods=["GET"])
+def simple_query_cache_statistics_endpoint():
+    return jsonify(get_simple_query_cache_statistics()), 200
+
+
 # ===================== SOURCE FILE VALIDATION =====================
 
 
@@ -527,6 +545,7 @@ def load_online_report_endpoint():
         constraints.update(report_type_id_input_validation)
         constraints.update(user_id_input_validation)
         constraints.update(gwp_input_validation)
+        constraints.update(stream_input_validation)
         input_violations = assert_parameter_constraints(
             parameters,
             constraints,
@@ -539,7 +558,8 @@ def load_online_report_endpoint():
             int(parameters["report_id"]),
             int(parameters["report_type_id"]),
             int(parameters["user_id"]),
-            None if "gwp" not in parameters else parameters["gwp"]
+            None if "gwp" not in parameters else parameters["gwp"],
+            "stream" in parameters and parameters["stream"].upper() == "TRUE"
         )
     except Exception:
         pgdb_connection.rollback()
@@ -1,3 +1,5 @@
+DB_SCHEMA = "ggds_invdb" # schema of the application tables and query functions
+
 DB_TABLES = {
     "ACTIVITY_KEY": "ggds_invdb.activity_key",
     "CALCULATION_FACTOR": "ggds_invdb.calculation_factor",
@@ -96,6 +98,7 @@ EARLIEST_REPORTING_YEAR = 1990
 EARLIEST_PUBLICATION_YEAR = 2014
 
 QUERIES_PER_REQUEST = 10 # used for batch processing queries for reports
+SIMPLE_QUERIES_PER_REQUEST = 100 # used for batch processing simple queries in the query engine (one set-based statement per query function and batch)
 QUERY_TYPES = {
     "COMPLEX": {"name": "complex", 
                 "time_series_name": "emissions"},
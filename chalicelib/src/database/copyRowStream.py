@@ -0,0 +1,57 @@
+"""read-only file-like object that feeds rows to COPY ... FROM STDIN in postgres' text format.
+Rows are pulled from the input iterable only as the server asks for more data, so callers can
+pass a generator and never hold the whole payload (or one giant SQL string) in memory"""
+import itertools
+
+
+class CopyRowStream:
+    NULL = "\\N"
+    ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+    def __init__(self, rows):
+        """rows: iterable of tuples/lists, one value per copied column. None is written as NULL"""
+        self._lines = map(self.format_row, rows)
+        self._buffer = ""
+        self.row_count = 0
+
+    @classmethod
+    def from_value_chunks(cls, chunks):
+        """streams a single row with a single (large) text value that arrives in chunks, e.g. from an
+        incremental JSON encoder, so the whole value is never held in memory at once"""
+        stream = cls(())
+        stream._lines = itertools.chain((chunk.translate(cls.ESCAPES) for chunk in chunks), ("\n",))
+        stream.row_count = 1
+        return stream
+
+    @classmethod
+    def format_value(cls, value) -> str:
+        if value is None:
+            return cls.NULL
+        return str(value).translate(cls.ESCAPES)
+
+    def format_row(self, row) -> str:
+        self.row_count += 1
+        return "\t".join([self.format_value(value) for value in row]) + "\n"
+
+    def read(self, size: int = -1) -> str:
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while size is None or size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+
+        data = "".join(chunks)
+        if size is None or size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size: int = -1) -> str:
+        if "\n" not in self._buffer:
+            self._buffer += next(self._lines, "")
+        line, separator, self._buffer = self._buffer.partition("\n")
+        return line + separator
@@ -0,0 +1,31 @@
+"""stand-in for a database resource (a connection or a connection pool) that is only created when it is first used.
+Modules keep holding the stand-in from import time, so importing them (e.g. in a spawned worker process, which
+re-imports the service's modules) opens nothing, and the resource is created with the settings in effect at first use"""
+import threading
+
+
+class LazyResource:
+
+    def __init__(self, factory):
+        """factory: function without arguments that creates the resource"""
+        self._factory = factory
+        self._resource = None
+        self._lock = threading.Lock()
+
+    def get_resource(self):
+        """returns the resource, creating it first if it doesn't exist yet"""
+        if self._resource is None:
+            with self._lock:
+                if self._resource is None:
+                    self._resource = self._factory()
+        return self._resource
+
+    def is_created(self) -> bool:
+        return self._resource is not None
+
+    def __getattr__(self, name):
+        # only called for attributes not found on the stand-in itself, i.e. those of the resource
+        return getattr(self.get_resource(), name)
+
+    def __repr__(self):
+        return f"<LazyResource Object: {self._resource if self.is_created() else 'not created yet'}>"
@@ -0,0 +1,76 @@
+import threading
+import time
+
+"""in-process cache for dim table metadata shared across requests.
+Every entry remembers the tables it was built from and their version at load time. Within the TTL
+an entry is served without touching the database; once the TTL lapses, one cheap version query
+decides whether the entry is revalidated (tables unchanged) or reloaded (tables changed)"""
+class MetadataCache:
+
+    def __init__(self, ttl_seconds: float, fetch_table_versions):
+        """ttl_seconds: how long an entry is trusted before its tables' versions are checked again
+        fetch_table_versions: callable taking a list of table names and returning {table name: version}"""
+        self._ttl_seconds = ttl_seconds
+        self._fetch_table_versions = fetch_table_versions
+        self._entries = {}  # key -> [value, tables, versions, checked_at]
+        self._key_locks = {}  # key -> lock held while the key's entry is revalidated or reloaded
+        self._lock = threading.RLock()  # guards the dicts and counters only, never held during database calls
+        self._statistics = {"hits": 0, "misses": 0, "revalidations": 0}
+
+    def _get_fresh_entry(self, key, now: float):
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[3] < self._ttl_seconds:
+            self._statistics["hits"] += 1
+            return entry
+        return None
+
+    def get(self, key, tables: [str], loader):
+        """returns the cached value for the key, calling loader() to (re)build it when it is
+        missing or any of its tables changed since it was loaded. The version query and loader() 
+        run outside of the cache-wide lock, so only lookups of the same key wait on them"""
+        if self._ttl_seconds <= 0:
+            with self._lock:
+                self._statistics["misses"] += 1
+            return loader()
+
+        with self._lock:
+            entry = self._get_fresh_entry(key, time.monotonic())
+            if entry is not None:
+                return entry[0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # another thread may have refreshed the entry while this one waited for the key
+            with self._lock:
+                entry = self._get_fresh_entry(key, time.monotonic())
+                if entry is not None:
+                    return entry[0]
+                entry = self._entries.get(key)
+
+            now = time.monotonic()
+            versions = self._fetch_table_versions(tables)
+            if entry is not None and versions == entry[2]:
+                with self._lock:
+                    entry[3] = now
+                    self._statistics["hits"] += 1
+                    self._statistics["revalidations"] += 1
+                return entry[0]
+
+            value = loader()
+            with self._lock:
+                self._statistics["misses"] += 1
+                self._entries[key] = [value, tuple(tables), versions, now]
+            return value
+
+    def get_statistics(self) -> dict:
+        """returns the hit/miss counters along with the hit rate and the number of cached entries"""
+        with self._lock:
+            lookups = self._statistics["hits"] + self._statistics["misses"]
+            return {
+                **self._statistics,
+                "hit_rate": self._statistics["hits"] / lookups if lookups > 0 else None,
+                "entries": len(self._entries),
+            }
+
+    def __repr__(self):
+        return f"<MetadataCache Object: {self.get_statistics()}>"
@@ -3,8 +3,15 @@ import psycopg2
 import chalicelib.src.general.globals as invdb_globals
 import chalicelib.src.general.helpers as helpers
 from chalicelib.src.database.dbPoolConfigurator import DbPoolConfigurator
+from chalicelib.src.database.metadataCache import MetadataCache
+from chalicelib.src.database.copyRowStream import CopyRowStream
+from chalicelib.src.database.lazyResource import LazyResource
+from chalicelib.src.general.models.DimensionIndex import DimensionIndex
+from chalicelib.src.general.models.TimeAxis import TimeAxis
 import chalicelib.src.database.methods as db_methods
+import threading
 import time
+import weakref
 
 def open_connection_to_postgres_db():
     host = (
@@ -20,7 +27,8 @@ def open_connection_to_postgres_db():
     return connection 
 
 
-pgdb_connection = open_connection_to_postgres_db()
+# opened on first use, so importing the service's modules (e.g. in spawned worker processes) doesn't connect to the database
+pgdb_connection = LazyResource(open_connection_to_postgres_db)
 
 
 def get_pgdb_connection():
@@ -44,7 +52,7 @@ def test_connection_to_postgres_db():
 
 
 # common code that can be used for all get queries
-db_pool = DbPoolConfigurator()
+db_pool = LazyResource(DbPoolConfigurator) # set up on first use, like pgdb_connection
 
 def get_query_results(query, *vars):
     conn = db_pool.get_connection()
@@ -119,15 +127,175 @@ def perform_query_update(query, *vars) -> None:
         if conn:
             db_pool.return_connection(conn)
 
+def fetch_table_versions(tables: [str]) -> {str: tuple}:
+    """returns a version for each of the (schema qualified) tables: its row count and the sum of its rows' 
+    transaction ids (xmin), which changes with every committed insert, update or delete as soon as it is
+    visible (unlike the statistics counters of pg_stat_user_tables, which are flushed with a delay). 
+    The dim tables are small, so scanning them once per TTL is cheap"""
+    query = " UNION ALL ".join(
+        f"SELECT '{table}', count(*), coalesce(sum(xmin::text::bigint), 0) FROM {table}" for table in tables
+    )
+    results = get_query_results(query)
+    versions = {result[0]: (result[1], result[2]) for result in results} if results is not None else {}
+    return {table: versions.get(table) for table in tables}
+
+
+# cache for dim table metadata, see MetadataCache. Entries are checked against the table versions once the TTL lapses
+metadata_cache = MetadataCache(invdb_globals.metadata_cache_ttl_seconds, fetch_table_versions)
+
+
+def get_metadata_cache_statistics() -> dict:
+    """returns the hit/miss statistics of the dim table metadata cache"""
+    return metadata_cache.get_statistics()
+
+
+def copy_rows_into_table(cursor, table: str, rows, columns: [str] = None, on_conflict: str = None) -> int:
+    """streams the rows into the table with COPY ... FROM STDIN on the given cursor (the caller commits).
+    rows can be any iterable (e.g. a generator), with one value per column (or per table column if
+    columns isn't given). COPY can't resolve conflicts, so if an on_conflict clause (e.g. 
+    "ON CONFLICT (crt_uid) DO NOTHING") is given, the rows are copied into a temporary staging table 
+    first and moved over with a single INSERT ... SELECT. Returns the number of rows sent."""
+    column_list = f" ({', '.join(columns)})" if columns else ""
+    stream = CopyRowStream(rows)
+    if on_conflict is None:
+        cursor.copy_expert(f"COPY {table}{column_list} FROM STDIN", stream)
+        return stream.row_count
+
+    staging_table = f"copy_staging_{table.split('.')[-1]}"
+    # the staging table is dropped again below, or discarded by the caller's rollback on errors
+    cursor.execute(f"CREATE TEMP TABLE {staging_table} (LIKE {table} INCLUDING DEFAULTS)")
+    cursor.copy_expert(f"COPY {staging_table}{column_list} FROM STDIN", stream)
+    cursor.execute(
+        f"""INSERT INTO {table}{column_list}
+            SELECT {', '.join(columns) if columns else '*'} FROM {staging_table}
+            {on_conflict}"""
+    )
+    cursor.execute(f"DROP TABLE {staging_table}")
+    return stream.row_count
+
+
+def perform_copy(table: str, rows, columns: [str] = None, on_conflict: str = None) -> None:
+    """does the same as copy_rows_into_table() on a pooled connection and commits, 
+    reporting errors the same way perform_query() does."""
+    conn = db_pool.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            row_count = copy_rows_into_table(cursor, table, rows, columns, on_conflict)
+            conn.commit()
+            helpers.tprint(f"Copied {row_count} rows into {table}.")
+    except Exception as e:
+        conn.rollback()
+        print(
+            f"""An error occurred while copying rows into a table. See details below: 
+            TABLE:      {table}
+            COLUMNS:    {columns}
+            ERROR:      {e}""")
+    finally:
+        if conn:
+            db_pool.return_connection(conn)
+
+
+# argument types of the query functions, see fetch_query_function_argument_types
+query_function_argument_types = {}
+# names of the statements prepared on each connection, see execute_query_function_set
+prepared_statement_names = weakref.WeakKeyDictionary()
+prepared_statements_lock = threading.Lock()
+
+
+def fetch_query_function_argument_types(function_name: str, argument_count: int) -> tuple:
+    """returns the argument types (e.g. ("integer", "integer", "text")) of the ggds_invdb function with the
+    given name and number of arguments, or None if there is no such function or if several overloads of it take
+    that number of arguments (which one a call resolves to depends on the types of its arguments)"""
+    key = (function_name, argument_count)
+    if key not in query_function_argument_types:
+        results = get_query_results(
+            f"""SELECT p.proargtypes::regtype[]::text[]
+                FROM pg_proc p
+                    JOIN pg_namespace n ON n.oid = p.pronamespace
+                WHERE n.nspname = %s AND p.proname = %s AND p.pronargs = %s""",
+            (db_constants.DB_SCHEMA, function_name, argument_count),
+        )
+        if not results:
+            return None
+        query_function_argument_types[key] = tuple(results[0][0]) if len(results) == 1 else None
+    return query_function_argument_types[key]
+
+
+def execute_query_function_set(connection, function_name: str, leading_arguments: list, keyed_arguments: [tuple], key_alias: str, key_type: str, order_by: [str]) -> [tuple]:
+    """calls the ggds_invdb query function once per keyed argument tuple in a single set-based statement:
+    the keys and arguments are bound as arrays, unnested and joined LATERAL to the function, i.e. 
+        SELECT q.<key_alias>, f.* FROM unnest(keys, arguments...) q CROSS JOIN LATERAL ggds_invdb.<function_name>(leading arguments, q.arguments...) f
+    The statement is prepared on the connection the first time it is used for the function, so it is 
+    planned once per connection instead of once per batch, whatever the number of keyed argument tuples.
+    input:  leading_arguments: the arguments shared by all the calls (e.g. [pub_year_id, layer_id])
+            keyed_arguments: list of tuples ([0]: key, [1:]: the remaining arguments of one call, all of the same length)
+            key_type: the SQL type of the keys, order_by: the function's result columns to sort by after the key
+    output: the result rows, each prefixed with the key of the call it came from. Returns None (nothing is executed) 
+            if the function can't be called this way, i.e. no function (or more than one overload) takes that number of 
+            arguments, or an argument is an SQL expression (contains "::") rather than a value"""
+    argument_count = len(keyed_arguments[0]) - 1
+    if any(isinstance(argument, str) and "::" in argument for arguments in keyed_arguments for argument in arguments[1:]):
+        return None
+    argument_types = fetch_query_function_argument_types(function_name, len(leading_arguments) + argument_count)
+    if argument_types is None:
+        return None
+
+    # the per-call arguments are passed as text and cast to the function's argument types by the statement
+    argument_columns = [f"argument_{i + 1}" for i in range(argument_count)]
+    statement_name = f"query_set_{function_name}_{len(leading_arguments) + argument_count}_{key_type.replace(' ', '_')}"
+    parameter_types = list(argument_types[:len(leading_arguments)]) + [f"{key_type}[]"] + ["text[]"] * argument_count
+    function_arguments = [f"${i + 1}" for i in range(len(leading_arguments))] + [
+        f"q.{column}::{argument_type}" for column, argument_type in zip(argument_columns, argument_types[len(leading_arguments):])
+    ]
+    array_parameters = [f"${len(leading_arguments) + i + 1}" for i in range(argument_count + 1)]
+    statement = f"""SELECT q."{key_alias}", f.*
+                    FROM unnest({', '.join(array_parameters)}) AS q("{key_alias}"{''.join([f', {column}' for column in argument_columns])})
+                        CROSS JOIN LATERAL {db_constants.DB_SCHEMA}.{function_name}({', '.join(function_arguments)}) AS f
+                    ORDER BY q."{key_alias}"{''.join([f', f.{column}' for column in order_by])}"""
+
+    keys = [arguments[0] for arguments in keyed_arguments]
+    argument_arrays = [
+        [None if argument is None or (isinstance(argument, str) and argument.upper() == "NULL") else str(argument) for argument in column_values]
+        for column_values in zip(*[arguments[1:] for arguments in keyed_arguments])
+    ] if argument_count > 0 else []
+
+    with connection.cursor() as cursor:
+        with prepared_statements_lock:
+            if statement_name not in prepared_statement_names.setdefault(connection, set()):
+                cursor.execute(f"""PREPARE {statement_name}({', '.join(parameter_types)}) AS {statement}""")
+                prepared_statement_names[connection].add(statement_name)
+        cursor.execute(
+            f"""EXECUTE {statement_name}({', '.join(['%s'] * len(parameter_types))})""",
+            list(leading_arguments) + [keys] + argument_arrays,
+        )
+        return cursor.fetchall()
+
+
 def get_time_series_with_ids_by_rptyr(reporting_year: int) -> [int]:
     """e.g. input 2024
-    output {1: 1990, 2: 1991, ...]"""
-    max_time_series = fetch_max_time_series_by_reporting_year(reporting_year)
-    query = f"""
-        SELECT year, year_id
-        FROM {db_constants.DB_TABLES["DIM_TIME_SERIES"]}
-        where year <= {max_time_series}"""
-    return db_methods.get_query_results(query)
+    output [(1990, 1), (1991, 2), ...]"""
+    return fetch_time_axis(reporting_year).get_years_with_ids()
+
+
+def fetch_time_axis(reporting_year: int) -> TimeAxis:
+    """returns the immutable TimeAxis of the reporting year (its years up to the max time series and their 
+    year_ids), cached alongside the other dim table metadata and shared across threads"""
+    def load_time_axis() -> TimeAxis:
+        max_time_series = fetch_max_time_series_by_reporting_year(reporting_year)
+        cursor = pgdb_connection.cursor()
+        cursor.execute(
+            f"""SELECT year, year_id
+                FROM {db_constants.DB_TABLES["DIM_TIME_SERIES"]}
+                WHERE year <= {max_time_series}
+                ORDER BY year"""
+        )
+        return TimeAxis(reporting_year, max_time_series, cursor.fetchall())
+
+    return metadata_cache.get(
+        ("time_axis", reporting_year),
+        [db_constants.DB_TABLES["DIM_PUBLICATION_YEAR"], db_constants.DB_TABLES["DIM_TIME_SERIES"]],
+        load_time_axis,
+    )
 
 
 def fetch_dim_table_validation_values(case_insensitive=False) -> {str: list}:
@@ -147,6 +315,21 @@ def fetch_dim_table_validation_values(case_insensitive=False) -> {str: list}:
     return validation_values
 
 
+def fetch_dimension_index() -> DimensionIndex:
+    """returns an immutable DimensionIndex holding the name to foreign key mappings of every 
+    dim table in DIM_TABLE_VALUE_MAPPINGS (shared by source file validation and loading)"""
+    def load_dimension_index() -> DimensionIndex:
+        dim_table_rows = {}
+        cursor = pgdb_connection.cursor()
+        for dim_table in db_constants.DIM_TABLE_VALUE_MAPPINGS:
+            cursor.execute(f"""SELECT {dim_table[2]}, {dim_table[3]} FROM {dim_table[1]}""")
+            dim_table_rows[dim_table[0]] = cursor.fetchall()
+        return DimensionIndex(dim_table_rows)
+
+    dim_tables = [dim_table[1] for dim_table in db_constants.DIM_TABLE_VALUE_MAPPINGS]
+    return metadata_cache.get("dimension_index", dim_tables, load_dimension_index)
+
+
 def fetch_dim_table_id_to_name_mappings() ->  {str: {int: str}}:
     """returns information needed to convert foreign keys (id values) into their respective string name values (e.g. ghg_id = 1 --> ghg_longname = 'Carbon Dioxide')"""
     validation_values = {}
@@ -163,14 +346,21 @@ def fetch_dim_table_id_to_name_mappings() ->  {str: {int: str}}:
 
 def fetch_query_formula_name_mappings(by_query_formula_id:bool=False, include_parameters=False) -> dict:
     """returns the view_name and formula_prefix for all query formulas in the report"""
-    cursor = pgdb_connection.cursor()
-    cursor.execute(f"""SELECT formula_prefix, view_name, query_formula_id {'' if not include_parameters else ', parameters'}
-                    FROM {db_constants.DB_TABLES["DIM_QUERY_FORMULA"]}
-                    WHERE formula_type = 'emission'""")
-    results = cursor.fetchall()
-    # return as a dict where the formula prefix is the key and parameter list are the value
-    mappings = {result[2] if by_query_formula_id else result[0]: (result[1] if not include_parameters else (result[1], result[3])) for result in results}
-    return mappings
+    def load_query_formula_name_mappings() -> dict:
+        cursor = pgdb_connection.cursor()
+        cursor.execute(f"""SELECT formula_prefix, view_name, query_formula_id {'' if not include_parameters else ', parameters'}
+                        FROM {db_constants.DB_TABLES["DIM_QUERY_FORMULA"]}
+                        WHERE formula_type = 'emission'""")
+        results = cursor.fetchall()
+        # return as a dict where the formula prefix is the key and parameter list are the value
+        return {result[2] if by_query_formula_id else result[0]: (result[1] if not include_parameters else (result[1], result[3])) for result in results}
+
+    mappings = metadata_cache.get(
+        ("query_formula_name_mappings", by_query_formula_id, include_parameters),
+        [db_constants.DB_TABLES["DIM_QUERY_FORMULA"]],
+        load_query_formula_name_mappings,
+    )
+    return dict(mappings) # copied so that callers can't alter the cached entry
 
 
 def fetch_dim_state_list() -> [str]:
@@ -199,13 +389,18 @@ def fetch_pub_year_id(reporting_year: int) -> int:
 def fetch_max_time_series_by_reporting_year(reporting_year: int) -> int:
     """returns integer of the latest reporting year according to the max
     "max_time_series" value in the dim_publication_year table of the postgres DB."""
-    cursor = pgdb_connection.cursor()
-    cursor.execute(
-        f"SELECT max_time_series FROM {db_constants.DB_TABLES['DIM_PUBLICATION_YEAR']} WHERE pub_year = {reporting_year}"
+    def load_max_time_series() -> int:
+        cursor = pgdb_connection.cursor()
+        cursor.execute(
+            f"SELECT max_time_series FROM {db_constants.DB_TABLES['DIM_PUBLICATION_YEAR']} WHERE pub_year = {reporting_year}"
+        )
+        return cursor.fetchone()[0]
+
+    return metadata_cache.get(
+        ("max_time_series", reporting_year), 
+        [db_constants.DB_TABLES["DIM_PUBLICATION_YEAR"]], 
+        load_max_time_series,
     )
-    results = cursor.fetchone()[0]
-    max_time_series = results
-    return max_time_series
 
 
 def get_time_series_by_reporting_year(reporting_year_id: int) -> [int]:
@@ -263,17 +458,24 @@ def wait_on_rollup_tables_refresh(reporting_year: int, layer_id: int):
 
 
 def get_ghg_to_gwp_mappings_by_year(reporting_year: int, ghg_column_select: str="ghg_longname"):
-    query = f"""SELECT gwp_column 
-                FROM {db_constants.DB_TABLES["DIM_PUBLICATION_YEAR"]} 
-                WHERE pub_year = {reporting_year} 
-                LIMIT 1;"""
-    gwp_column = db_methods.get_query_results(query)[0][0]
+    def load_ghg_to_gwp_mappings() -> dict:
+        query = f"""SELECT gwp_column 
+                    FROM {db_constants.DB_TABLES["DIM_PUBLICATION_YEAR"]} 
+                    WHERE pub_year = {reporting_year} 
+                    LIMIT 1;"""
+        gwp_column = db_methods.get_query_results(query)[0][0]
 
-    query = f"""SELECT {ghg_column_select}, {gwp_column} 
-                FROM {db_constants.DB_TABLES["DIM_GHG"]}"""
-    gwp_mappings = db_methods.get_query_results(query)
-    dict_mapping = helpers.tuples_to_dict(gwp_mappings)
-    return dict_mapping
+        query = f"""SELECT {ghg_column_select}, {gwp_column} 
+                    FROM {db_constants.DB_TABLES["DIM_GHG"]}"""
+        gwp_mappings = db_methods.get_query_results(query)
+        return helpers.tuples_to_dict(gwp_mappings)
+
+    dict_mapping = metadata_cache.get(
+        ("ghg_to_gwp_mappings", reporting_year, ghg_column_select),
+        [db_constants.DB_TABLES["DIM_PUBLICATION_YEAR"], db_constants.DB_TABLES["DIM_GHG"]],
+        load_ghg_to_gwp_mappings,
+    )
+    return dict(dict_mapping) # copied so that callers can't alter the cached entry
 
 
 def get_ghg_to_ghg_category_mappings(ghg_column_select: str="ghg_longname"):
@@ -282,4 +484,36 @@ def get_ghg_to_ghg_category_mappings(ghg_column_select: str="ghg_longname"):
                 JOIN {db_constants.DB_TABLES["DIM_GHG_CATEGORY"]} ghg_cat ON ghg.ghg_category_id = ghg_cat.ghg_category_id"""
     ghg_category_pairs = db_methods.get_query_results(query)
     ghg_category_mapping = helpers.tuples_to_dict(ghg_category_pairs)
-    return ghg_category_mapping
\ No newline at end of file
+    return ghg_category_mapping
+
+
+# whether the columns added by publication_object_columnar_data.sql exist, see publication_columnar_data_columns_exist
+publication_columnar_data_columns = None
+
+
+def publication_columnar_data_columns_exist() -> bool:
+    """whether the publication_object table has the columnar data columns of publication_object_columnar_data.sql. Looked up once"""
+    global publication_columnar_data_columns
+    if publication_columnar_data_columns is None:
+        schema_name, table_name = db_constants.DB_TABLES["PUBLICATION_OBJECT"].split(".")
+        results = get_query_results(
+            f"""SELECT count(*)
+                FROM information_schema.columns
+                WHERE table_schema = %s AND table_name = %s AND column_name IN ('raw_data_columnar', 'refined_data_columnar')""",
+            (schema_name, table_name),
+        )
+        publication_columnar_data_columns = results is not None and results[0][0] == 2
+    return publication_columnar_data_columns
+
+
+def is_publication_columnar_data_enabled() -> bool:
+    """whether the publication raw/refined data is also stored (and read) in its columnar form, i.e. store_publication_columnar_data
+    is turned on and the columnar data columns exist"""
+    if not invdb_globals.store_publication_columnar_data:
+        return False
+    is_first_lookup = publication_columnar_data_columns is None
+    if not publication_columnar_data_columns_exist():
+        if is_first_lookup:
+            helpers.tprint("WARNING: store_publication_columnar_data is turned on, but the columns of publication_object_columnar_data.sql don't exist. Using the JSON data only.")
+        return False
+    return True
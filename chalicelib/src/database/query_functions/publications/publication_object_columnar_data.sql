@@ -0,0 +1,9 @@
+/*========================================================================================
+Columnar copies of the raw/refined data of publication objects (see publicationTable.py).
+They are written by the python service next to the JSON cells, which stay as they are.
+A NULL copy means that the JSON cell has to be read instead.
+========================================================================================*/
+
+ALTER TABLE ggds_invdb.publication_object
+    ADD COLUMN IF NOT EXISTS raw_data_columnar BYTEA,
+    ADD COLUMN IF NOT EXISTS refined_data_columnar BYTEA;
@@ -0,0 +1,46 @@
+import chalicelib.src.general.globals as invdb_globals
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import os
+
+EXECUTOR_TYPES = ("thread", "process", "serial")
+
+
+class SerialExecutor(Executor):
+    """executor that runs every submitted task immediately in the calling thread.
+    Lets the batch functions keep a single code path when parallelism is turned off"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def get_executor_type(executor_type: str = None) -> str:
+    """returns the executor type ("thread", "process" or "serial"), i.e. the given type or else the configured one.
+    "serial" is always used when invdb_globals.allow_multithreading is turned off"""
+    if not invdb_globals.allow_multithreading:
+        return "serial"
+    executor_type = executor_type or invdb_globals.executor_type
+    if executor_type not in EXECUTOR_TYPES:
+        raise ValueError(f"get_executor_type: invalid executor type '{executor_type}', expected one of {EXECUTOR_TYPES}.")
+    return executor_type
+
+
+def get_executor(max_workers: int = None, executor_type: str = None) -> Executor:
+    """returns a new executor of the given (default: the configured) type for per-file CPU work (use as a context manager).
+    In "process" mode, tasks and their arguments are pickled to worker processes, so submitted
+    functions must be module level and must not use the database: workers are spawned (not forked) so that
+    they don't inherit open connections or held locks, and they re-import the service's modules, whose database
+    connection and pool are only opened on first use (see LazyResource). A worker that did use them would open
+    its own, with the settings of a fresh import (e.g. not the ENV set by --local-prod-db)."""
+    executor_type = get_executor_type(executor_type)
+    max_workers = max_workers or os.cpu_count()
+    if executor_type == "process":
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    if executor_type == "thread":
+        return ThreadPoolExecutor(max_workers=max_workers)
+    return SerialExecutor()
@@ -24,5 +24,20 @@ print("ENVIRONMENT:", ENV)
 debug = False
 
 allow_multithreading = True
+executor_type = "thread" # either "thread", "process" (worker processes, bypasses the GIL for per-file CPU work), or "serial". "serial" is used whenever allow_multithreading is False
+source_file_validation_engine = "columnar" # either "row" (validates source files line by line) or "columnar" (vectorized over all lines)
+metadata_cache_ttl_seconds = 60 # seconds dim table metadata is reused before its tables are checked for changes (0 disables the cache)
+source_file_validation_max_workers = None # maximum number of source files validated at the same time (None: one per CPU core)
+source_file_validation_memory_budget_mb = 4096 # estimated memory the source files being validated at the same time may use
+source_file_validation_cache_size = 32 # number of validation reports kept for reuse when a source file is validated again with unchanged content, template and dim tables (0 disables the cache)
+validation_log_insert_page_size = 5000 # number of validation_log_load rows sent per INSERT statement
+validation_log_max_errors_per_field = None # only log the first N errors of each field per source file, plus a summary row counting the rest (None logs every error)
+simple_query_cache_max_entries = 50000 # number of simple query results kept in memory until the rollup tables of their year and layer are refreshed (0 disables the cache)
+online_report_query_group_workers = 4 # number of query class/type groups (e.g. simple emissions, complex QC) of an online report executed at the same time
+report_processing_max_workers = None # maximum number of reports processed at the same time, each with its own pooled connection (None: one per CPU core, capped by half of db_pooling_max_connections)
+publication_download_executor_type = "thread" # executor converting the data products of a publication download to excel, see executor_type (None: use executor_type). "process" starts a new pool of spawned workers for every download, which only pays off for large downloads
+publication_download_max_workers = None # maximum number of data products converted to excel at the same time (None: one per CPU core)
+publication_download_max_products_in_flight = None # maximum number of data products of a download held in memory at a time, i.e. being converted or waiting to be zipped (None: one per worker)
+store_publication_columnar_data = False # also store publication raw/refined data in the columnar format of publicationTable.py, and read it from there. Needs the columns added by publication_object_columnar_data.sql (ignored while they don't exist)
 db_pooling_min_connections = 1
 db_pooling_max_connections = 20
\ No newline at end of file
@@ -3,6 +3,7 @@ from fuzzywuzzy import fuzz
 from math import floor
 import datetime
 import hashlib
+import itertools
 import json
 import re
 from copy import copy
@@ -235,7 +236,9 @@ def order_portrait_json_columns(data: [dict]):
 ## keep these methods together ^^ and vv
 
 def transpose_json_to_landscape(data: [dict], time_series: [int]) -> [dict]:
-    """returns a new version of the input data structure that is in landscape format"""
+    """returns a new version of the input data structure that is in landscape format.
+    Portrait rows are grouped in a single pass on the tuple of their non-year values (no hashing or
+    stringifying of keys), with each group's year columns preallocated from the time series"""
     # input checks
     if not isinstance(data, list):
         raise TypeError(f"helpers.transpose_json_to_landscape: Error: input must be a JSON-valid array.")
@@ -249,24 +252,37 @@ def transpose_json_to_landscape(data: [dict], time_series: [int]) -> [dict]:
         raise ValueError("helpers.transpose_json_to_landscape: Error: input json array elements are missing expected attributes 'year' and/or 'weighted_quantity'.")
 
     # processing: transpose the data from portrait to landscape
-    transposed_data = {} # relates key to {emissions_key_data + time series of quantities}
+    year_columns = [f"Y{year}" for year in time_series]
+    year_positions = {year: position for position, year in enumerate(time_series)}
+    key_columns = [column for column in data[0].keys() if column not in ("year", "weighted_quantity")]
+    first_row_columns = data[0].keys()
+    transposed_data = {} # relates key to (key columns, key values, time series of quantities)
     for row in data:
-        current_data_key = generate_data_object_key(row, non_key_field_names=["year", "weighted_quantity"])
-        if current_data_key not in transposed_data: 
-            row.update({"years": {row["year"]: row["weighted_quantity"]}}) # temp attribute to isolate the year quantity attributes for ordering later
-            del row["year"]
-            del row["weighted_quantity"]
-            transposed_data.update({current_data_key: row})
-        else:
-            transposed_data[current_data_key]["years"].update({row["year"]: row["weighted_quantity"]})
-    
-    # order the attributes in each row
-    transposed_data = [{**key_rows, **{f"Y{year}": (None if year not in key_rows["years"] else key_rows["years"][year]) for year in time_series}} for key_rows in transposed_data.values()] # order the quantities
+        if row.keys() == first_row_columns:
+            row_key_columns = key_columns
+            current_data_key = tuple([row[column] for column in key_columns])
+        else: # rows with other columns are keyed on their own columns
+            row_key_columns = [column for column in row.keys() if column not in ("year", "weighted_quantity")]
+            current_data_key = (tuple(row_key_columns),) + tuple([row[column] for column in row_key_columns])
+        try:
+            key_rows = transposed_data.get(current_data_key)
+        except TypeError: # unhashable values (e.g. lists) are keyed by their digest instead
+            current_data_key = generate_data_object_key(row, non_key_field_names=["year", "weighted_quantity"])
+            key_rows = transposed_data.get(current_data_key)
+        if key_rows is None:
+            key_rows = (row_key_columns, [row[column] for column in row_key_columns], [None] * len(year_columns))
+            transposed_data[current_data_key] = key_rows
+        position = year_positions.get(row["year"])
+        if position is not None:
+            key_rows[2][position] = row["weighted_quantity"]
     
-    for row in transposed_data: # get rid of the temporary years attribute
-        del row["years"]
-
-    return transposed_data
+    # order the attributes in each row (the key values followed by the quantities in time series order)
+    landscape_data = []
+    for row_key_columns, key_values, quantities in transposed_data.values():
+        landscape_row = dict(zip(row_key_columns, key_values))
+        landscape_row.update(zip(year_columns, quantities))
+        landscape_data.append(landscape_row)
+    return landscape_data
 
 ## keep these methods together ^^ and vv
 
@@ -297,12 +313,33 @@ def transpose_json_to_portrait(data: [dict], time_series: [int]) -> [dict]:
         year_prefix = ''
 
     key_columns = [key_column_key for key_column_key in data[0].keys() if isinstance(key_column_key, str) and not (key_column_key[1:].isnumeric() if prefixed_years or lowercase_prefixed_years else key_column_key.isnumeric())]
-    transposed_data = [] 
-    for row in data:
-        for year in time_series: # create on object of refined data per row per year
-            transposed_data.append({**{key: (None if key not in row else row[key]) for key in key_columns}, **{"year": year, "weighted_quantity": (None if f"{year_prefix}{year}" not in row else row[f"{year_prefix}{year}"]) if prefixed_years else row[year]}}) # order the data columns consistently
+    # same column order as order_portrait_json_columns: the economic sector columns first, then the other key columns
+    front_columns = [column for column in ("econ_sector", "Economic Sector", "econ_subsector", "Economic SubSector") if column in key_columns]
+    key_columns = front_columns + [column for column in key_columns if column not in front_columns]
+
+    # the rows are sorted once per landscape row rather than once per (row, year). The order is the same as sorting the
+    # portrait rows on their stringified columns: by the key columns, then year, then weighted_quantity
+    rows_with_sort_keys = [([str(row.get(column)) for column in key_columns], row) for row in data]
+    rows_with_sort_keys.sort(key=lambda row_with_sort_key: row_with_sort_key[0])
+    ordered_years = sorted(time_series, key=str)
+    year_columns = [(year, f"{year_prefix}{year}" if prefixed_years else year) for year in ordered_years]
+
+    transposed_data = []
+    for _, key_group in itertools.groupby(rows_with_sort_keys, key=lambda row_with_sort_key: row_with_sort_key[0]):
+        key_rows = [row for _, row in key_group]
+        key_values = [{key: row.get(key) for key in key_columns} for row in key_rows]
+        for year, year_column in year_columns: # create on object of refined data per row per year
+            year_rows = []
+            for row, row_key_values in zip(key_rows, key_values):
+                portrait_row = row_key_values.copy()
+                portrait_row["year"] = year
+                portrait_row["weighted_quantity"] = row.get(year_column) if prefixed_years else row[year_column]
+                year_rows.append(portrait_row)
+            if len(year_rows) > 1: # rows with the same key values are ordered by their quantity
+                year_rows.sort(key=lambda portrait_row: str(portrait_row["weighted_quantity"]))
+            transposed_data += year_rows
     
-    return order_portrait_json_columns(transposed_data)
+    return transposed_data
 
 
 def convert_data_from_landscape_to_portrait(data: list[dict], max_time_series: int, custom_time_series: list[int]=None, omitted_columns=None) -> list[dict]:
@@ -311,18 +348,17 @@ def convert_data_from_landscape_to_portrait(data: list[dict], max_time_series: i
         return []
 
     time_series = custom_time_series if custom_time_series is not None else range(qc_constants.EARLIEST_REPORTING_YEAR, max_time_series + 1)
-    year_columns = [f"Y{year_value}" for year_value in time_series]
-    column_names = [key for key in data[0].keys() if key not in year_columns + omitted_columns]
+    year_columns = [(f"Y{year_value}", int(year_value)) for year_value in time_series]
+    excluded_columns = set([year_column for year_column, _ in year_columns] + (omitted_columns if omitted_columns is not None else []))
+    column_names = [key for key in data[0].keys() if key not in excluded_columns]
 
     portrait_data = []
-    for index, row in enumerate(data):
+    for row in data:
         non_year_column_data = {column: row[column] for column in column_names}
-        for year in year_columns:
-            current_portrait_row = copy(non_year_column_data)
-            try: 
-                current_portrait_row.update({"year": int(year[1:]), "weighted_quantity": row[year]})
-            except KeyError:
-                current_portrait_row.update({"year": int(year[1:]), "weighted_quantity": None})
+        for year_column, year in year_columns:
+            current_portrait_row = non_year_column_data.copy()
+            current_portrait_row["year"] = year
+            current_portrait_row["weighted_quantity"] = row.get(year_column)
             portrait_data.append(current_portrait_row)
 
-    return portrait_data
\ No newline at end of file
+    return portrait_data
@@ -53,12 +53,12 @@ class BatchValidationReport:
             if self.reports[report].get_validation_result() == qc_constants.VALIDATION_RESULTS["FAILED"]
         ]
 
-    def generate_error_list(self) -> [tuple]:
+    def generate_error_list(self, max_errors_per_field: int = None) -> [tuple]:
         """returns all the error lists of the object's constituent validation reports
-            combined into one flattened list"""
+            combined into one flattened list (see ValidationReport.generate_error_list)"""
         validation_logs = []
         for report in self.reports:
-            validation_logs += self.reports[report].generate_error_list()
+            validation_logs += self.reports[report].generate_error_list(max_errors_per_field)
 
         return validation_logs
 
@@ -0,0 +1,86 @@
+from chalicelib.src.general.helpers import full_class_name
+from types import MappingProxyType
+import hashlib
+
+# the GHG identifier columns in the order they are selected from the dim_ghg table (followed by ghg_id)
+GHG_COLUMNS = ("ghg_longname", "ghg_code", "ghg_shortname", "cas_no")
+# the GHG identifiers in the order they are checked when mapping a GHG value to its ghg_id
+GHG_IDENTIFIERS = ("ghg_code", "ghg_longname", "ghg_shortname", "cas_no")
+
+
+class DimensionIndex:
+    """immutable lookup index over the dim tables used by the source file jobs.
+    Every dimension is held as a {name: id} dict and a frozenset of names so that
+    validation (membership) and loading (foreign key mapping) are O(1) per value"""
+
+    def __init__(self, dim_table_rows: {str: [tuple]}):
+        """dim_table_rows: dict -> key: dimension name (e.g. "sector"),
+                                   value: list of (name, id) tuples. For "ghg", each tuple holds
+                                          the GHG_COLUMNS values followed by the ghg_id"""
+        ids = {}
+        for dimension, rows in dim_table_rows.items():
+            if dimension == "ghg":
+                for position, identifier in enumerate(GHG_COLUMNS):
+                    ids[identifier] = MappingProxyType({row[position]: row[len(GHG_COLUMNS)] for row in rows})
+            else:
+                ids[dimension] = MappingProxyType({row[0]: row[1] for row in rows})
+        self._set_ids(ids)
+
+    @classmethod
+    def from_ids(cls, ids: {str: dict}):
+        """builds an index directly from {dimension: {name: id}} mappings (see __reduce__)"""
+        dimension_index = cls.__new__(cls)
+        dimension_index._set_ids({dimension: MappingProxyType(dict(mapping)) for dimension, mapping in ids.items()})
+        return dimension_index
+
+    def _set_ids(self, ids: {str: MappingProxyType}):
+        object.__setattr__(self, "_ids", MappingProxyType(ids))
+        object.__setattr__(self, "_names", MappingProxyType({dimension: tuple(mapping) for dimension, mapping in ids.items()}))
+        object.__setattr__(self, "_values", MappingProxyType({dimension: frozenset(mapping) for dimension, mapping in ids.items()}))
+        object.__setattr__(self, "_ghg_values", frozenset().union(*[self._values[identifier] for identifier in GHG_IDENTIFIERS if identifier in self._values]))
+        object.__setattr__(self, "_fingerprint", hashlib.sha256(repr(sorted((dimension, tuple(mapping.items())) for dimension, mapping in ids.items())).encode()).hexdigest())
+
+    def __reduce__(self):
+        """mapping proxies can't be pickled, so indexes are sent to worker processes as plain dicts"""
+        return (DimensionIndex.from_ids, ({dimension: dict(mapping) for dimension, mapping in self._ids.items()},))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{full_class_name(self)}.__setattr__: dimension indexes are immutable.")
+
+    def get_fingerprint(self) -> str:
+        """returns a digest of the index contents (names, ids and their order), which changes whenever any dim table value does"""
+        return self._fingerprint
+
+    def get_values(self, dimension: str) -> frozenset:
+        """returns the set of valid names for the dimension (e.g. "sector" or "ghg_code")"""
+        return self._values[dimension]
+
+    def get_names(self, dimension: str) -> tuple:
+        """returns the (unique) valid names for the dimension in the order the dim table returned them"""
+        return self._names[dimension]
+
+    def contains(self, dimension: str, value) -> bool:
+        """returns whether the value is a valid name for the dimension"""
+        return value in self._values[dimension]
+
+    def get_id(self, dimension: str, value, default=None):
+        """returns the foreign key of the dimension value, or the default if it isn't found"""
+        return self._ids[dimension].get(value, default)
+
+    def get_ghg_values(self) -> frozenset:
+        """returns the set of all valid GHG identifiers (codes, long names, short names and CAS numbers)"""
+        return self._ghg_values
+
+    def contains_ghg(self, value) -> bool:
+        """returns whether the value matches any of the GHG identifiers"""
+        return value in self._ghg_values
+
+    def get_ghg_id(self, value, default=None):
+        """returns the ghg_id for the value, checking the GHG code, long name, short name and CAS number in that order"""
+        for identifier in GHG_IDENTIFIERS:
+            if value in self._values[identifier]:
+                return self._ids[identifier][value]
+        return default
+
+    def __repr__(self):
+        return f"<DimensionIndex Object: {', '.join([f'{dimension}: {len(names)}' for dimension, names in self._values.items()])}>"
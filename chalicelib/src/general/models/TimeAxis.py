@@ -0,0 +1,39 @@
+from chalicelib.src.general.helpers import full_class_name
+from types import MappingProxyType
+
+
+class TimeAxis:
+    """immutable time series of a reporting year (1990 up to its max time series) along with
+    the year to year_id mapping of the dim_time_series table. Shared across threads by the
+    query engine, so formatting query results needs no database lookups"""
+
+    def __init__(self, reporting_year: int, max_time_series: int, years_with_ids: [tuple]):
+        """years_with_ids: list of (year, year_id) tuples for every year of the time series, in year order"""
+        object.__setattr__(self, "reporting_year", reporting_year)
+        object.__setattr__(self, "max_time_series", max_time_series)
+        object.__setattr__(self, "years", tuple(year for year, _ in years_with_ids))
+        object.__setattr__(self, "year_ids", tuple(year_id for _, year_id in years_with_ids))
+        object.__setattr__(self, "year_id_keys", tuple(str(year_id) for year_id in self.year_ids))
+        object.__setattr__(self, "_year_id_keys_by_year", MappingProxyType({year: str(year_id) for year, year_id in years_with_ids}))
+        object.__setattr__(self, "zero_year_object", MappingProxyType(dict.fromkeys(self.year_id_keys, 0)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{full_class_name(self)}.__setattr__: time axes are immutable.")
+
+    def __len__(self):
+        return len(self.years)
+
+    def get_year_id_key(self, year: int) -> str:
+        """returns the year_id of the year as the string key used by the query engine's result objects, or None"""
+        return self._year_id_keys_by_year.get(year)
+
+    def get_years_with_ids(self) -> [tuple]:
+        """returns the (year, year_id) tuples of the time series"""
+        return list(zip(self.years, self.year_ids))
+
+    def new_year_object(self, value=None) -> dict:
+        """returns a new {year_id (str): value} dict covering the time series, e.g. {"1": None, "2": None, ...}"""
+        return dict.fromkeys(self.year_id_keys, value)
+
+    def __repr__(self):
+        return f"<TimeAxis Object: reporting year {self.reporting_year}, {self.years[0] if self.years else None}-{self.max_time_series}>"
@@ -13,6 +13,9 @@ CBI_ACTIVITY_MAX_LENGTH = 250
 UNITS_MAX_LENGTH = 100
 GHG_CATEGORY_MAX_LENGTH = 50
 
+# max length of the field values logged in the validation_log_load table (longer values are cut off with "...")
+VALIDATION_LOG_FIELD_VALUE_MAX_LENGTH = 250
+
 YEAR_ALPHA_VALUES = ["NE", "IE", "C", "NA", "NO"]
 
 # validation error messages
@@ -67,6 +70,8 @@ GWP_INVALID_ERROR_MSG = (
     "Error found in Row: {row_number}, Column: {column_label}."
     + f" Invalid GWP Error - only numbers or NULL are accepted."
 )
+# logged in place of the errors left out when validation_log_max_errors_per_field is set
+VALIDATION_LOG_SUMMARY_MSG = "{error_count} more errors found for Field: {field_name} between Row: {first_row_number} and Row: {last_row_number} were not logged individually."
 
 EMISSIONS_KEY_COLUMNS = [
     "sector_id",
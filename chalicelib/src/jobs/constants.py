@@ -6,6 +6,10 @@ STATUSES = {"IN_PROGRESS": "In Progress", "COMPLETE": "Complete", "ERROR": "Erro
 # source file validation info
 SOURCE_FILE_VALIDATION_NAME = "Source File Validation"
 SOURCE_FILE_VALIDATION_DESC = "Checks data validity of source files for a specified reporting year layer, and then reports errors in the validation_log_load table"
+SOURCE_FILE_VALIDATION_VALIDATED_FILE_EVENT = {
+    "name": "Validated source file",
+    "details": "Validated the source file with attachment ID {} ({} of {} files done)",
+}
 
 # source file load info
 SOURCE_FILE_LOAD_NAME = "Source File Load"
@@ -18,21 +22,9 @@ SOURCE_FILE_LOAD_FETCHING_ERRORS_EVENT = {
     "name": "Fetching validation errors",
     "details": "Fetching validation errors for source files",
 }
-SOURCE_FILE_LOAD_OPENING_FILES_EVENT = {
-    "name": "Opening the source files",
-    "details": "Opening the source files for reading and writing",
-}
-SOURCE_FILE_LOAD_REMOVING_INVALID_DATA_EVENT = {
-    "name": "Removing invalid data",
-    "details": "Omitting rows from source files where validation errors are reported",
-}
-SOURCE_FILE_LOAD_MAPPING_DATA_EVENT = {
-    "name": "Mapping data to foreign keys",
-    "details": "Exchanging data values with their foreign key values based on dim tables",
-}
-SOURCE_FILE_LOAD_GATHERING_DATA_EVENT = {
+SOURCE_FILE_LOAD_EXTRACTING_DATA_EVENT = {
     "name": "Gathering emission key and facts data",
-    "details": "Constructing the rows to be inserted into the emission_key and facts_archive tables",
+    "details": "Reading the source files once, omitting rows where validation errors are reported and mapping data values to their foreign keys to construct the emission_key and facts_archive rows",
 }
 SOURCE_FILE_LOAD_UPDATING_DATABASE_EVENT = {
     "name": "Updating the database",
@@ -127,6 +119,10 @@ LOAD_ONLINE_REPORT_CONSTRUCTING_RESPONSE_OBJECT_EVENT = {
     "name": "Constucting response object",
     "details": "Combining all query results into a single API response object",
 }
+LOAD_ONLINE_REPORT_STREAMING_RESPONSE_OBJECT_EVENT = {
+    "name": "Streaming response object",
+    "details": "Processing report queries and sending each report row as soon as all of its query results are in",
+}
 
 # publication processing info
 PUBLICATION_PROCESSING_NAME = "Publication Processing"
@@ -1,4 +1,5 @@
 from datetime import datetime
+import copy
 from chalicelib.src.database.methods import pgdb_connection
 import chalicelib.src.database.constants as db_constants
 import chalicelib.src.jobs.constants as job_constants
@@ -22,6 +23,7 @@ class Job:
         self.reporting_year = reporting_year
         self.layer_id = layer_id
         self.misc_info = misc_info # will be added to the end of event post descriptions to help identify job
+        self._connection = pgdb_connection # the connection the job's status and events are written through
         cursor = pgdb_connection.cursor()
 
         # make sure the job is listed in job_list table of database
@@ -94,7 +96,7 @@ class Job:
         else:
             update_end_time_string = ""
 
-        cursor = pgdb_connection.cursor()
+        cursor = self._connection.cursor()
         # always update the status and last_updated
         cursor.execute(
             f"""UPDATE {db_constants.DB_TABLES["JOB_STATUS"]} 
@@ -112,7 +114,7 @@ class Job:
         ]:
             self.end_time = result
 
-        pgdb_connection.commit()
+        self._connection.commit()
 
     def post_event(self, job_id_string: str, event_id_string: str, *event_details_info):
         """
@@ -128,13 +130,20 @@ class Job:
             raise ValueError(
                 f"{helpers.full_class_name(self)}.post_event: Invalid job id string or event id string."
             )
-        cursor = pgdb_connection.cursor()
+        cursor = self._connection.cursor()
         cursor.execute(
             f"""INSERT INTO {db_constants.DB_TABLES["JOB_EVENT"]} (job_status_id, event_name, event_details, created_date)
                 VALUES ({self.status_id}, '{event_info["name"]}', '{event_info["details"].format(*event_details_info) + (" (" + ", ".join([f"{key}: {value}" for key, value in self.misc_info.items()]) + ")" if self.misc_info is not None else "")}', CURRENT_TIMESTAMP)
             """
         )
-        pgdb_connection.commit()
+        self._connection.commit()
+
+    def with_connection(self, connection):
+        """returns a view of the job that writes its status updates and events through the given connection 
+        (e.g. a pooled connection owned by a worker thread), so concurrent workers don't share one transaction"""
+        job_view = copy.copy(self)
+        job_view._connection = connection
+        return job_view
 
     def get_runtime(self):
         """returns a string representing the runtime of the job in HH:MM:SS format.
@@ -0,0 +1,3 @@
+DOWNLOAD_FILE_CHUNK_SIZE = 1024 * 1024 # bytes of each excel file copied into the streamed .zip download at a time
+PUBLICATION_DATA_ELEMENTS_PER_CHUNK = 1000 # list elements of a raw/refined data payload encoded or decoded at a time while it is streamed to or from the database
+PUBLICATION_DATA_COPY_BUFFER_SIZE = 1024 * 1024 # characters of an encoded raw/refined data payload sent to the database per read
@@ -0,0 +1,95 @@
+import chalicelib.src.general.helpers as helpers
+from openpyxl import Workbook
+import chalicelib.src.publications.publicationData as publication_data
+import chalicelib.src.publications.publicationTable as publication_table
+import io
+
+"""conversion of publication data products to excel. Kept apart from the download job's database queries so that
+worker processes (see executors.get_executor) can import the conversion functions without opening a connection"""
+
+
+# read the columns of a the first row
+def load_json_data_to_excel_sheet(data: [dict], excel_sheet):
+    if len(data) == 0:
+        return
+
+    # define column order
+    column_order = list(data[0].keys())
+    # move econ_sector and econ_subsector to the front of the column order if present
+    if "econ_subsector" in column_order:
+        column_order = ["econ_subsector"] + [
+            col for col in column_order if col != "econ_subsector"
+        ]
+    if "econ_sector" in column_order:
+        column_order = ["econ_sector"] + [
+            col for col in column_order if col != "econ_sector"
+        ]
+
+    # write in the header row
+    excel_sheet.append(column_order)
+
+    # sort the data according to its column order (the left-most column is the primary sorting key, the 2nd column is the secondary sorting key, and so on...)
+    data.sort(
+        key=lambda x: [str(None if key not in x else x[key]) for key in column_order]
+    )
+
+    # write in the data:
+    for row in range(len(data)):
+        excel_sheet.append(
+            [
+                (None if column not in data[row] else data[row][column])
+                for column in column_order
+            ]
+        )
+
+
+def convert_single_data_product_to_excel(data_product: dict, time_series: [int]):
+    """returns a write-only Workbook of the data product (its rows are streamed to a temporary file as they are 
+    appended rather than held in memory as cells) along with the file name it is downloaded as"""
+    # Create a new write-only Workbook object
+    excel_file = Workbook(write_only=True)
+
+    data = data_product["refined_data"]
+    download_file_name = data_product["refined_tablename"]
+
+    # convert to python object (or list) if needed
+    if isinstance(data, str):
+        data = publication_data.loads(data)
+    elif isinstance(data, (bytes, bytearray)): # columnar copy of the refined data
+        data = publication_table.decode_publication_records(data)
+
+    if isinstance(data, list):  # single tab JSON
+        sheet = excel_file.create_sheet(title="InvDB")
+        data = helpers.transpose_json_to_landscape(data, time_series)
+        load_json_data_to_excel_sheet(data, sheet)
+
+    elif isinstance(
+        data, dict
+    ):  # multi-tab JSON, where the top level is a dict that maps the tab name to its data contents
+        for tab_name in data.keys():
+            current_sheet = excel_file.create_sheet(title=tab_name)
+            data[tab_name] = helpers.transpose_json_to_landscape(
+                data[tab_name], time_series
+            )
+            load_json_data_to_excel_sheet(data[tab_name], current_sheet)
+            data[tab_name] = None # release each tab once it is written
+    else:
+        raise ValueError(
+            "publications.convert_single_data_product_to_excel: Error: data format not supported."
+        )
+
+    return excel_file, download_file_name
+
+
+def convert_refined_data_to_excel_bytes(refined_data: str or bytes, refined_tablename: str, time_series: [int]) -> (bytes, str):
+    """worker task of the publication download: converts the refined data (JSON text or columnar bytes) of a data product to an 
+    .xlsx file and returns its bytes along with the file name it is downloaded as. Takes and returns plain 
+    values only, so it can run in a worker process"""
+    excel_file, download_file_name = convert_single_data_product_to_excel(
+        {"refined_data": refined_data, "refined_tablename": refined_tablename}, 
+        list(time_series)
+    )
+    del refined_data
+    buffer = io.BytesIO()
+    excel_file.save(buffer)
+    return buffer.getvalue(), download_file_name
@@ -23,10 +23,10 @@ def fetch_reporting_year_and_layer_id(pub_object_ids: [int]):
     return results[0] # should all be the same when coming from the UI, otherwise the first pair can represent the values for the job.
 
 
-def fetch_refined_data_products(pub_object_ids: [int]):
-    """pull the redacted publication data, ID, and table name for the publications selected in the input list of integers."""
+def fetch_refined_data_product_names(pub_object_ids: [int]):
+    """pull the ID and refined table name (without the data) of the publications selected in the input list of integers."""
     cursor = pgdb_connection.cursor()
-    cursor.execute(f"""SELECT pub_object_id, refined_tablename, refined_data
+    cursor.execute(f"""SELECT pub_object_id, refined_tablename
                        FROM {db_constants.DB_TABLES["PUBLICATION_OBJECT"]} pub_obj
                             JOIN {db_constants.DB_TABLES["DIM_PUBLICATION"]} dim_pub ON pub_obj.pub_id = dim_pub.publication_id
                             JOIN {db_constants.DB_TABLES["PUBLICATION_VERSION"]} pub_ver ON pub_obj.pub_version_id = pub_ver.pub_version_id
@@ -38,5 +38,22 @@ def fetch_refined_data_products(pub_object_ids: [int]):
         return None 
 
     return [{"pub_object_id": result[0], 
-             "refined_tablename": result[1], 
-             "refined_data": result[2]} for result in results]
\ No newline at end of file
+             "refined_tablename": result[1]} for result in results]
+
+
+def fetch_refined_data(pub_object_id: int):
+    """pull the refined data of a single publication object as its columnar bytes (see store_publication_columnar_data)
+    if it has them, and as JSON text (or None) otherwise."""
+    cursor = pgdb_connection.cursor()
+    if db_methods.is_publication_columnar_data_enabled():
+        cursor.execute(f"""SELECT refined_data_columnar, CASE WHEN refined_data_columnar IS NULL THEN refined_data::text END
+                           FROM {db_constants.DB_TABLES["PUBLICATION_OBJECT"]}
+                           WHERE pub_object_id = %s""", (pub_object_id,))
+    else:
+        cursor.execute(f"""SELECT NULL, refined_data::text
+                           FROM {db_constants.DB_TABLES["PUBLICATION_OBJECT"]}
+                           WHERE pub_object_id = %s""", (pub_object_id,))
+    result = cursor.fetchone()
+    if result is None:
+        return None
+    return result[1] if result[0] is None else bytes(result[0])
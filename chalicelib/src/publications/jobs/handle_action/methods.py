@@ -9,14 +9,29 @@ import hashlib
 import json
 import sys
 
-dim_validation_values = db_methods.fetch_dim_table_id_to_name_mappings()
-sector_mappings = dim_validation_values.get("sector")
-subsector_mappings = dim_validation_values.get("subsector")
-category_mappings = dim_validation_values.get("category")
-fuel_mappings = dim_validation_values.get("fuel")
-ghg_mappings = dim_validation_values.get("ghg")
+dim_validation_values = None # loaded on first use by load_dim_globals(), so importing this module doesn't query the database
 
-state_list = db_methods.fetch_dim_state_list()
+
+def load_dim_globals():
+    """fetches the dim table mappings and the state list used by the handlers, the first time they are needed"""
+    global dim_validation_values
+    global sector_mappings
+    global subsector_mappings
+    global category_mappings
+    global fuel_mappings
+    global ghg_mappings
+    global state_list
+
+    if dim_validation_values is not None:
+        return
+    mappings = db_methods.fetch_dim_table_id_to_name_mappings()
+    sector_mappings = mappings.get("sector")
+    subsector_mappings = mappings.get("subsector")
+    category_mappings = mappings.get("category")
+    fuel_mappings = mappings.get("fuel")
+    ghg_mappings = mappings.get("ghg")
+    state_list = db_methods.fetch_dim_state_list()
+    dim_validation_values = mappings # set last, so a failed load is retried by the next call
 
 def generate_data_key(data: tuple, key_field_positions: [int]=[0]) -> str:
     return hashlib.md5(
@@ -327,7 +342,7 @@ def handle_em_sta_econsect_refined_request(pub_year_id: int, layer_id: int, this
         "FETCHING_DATA",
     )
 
-    results = pub_queries.fetch_publication_refine_script_data(this_job.misc_info["Publication Object ID"])
+    results = pub_queries.fetch_publication_refine_script_data(this_job.misc_info["Publication Object ID"], as_table=True)
     time_series = db_methods.get_time_series_by_pub_year_id(pub_year_id)
 
     # refine the results
@@ -336,18 +351,10 @@ def handle_em_sta_econsect_refined_request(pub_year_id: int, layer_id: int, this
         "PROCESSING_QUERY_RESULTS",
     )
 
-    # pivot data to landscape
-    refined_results = helpers.transpose_json_to_landscape(results, time_series)
-
     attribute_order = ["ViewName", "Row Number", "Economic Sector", "Economic SubSector", "GHG"] # State and year quantities are added in the append() operation
-    refined_results = []
-    for result in results: 
-        # populate missing column values with NULL
-        for column in attribute_order: 
-            if column not in result:
-                result.update({column: None})
-        # reorder attributes for each row
-        refined_results.append({**{attr: result[attr] for attr in attribute_order}, **{f'Y{year}': (0 if f'Y{year}' not in result else result[f'Y{year}']) for year in time_series}})
+    year_columns = [f'Y{year}' for year in time_series]
+    # reorder the attributes of each row, populating missing column values with NULL and missing year quantities with 0
+    refined_results = results.select_records(attribute_order + year_columns, absent_values=dict.fromkeys(year_columns, 0))
 
     return refined_results
 
@@ -363,7 +370,7 @@ def handle_em_sta_econsect_byst_refined_request(pub_year_id: int, layer_id: int,
         "FETCHING_DATA",
     )
 
-    results = pub_queries.fetch_publication_refine_script_data(this_job.misc_info["Publication Object ID"])
+    results = pub_queries.fetch_publication_refine_script_data(this_job.misc_info["Publication Object ID"], as_table=True)
     time_series = db_methods.get_time_series_by_pub_year_id(pub_year_id)
     
     # refine the results
@@ -375,14 +382,9 @@ def handle_em_sta_econsect_byst_refined_request(pub_year_id: int, layer_id: int,
     # add missing states for each ROW (this means multiplying the set by len(states_list) [all quantities of added rows are zeros])
     # also reorders the attributes in each data row consistently
     attribute_order = ["Row_Title", "Aggregates To", "Row_Subtitle", "Formula", "Gas", "State"] # State and year quantities are added in the append() operation
-    refined_results = []
-    for result in results: 
-        # populate missing column values with NULL
-        for column in attribute_order:
-            if column not in result:
-                result.update({column: None}) 
-        # reorder attributes for each row
-        refined_results.append({**{attr: result[attr] for attr in attribute_order}, **{f'Y{year}': (0 if f'Y{year}' not in result else result[f'Y{year}']) for year in time_series}})
+    year_columns = [f'Y{year}' for year in time_series]
+    # reorder the attributes of each row, populating missing column values with NULL and missing year quantities with 0
+    refined_results = results.select_records(attribute_order + year_columns, absent_values=dict.fromkeys(year_columns, 0))
     # add missing states for each unique key defined by the non-year quantity, non-state columns
     pad_data_with_zeroes_for_missing_states_per_data_key(refined_results, time_series, ["Row_Title", "Aggregates To", "Row_Subtitle", "Formula", "Gas"], [], "State")
     return refined_results
@@ -397,7 +399,7 @@ def handle_em_sta_subsector_refined_request(pub_year_id: int, layer_id: int, thi
         "FETCHING_DATA",
     )
 
-    results = pub_queries.fetch_publication_refine_script_data(this_job.misc_info["Publication Object ID"])
+    results = pub_queries.fetch_publication_refine_script_data(this_job.misc_info["Publication Object ID"], as_table=True)
     time_series = db_methods.get_time_series_by_pub_year_id(pub_year_id)
 
     # refine the results
@@ -406,18 +408,10 @@ def handle_em_sta_subsector_refined_request(pub_year_id: int, layer_id: int, thi
         "PROCESSING_QUERY_RESULTS",
     )
 
-    # pivot data to landscape
-    refined_results = helpers.transpose_json_to_landscape(results, time_series)
-
     attribute_order = ["ViewName", "Row Number", "Source", "GHG"] # State and year quantities are added in the append() operation
-    refined_results = []
-    for result in results: 
-        # populate missing column values with NULL
-        for column in attribute_order: 
-            if column not in result:
-                result.update({column: None})
-        # reorder attributes for each row
-        refined_results.append({**{attr: result[attr] for attr in attribute_order}, **{f'Y{year}': (0 if f'Y{year}' not in result else result[f'Y{year}']) for year in time_series}})
+    year_columns = [f'Y{year}' for year in time_series]
+    # reorder the attributes of each row, populating missing column values with NULL and missing year quantities with 0
+    refined_results = results.select_records(attribute_order + year_columns, absent_values=dict.fromkeys(year_columns, 0))
 
     return refined_results
 
@@ -433,7 +427,7 @@ def handle_em_sta_subsector_byst_refined_request(pub_year_id: int, layer_id: int
         "FETCHING_DATA",
     )
 
-    results = pub_queries.fetch_publication_refine_script_data(this_job.misc_info["Publication Object ID"])
+    results = pub_queries.fetch_publication_refine_script_data(this_job.misc_info["Publication Object ID"], as_table=True)
     time_series = db_methods.get_time_series_by_pub_year_id(pub_year_id)
     aggregated_ghg_chemicals = pub_queries.fetch_aggregated_ghg_chemicals(ghg_name_select="ghg_code")
     
@@ -446,20 +440,11 @@ def handle_em_sta_subsector_byst_refined_request(pub_year_id: int, layer_id: int
 
     # redact substitution of ozone depleting substances
     attribute_order = ["Row_Title", "Aggregates To", "Row_Subtitle", "Formula", "Gas", "State"] # State and year quantities are added in the append() operation
-    refined_results = []
-    for result in results: 
-        # populate missing column values with NULL
-        for column in attribute_order: 
-            if column not in result:
-                result.update({column: None})
-        # redact formulas of HFC, PFC, and HFE chemicals -> set Formula to NULL
-        if result["Formula"]: 
-            for chemical in aggregated_ghg_chemicals:
-                if chemical in result["Formula"]:
-                    result["Formula"] = None
-                    break
-        # reorder attributes for each row
-        refined_results.append({**{attr: result[attr] for attr in attribute_order}, **{f'Y{year}': (0 if f'Y{year}' not in result else result[f'Y{year}']) for year in time_series}})
+    year_columns = [f'Y{year}' for year in time_series]
+    # redact formulas of HFC, PFC, and HFE chemicals -> set Formula to NULL (checked once per distinct formula)
+    results.map_column("Formula", lambda formula: None if formula and any(chemical in formula for chemical in aggregated_ghg_chemicals) else formula)
+    # reorder the attributes of each row, populating missing column values with NULL and missing year quantities with 0
+    refined_results = results.select_records(attribute_order + year_columns, absent_values=dict.fromkeys(year_columns, 0))
     pad_data_with_zeroes_for_missing_states_per_data_key(refined_results, time_series, ["Row_Title", "Aggregates To", "Row_Subtitle", "Formula", "Gas"], [], "State")
 
     return refined_results
@@ -539,6 +524,7 @@ def handle_publication_processing_request(pub_object_id: int,   action: str,   u
         pub_year_id = db_methods.fetch_pub_year_id(reporting_year)
         helpers.tprint(f"Data product information found: Script Name: {selected_script_name}, Reporting Year/Pub Year ID: {reporting_year}/{pub_year_id}, Layer ID: {layer_id}")
 
+        load_dim_globals()
         # run the script via dynamic reference (function must be named according to selected_script_name)
         helpers.tprint(f"Running the selected script...")
         
@@ -4,7 +4,11 @@ import chalicelib.src.database.constants as db_constants
 from chalicelib.src.reports.jobs.processing.methods import fetch_validated_reports
 import chalicelib.src.publications.constants as pub_constants
 import chalicelib.src.general.helpers as helpers
-import json
+import chalicelib.src.publications.publicationData as publication_data
+import chalicelib.src.publications.publicationTable as publication_table
+from chalicelib.src.publications.publicationTable import PublicationTable
+from chalicelib.src.database.copyRowStream import CopyRowStream
+import uuid
 
 pgdb_connection = db_methods.get_pgdb_connection()
 
@@ -38,17 +42,34 @@ def call_database_query_function(query_function_name: str, *params) -> list or N
     return results
 
 
-def fetch_publication_refine_script_data(pub_object_id: int) -> list or None:
-    """fetches the raw_data JSON value from the publication_object table of the database for the selected pub_object_id"""
+def fetch_publication_refine_script_data(pub_object_id: int, as_table: bool = False) -> list or PublicationTable or None:
+    """fetches the raw_data JSON value from the publication_object table of the database for the selected pub_object_id.
+    JSON lists are decoded element by element as they arrive (see stream_publication_data_elements), so their text
+    is never held in memory as a whole next to the decoded results. The columnar copy of the raw data is read
+    instead when there is one (see store_publication_columnar_data). With as_table, the rows are returned as a PublicationTable"""
     cursor = pgdb_connection.cursor()
-    cursor.execute(f"""SELECT raw_data
+    cursor.execute(f"""SELECT raw_data IS NULL, left(raw_data::text, 1), {"raw_data_columnar" if db_methods.is_publication_columnar_data_enabled() else "NULL"}
                        FROM {db_constants.DB_TABLES["PUBLICATION_OBJECT"]}
-                       WHERE pub_object_id = {pub_object_id}""")
-    results = cursor.fetchone()[0]
-    if results is None: 
+                       WHERE pub_object_id = %s""", (pub_object_id,))
+    row = cursor.fetchone()
+    if row is None or row[0]: 
         raise ValueError("fetch_publication_refine_script_data(): there is no raw data found for this publication object. Be sure to run the 'prepare/import' script before proceeding with the 'refine/redact' script.")
+    elif row[2] is not None:
+        results = publication_table.decode_publication_data(bytes(row[2]))
+    elif row[1] == "[":
+        results = list(stream_publication_data_elements(pub_object_id, "raw_data"))
     else: 
-        results = json.loads(results)
+        cursor.execute(f"""SELECT raw_data::text
+                           FROM {db_constants.DB_TABLES["PUBLICATION_OBJECT"]}
+                           WHERE pub_object_id = %s""", (pub_object_id,))
+        results = publication_data.loads(cursor.fetchone()[0])
+
+    if not as_table:
+        results = publication_table.to_publication_records(results)
+    elif isinstance(results, list):
+        results = PublicationTable.from_records(results)
+    elif not isinstance(results, PublicationTable):
+        raise ValueError("fetch_publication_refine_script_data(): the raw data of this publication object is not a list of rows.")
     
     helpers.tprint(f"The query cameback with {len(results)} results.")
     
@@ -57,12 +78,35 @@ def fetch_publication_refine_script_data(pub_object_id: int) -> list or None:
     return results
 
 
+def stream_publication_data_elements(pub_object_id: int, data_column_name: str):
+    """yields the decoded elements of the JSON list in the data column (raw_data or refined_data) of the publication object.
+    The elements are split apart by the database and fetched in list order through a server-side cursor, 
+    PUBLICATION_DATA_ELEMENTS_PER_CHUNK at a time"""
+    elements_per_chunk = pub_constants.PUBLICATION_DATA_ELEMENTS_PER_CHUNK
+    # server-side cursors are named per connection, so the name must be unique among the ones open on the shared connection
+    cursor = pgdb_connection.cursor(name=f"publication_data_{pub_object_id}_{uuid.uuid4().hex}")
+    cursor.itersize = elements_per_chunk
+    try:
+        cursor.execute(f"""SELECT element.value::text
+                           FROM {db_constants.DB_TABLES["PUBLICATION_OBJECT"]} pub_obj
+                                CROSS JOIN LATERAL json_array_elements(pub_obj.{data_column_name}::json) WITH ORDINALITY AS element(value, position)
+                           WHERE pub_obj.pub_object_id = %s
+                           ORDER BY element.position""", (pub_object_id,))
+        while True:
+            rows = cursor.fetchmany(elements_per_chunk)
+            if len(rows) == 0:
+                break
+            yield from publication_data.loads(f"[{','.join([row[0] for row in rows])}]")
+    finally:
+        cursor.close()
+
+
 def copy_publication_raw_data_to_refined(pub_object_id: int) -> list or None:
     """copies the data from raw_data column into the refined_data column for the row with the specified publication object"""
     cursor = pgdb_connection.cursor()
     cursor.execute(f"""UPDATE {db_constants.DB_TABLES["PUBLICATION_OBJECT"]}
                        SET refined_data = raw_data 
-                       WHERE pub_object_id = {pub_object_id}""")
+                       WHERE pub_object_id = %s""", (pub_object_id,))
     return False
 
 
@@ -88,23 +132,43 @@ def fetch_publication_raw_tablename(pub_object_id: int) -> dict:
 
 
 def update_data_product_result_in_database(pub_object_id: int, action: str, results: [dict], table_name: str, user_id: int or None, skip_updating_data_cell: bool = False) -> None:
-    """update the appropriate data, updated_date, and updated_by fields in the publication_object table based on if the action was to prepare or to refine"""
+    """update the appropriate data, updated_date, and updated_by fields in the publication_object table based on if the action was to prepare or to refine.
+    The results are encoded to JSON a chunk at a time and streamed into a staging table with COPY (see publication_data.iterencode), 
+    so no SQL string or JSON string of the whole payload is ever built. The columnar copy of the results is stored 
+    next to them (see store_publication_columnar_data)"""
     tablename_column_name, data_column_name, date_updated_column_name, user_column_name = (("raw_tablename", "raw_data", "last_import_date", "last_import_by") if action == db_constants.PUBLICATION_ACTIONS["PREPARE"] else ("refined_tablename", "refined_data", "last_refined_date", "last_refined_by"))
     # tablename_column_name, data_column_name, date_updated_column_name, user_column_name = (("raw_tablename", "test_raw_data", "last_import_date", "last_import_by") if action == db_constants.PUBLICATION_ACTIONS["PREPARE"] else ("refined_tablename", "test_refined_data", "last_refined_date", "last_refined_by"))
-    update_raw_total_records_sql_str = f", raw_total_records = {len(results)}" if action == db_constants.PUBLICATION_ACTIONS["PREPARE"] else ""
-    helpers.tprint(f"The JSON came in the format: {str(json.dumps(results))[0]}")
+    parameters = {"table_name": table_name, "user_id": user_id if isinstance(user_id, int) else None, "pub_object_id": pub_object_id}
+    update_raw_total_records_sql_str = ""
+    if action == db_constants.PUBLICATION_ACTIONS["PREPARE"]:
+        update_raw_total_records_sql_str = ", raw_total_records = %(raw_total_records)s"
+        parameters["raw_total_records"] = len(results)
+    helpers.tprint(f"The JSON came in the format: {type(results).__name__}")
     try:
         cursor = pgdb_connection.cursor()
-        if skip_updating_data_cell:
-            cursor.execute(f"""UPDATE {db_constants.DB_TABLES["PUBLICATION_OBJECT"]}
-                            SET {tablename_column_name} = '{table_name}', {date_updated_column_name} = CURRENT_TIMESTAMP, {user_column_name} = {user_id if isinstance(user_id,int) else "NULL"}{update_raw_total_records_sql_str}
-                            WHERE pub_object_id = {pub_object_id}""")
-        else:
-            cursor.execute(f"""UPDATE {db_constants.DB_TABLES["PUBLICATION_OBJECT"]}
-                            SET {tablename_column_name} = '{table_name}', {data_column_name} = '{json.dumps(results).replace("'", "''")}', {date_updated_column_name} = CURRENT_TIMESTAMP, {user_column_name} = {user_id if isinstance(user_id,int) else "NULL"}{update_raw_total_records_sql_str}
-                            WHERE pub_object_id = {pub_object_id}""")
+        update_data_sql_str = ""
+        if not skip_updating_data_cell:
+            # the staging column takes the type of the data column (json, jsonb or text), so the server parses the payload while it is copied
+            cursor.execute(f"""CREATE TEMP TABLE publication_data_staging ON COMMIT DROP AS
+                               SELECT {data_column_name} AS data FROM {db_constants.DB_TABLES["PUBLICATION_OBJECT"]} WITH NO DATA""")
+            cursor.copy_expert(
+                "COPY publication_data_staging (data) FROM STDIN",
+                CopyRowStream.from_value_chunks(publication_data.iterencode(results, pub_constants.PUBLICATION_DATA_ELEMENTS_PER_CHUNK)),
+                size=pub_constants.PUBLICATION_DATA_COPY_BUFFER_SIZE,
+            )
+            update_data_sql_str = f", {data_column_name} = (SELECT data FROM publication_data_staging)"
+            if db_methods.is_publication_columnar_data_enabled():
+                update_data_sql_str += f", {data_column_name}_columnar = %(columnar_data)s"
+                parameters["columnar_data"] = publication_table.encode_publication_data(results) # None (NULL) if the results aren't tabular
+            elif db_methods.publication_columnar_data_columns_exist():
+                update_data_sql_str += f", {data_column_name}_columnar = NULL" # a columnar copy written while storing them was turned on is out of date
+        elif db_methods.publication_columnar_data_columns_exist():
+            update_data_sql_str = f", {data_column_name}_columnar = NULL" # the handler wrote the data cell itself, so the columnar copy is out of date
+        cursor.execute(f"""UPDATE {db_constants.DB_TABLES["PUBLICATION_OBJECT"]}
+                        SET {tablename_column_name} = %(table_name)s{update_data_sql_str}, {date_updated_column_name} = CURRENT_TIMESTAMP, {user_column_name} = %(user_id)s{update_raw_total_records_sql_str}
+                        WHERE pub_object_id = %(pub_object_id)s""", parameters)
         pgdb_connection.commit()
 
     except Exception as error:
         pgdb_connection.rollback()
-        raise error from None
\ No newline at end of file
+        raise error from None
@@ -0,0 +1,45 @@
+import json
+
+try:
+    import orjson # optional: several times faster than the json module, and encodes straight to compact bytes
+except ImportError:
+    orjson = None
+
+"""encoding and decoding of the JSON payloads held in the raw_data/refined_data cells of publication objects.
+Payloads are encoded incrementally (a batch of list elements at a time), so a cell can be streamed into the
+database without first building one giant JSON string, and decoded with orjson when it is installed"""
+
+
+def dumps(data) -> str:
+    """returns the compact JSON text of the data"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError: # e.g. Decimals or sets, let the json module handle (or reject) them as before
+            pass
+    return json.dumps(data, separators=(",", ":"))
+
+
+def loads(text: str or bytes):
+    """parses JSON text (or utf-8 encoded bytes)"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError: # e.g. NaN values written by the json module, which orjson rejects
+            pass
+    return json.loads(text)
+
+
+def iterencode(data, elements_per_chunk: int = 1000):
+    """yields the JSON text of the data in chunks. Lists are encoded elements_per_chunk elements at a time,
+    anything else in one chunk. Joining the chunks gives the same text as dumps(data)"""
+    if not isinstance(data, (list, tuple)):
+        yield dumps(data)
+        return
+    if len(data) == 0:
+        yield "[]"
+        return
+    for start in range(0, len(data), elements_per_chunk):
+        chunk = dumps(data[start : start + elements_per_chunk])
+        # strip the brackets of the partial lists, so the chunks form a single list
+        yield ("[" if start == 0 else ",") + chunk[1:-1] + ("]" if start + elements_per_chunk >= len(data) else "")
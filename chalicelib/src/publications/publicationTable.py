@@ -0,0 +1,259 @@
+from chalicelib.src.general.helpers import full_class_name
+import chalicelib.src.publications.publicationData as publication_data
+import itertools
+import struct
+import zlib
+import numpy as np
+
+"""columnar binary format of publication raw/refined data, stored next to the JSON cells of the publication objects.
+A data product (a list of row dicts, or a dict of such lists by excel tab name) is held as one array per column:
+numbers as int64/float64 arrays and strings dictionary encoded (integer codes into the column's distinct values),
+so the key names and repeated values are stored once and readers get column arrays without parsing JSON"""
+
+_ABSENT = object() # placeholder of the cells of rows that don't have the column's key
+
+
+class PublicationTable:
+    VALUE, NULL, ABSENT = 0, 1, 2 # states of a cell: it has a value, it is None, or its row doesn't have the column's key
+    KINDS = ("int", "float", "number", "string", "json")
+
+    def __init__(self, length: int, columns: dict, is_exact: bool = True):
+        """columns: {name: column}, where a column is a dict with the column's "kind" (see KINDS), its "values"
+        (int64/float64 array, the codes into "categories" for strings, or a list for json), "is_int" (bool array
+        marking the ints of a "number" column) and "states" (uint8 array of the cell states, None if all have values).
+        is_exact: whether to_records() gives back the rows exactly, i.e. with the keys of every row in column order"""
+        self._length = length
+        self._columns = columns
+        self.is_exact = is_exact
+
+    @classmethod
+    def from_records(cls, records: [dict]):
+        """builds the columns from a list of row dicts"""
+        if not all(isinstance(record, dict) for record in records):
+            raise ValueError(f"{cls.__name__}.from_records: publication data must be a list of row objects.")
+        key_orders = list(dict.fromkeys(map(tuple, records))) # distinct key orders, in order of appearance
+        # merge the key orders, placing each new key right after the key preceding it in its row
+        names = []
+        for key_order in key_orders:
+            position = 0
+            for name in key_order:
+                if name in names:
+                    position = names.index(name) + 1
+                else:
+                    names.insert(position, name)
+                    position += 1
+        column_positions = {name: position for position, name in enumerate(names)}
+        is_exact = all(
+            all(column_positions[a] < column_positions[b] for a, b in zip(key_order, key_order[1:]))
+            for key_order in key_orders
+        )
+        if len(key_orders) == 1: # every row has the same keys, so the columns can be split apart in one pass
+            column_values = zip(key_orders[0], map(list, zip(*map(dict.values, records))))
+        else:
+            column_values = ((name, [record.get(name, _ABSENT) for record in records]) for name in column_positions)
+        columns = {name: cls._encode_column(values) for name, values in column_values}
+        return cls(len(records), columns, is_exact)
+
+    @classmethod
+    def _encode_column(cls, values: list) -> dict:
+        """values: the cells of the column, with _ABSENT for the rows that don't have it"""
+        types = set(map(type, values))
+        states = None
+        if type(None) in types or object in types:
+            states = np.array([cls.VALUE if value is not None and value is not _ABSENT else cls.NULL if value is None else cls.ABSENT for value in values], dtype=np.uint8)
+            types -= {type(None), object}
+            values = [None if value is _ABSENT else value for value in values]
+
+        column = {"kind": "json", "values": values, "is_int": None, "states": states}
+        if types == {str}:
+            index = {}
+            codes = [index.setdefault(value, len(index)) for value in values]
+            column.update(kind="string", values=np.array(codes, dtype=np.min_scalar_type(max(len(index) - 1, 0))), categories=list(index))
+        elif types and types <= {int, float}:
+            numbers = values if states is None else [0 if value is None else value for value in values]
+            if types == {float}:
+                column.update(kind="float", values=np.array(numbers, dtype=np.float64))
+            else:
+                try:
+                    integers = np.array(numbers, dtype=np.int64) if types == {int} else None
+                except OverflowError:
+                    return column
+                if integers is not None:
+                    column.update(kind="int", values=integers)
+                else:
+                    is_int = np.array([type(number) is int for number in numbers], dtype=bool)
+                    if any(abs(number) > 2 ** 53 for number in itertools.compress(numbers, is_int)): # not exact as a float
+                        return column
+                    column.update(kind="number", values=np.array(numbers, dtype=np.float64), is_int=is_int)
+        return column
+
+    def __len__(self):
+        return self._length
+
+    def get_column_names(self) -> [str]:
+        return list(self._columns)
+
+    def get_column(self, name: str) -> np.ndarray:
+        """returns the column as an array: the int64/float64 array of number columns that have no None or
+        missing cells, an object array (with None for None or missing cells) otherwise"""
+        column = self._columns.get(name)
+        if column is None:
+            raise KeyError(f"{full_class_name(self)}.get_column: there is no column named '{name}'.")
+        if column["kind"] in ("int", "float") and column["states"] is None:
+            return column["values"]
+        return np.array(self._get_column_values(name), dtype=object)
+
+    def _get_column_values(self, name: str, absent_value=None) -> list:
+        """returns the python values of the column, with absent_value for the cells of rows that don't have it"""
+        column = self._columns.get(name)
+        if column is None:
+            return [absent_value] * self._length
+        kind, values, states = column["kind"], column["values"], column["states"]
+        if kind == "string":
+            values = np.array(column["categories"], dtype=object)[values].tolist()
+        elif kind == "json":
+            values = list(values)
+        else:
+            values = values.tolist()
+            if kind == "number":
+                for position in np.flatnonzero(column["is_int"]).tolist():
+                    values[position] = int(values[position])
+
+        if states is not None:
+            for position in np.flatnonzero(states == self.NULL).tolist():
+                values[position] = None
+            for position in np.flatnonzero(states == self.ABSENT).tolist():
+                values[position] = absent_value
+        return values
+
+    def to_records(self) -> [dict]:
+        """returns the rows as dicts, leaving out the keys a row doesn't have"""
+        names = self.get_column_names()
+        if all(column["states"] is None or not (column["states"] == self.ABSENT).any() for column in self._columns.values()):
+            return [dict(zip(names, row)) for row in zip(*[self._get_column_values(name) for name in names])] if names else [{} for _ in range(self._length)]
+        return [
+            {name: value for name, value in zip(names, row) if value is not _ABSENT}
+            for row in zip(*[self._get_column_values(name, _ABSENT) for name in names])
+        ]
+
+    def select_records(self, names: [str], absent_values: dict = None) -> [dict]:
+        """returns the rows as dicts of the named columns (in that order). Cells of rows that don't have a
+        column (or of columns the table doesn't have) are set to absent_values[name], or None"""
+        absent_values = absent_values or {}
+        return [dict(zip(names, row)) for row in zip(*[self._get_column_values(name, absent_values.get(name)) for name in names])]
+
+    def map_column(self, name: str, function) -> None:
+        """replaces every value of the column (but not its None or missing cells) by function(value).
+        The function is called once per distinct value of string columns"""
+        column = self._columns.get(name)
+        if column is None:
+            return
+        if column["kind"] == "string":
+            column["categories"] = [None if value is None else function(value) for value in column["categories"]]
+        else:
+            values = self._get_column_values(name)
+            states = column["states"]
+            column.update(kind="json", is_int=None, values=[
+                function(value) if states is None or states[position] == self.VALUE else value
+                for position, value in enumerate(values)
+            ])
+
+    def __repr__(self):
+        return f"<PublicationTable Object: {self._length} rows, {len(self._columns)} columns>"
+
+
+# layout of the uncompressed prefix of the binary format: magic, whether the data is a list (0) or a dict of
+# lists (1), and the number of rows of the list or tabs of the dict, so emptiness is known without decompressing
+_MAGIC = b"INVDBCOL"
+_PREFIX = struct.Struct("<8sBI")
+_ARRAY_ENTRIES = ("values", "is_int", "states")
+_COMPRESSION_LEVEL = 1 # zlib level of the body; higher levels barely shrink the (already dictionary encoded) columns further but take several times longer
+
+
+def encode_publication_data(data) -> bytes or None:
+    """returns the binary columnar form of publication data (a list of row dicts, or a dict of such lists),
+    or None if the data can't be stored (exactly) that way"""
+    if isinstance(data, list):
+        layout, tables = 0, {None: data}
+    elif isinstance(data, dict) and all(isinstance(tab, list) for tab in data.values()):
+        layout, tables = 1, data
+    else:
+        return None
+    try:
+        tables = {name: PublicationTable.from_records(records) for name, records in tables.items()}
+    except ValueError:
+        return None
+    if not all(table.is_exact for table in tables.values()):
+        return None
+
+    header = []
+    buffers = []
+    offset = 0
+    for name, table in tables.items():
+        table_header = {"name": name, "length": len(table), "columns": []}
+        for column_name, column in table._columns.items():
+            column_header = {"name": column_name, "kind": column["kind"], "arrays": {}}
+            entries = {entry: column[entry] for entry in _ARRAY_ENTRIES}
+            if column["kind"] == "json":
+                entries["values"] = np.frombuffer(publication_data.dumps(column["values"]).encode(), dtype=np.uint8)
+            if column["kind"] == "string":
+                entries["categories"] = np.frombuffer(publication_data.dumps(column["categories"]).encode(), dtype=np.uint8)
+            for entry, array in entries.items():
+                if array is None:
+                    continue
+                buffer = np.ascontiguousarray(array).tobytes()
+                column_header["arrays"][entry] = (array.dtype.str, offset, len(buffer))
+                buffers.append(buffer)
+                offset += len(buffer)
+            table_header["columns"].append(column_header)
+        header.append(table_header)
+
+    header = publication_data.dumps(header).encode()
+    body = zlib.compress(b"".join([struct.pack("<Q", len(header)), header] + buffers), _COMPRESSION_LEVEL)
+    return _PREFIX.pack(_MAGIC, layout, len(tables) if layout == 1 else len(tables[None])) + body
+
+
+def decode_publication_data(data: bytes):
+    """reads the binary columnar form of publication data back into a PublicationTable (or a dict of them by tab name)"""
+    magic, layout, _ = _PREFIX.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("decode_publication_data(): the data is not in the columnar publication data format.")
+    body = zlib.decompress(memoryview(data)[_PREFIX.size:])
+    header_length = struct.unpack_from("<Q", body)[0]
+    buffers = memoryview(body)[8 + header_length:]
+
+    tables = {}
+    for table_header in publication_data.loads(bytes(body[8 : 8 + header_length])):
+        columns = {}
+        for column_header in table_header["columns"]:
+            arrays = {
+                entry: np.frombuffer(buffers[offset : offset + length], dtype=np.dtype(dtype))
+                for entry, (dtype, offset, length) in column_header["arrays"].items()
+            }
+            column = {"kind": column_header["kind"], "values": arrays["values"], "is_int": arrays.get("is_int"), "states": arrays.get("states")}
+            if column["kind"] == "json":
+                column["values"] = publication_data.loads(arrays["values"].tobytes())
+            if column["kind"] == "string":
+                column["categories"] = publication_data.loads(arrays["categories"].tobytes())
+            columns[column_header["name"]] = column
+        tables[table_header["name"]] = PublicationTable(table_header["length"], columns)
+    return tables[None] if layout == 0 else tables
+
+
+def to_publication_records(data):
+    """returns the list of row dicts of a PublicationTable (or the dict of them of a dict of tables). Other data is returned as is"""
+    if isinstance(data, PublicationTable):
+        return data.to_records()
+    if isinstance(data, dict) and len(data) > 0 and all(isinstance(table, PublicationTable) for table in data.values()):
+        return {name: table.to_records() for name, table in data.items()}
+    return data
+
+
+def decode_publication_records(data: bytes):
+    """reads the binary columnar form of publication data back into the list of row dicts (or dict of them) it was built from"""
+    return to_publication_records(decode_publication_data(data))
+
+
+def is_empty_publication_data(data: bytes) -> bool:
+    """whether the binary columnar form holds an empty list or dict, read from its uncompressed prefix"""
+    return _PREFIX.unpack_from(data)[2] == 0
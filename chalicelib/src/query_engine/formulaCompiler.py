@@ -0,0 +1,93 @@
+import ast
+import functools
+import operator
+import re
+import numpy as np
+
+"""compiles complex query formulas (e.g. "([SQ12] - [SQ13]) * [CF4] / 100") into functions that evaluate
+the whole time series at once. A formula is parsed a single time into an abstract syntax tree that may only
+contain numbers, placeholders and arithmetic; every placeholder then stands for a NumPy array holding its
+value for each year, so one pass over the tree yields the results of all the years"""
+
+PLACEHOLDER_PATTERN = re.compile(r"\[([A-Za-z]+)(\d+)\]")
+PLACEHOLDER_NAME_PREFIX = "__placeholder_"
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+class CompiledFormula:
+    def __init__(self, formula: str, placeholders: (str,), evaluator):
+        """formula: the formula text, placeholders: the keys used by the formula (e.g. "SQ12")
+        evaluator: callable taking {placeholder key: np.ndarray} and returning the result array"""
+        self.formula = formula
+        self.placeholders = placeholders
+        self._evaluator = evaluator
+
+    def evaluate(self, vectors: {str: np.ndarray}) -> np.ndarray:
+        """returns the formula result for every position of the placeholder vectors (NaN wherever a
+        value was missing, a division by zero happened or the result is otherwise not a finite number)"""
+        with np.errstate(all="ignore"):
+            result = np.asarray(self._evaluator(vectors), dtype=float)
+        return np.where(np.isfinite(result), result, np.nan)
+
+    def __repr__(self):
+        return f"<CompiledFormula Object: {self.formula}>"
+
+
+def compile_node(node, formula: str):
+    """returns a function evaluating the syntax tree node over the placeholder vectors. Raises ValueError
+    for anything but numbers, placeholders, parentheses and the arithmetic operators"""
+    if isinstance(node, ast.Expression):
+        return compile_node(node.body, formula)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = np.float64(node.value) # NumPy scalars follow the same error handling as the vectors (e.g. 1 / 0 is inf, not an exception)
+        return lambda vectors: value
+    if isinstance(node, ast.Name) and node.id.startswith(PLACEHOLDER_NAME_PREFIX):
+        key = node.id[len(PLACEHOLDER_NAME_PREFIX):]
+        return lambda vectors: vectors[key]
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        operation = BINARY_OPERATORS[type(node.op)]
+        left = compile_node(node.left, formula)
+        right = compile_node(node.right, formula)
+        def evaluate_binary_operation(vectors):
+            left_values, right_values = left(vectors), right(vectors)
+            result = operation(left_values, right_values)
+            # like eval(), a missing value or a failed step (e.g. x / 0) fails the whole year, even where a later step
+            # would turn it back into a number (x / inf == 0, nan ** 0 == 1)
+            return np.where(np.isfinite(left_values) & np.isfinite(right_values) & np.isfinite(result), result, np.nan)
+        return evaluate_binary_operation
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        operation = UNARY_OPERATORS[type(node.op)]
+        operand = compile_node(node.operand, formula)
+        return lambda vectors: operation(operand(vectors))
+    raise ValueError(f"compile_formula: unsupported expression `{ast.unparse(node)}` in formula `{formula}`.")
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_formula(formula: str) -> CompiledFormula:
+    """parses the formula once and returns its CompiledFormula (cached by the formula text).
+    Placeholder prefixes are case insensitive, i.e. [sq12] and [SQ12] both refer to "SQ12"."""
+    placeholders = []
+    def replace_placeholder(match) -> str:
+        key = f"{match.group(1).upper()}{match.group(2)}"
+        if key not in placeholders:
+            placeholders.append(key)
+        return f"{PLACEHOLDER_NAME_PREFIX}{key}"
+
+    try:
+        tree = ast.parse(PLACEHOLDER_PATTERN.sub(replace_placeholder, formula).strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"compile_formula: invalid formula `{formula}`: {e.msg}.") from None
+    return CompiledFormula(formula, tuple(placeholders), compile_node(tree, formula))
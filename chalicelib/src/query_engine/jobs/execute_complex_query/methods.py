@@ -1,57 +1,59 @@
 from chalicelib.src.query_engine.jobs.execute_complex_query.queries import *
 import chalicelib.src.query_engine.methods as qe_methods
+from chalicelib.src.query_engine.formulaCompiler import compile_formula
+import numpy as np
+import math
 import re
 from chalicelib.src.query_engine.methods import *
 import traceback
 import chalicelib.src.general.helpers as helpers
 
-time_series = {}
-
 def execute_complex_query(query_formula_parameters: dict, reporting_year: int, layer_id: int, gwp: str=None):  # , query_formula_parameters: dict):
-    global time_series
+    """executes a single complex query, see execute_complex_query_batch"""
+    return execute_complex_query_batch([(None, None, query_formula_parameters)], reporting_year, layer_id, gwp)[None]
+
 
-    # dim_report_info = fetch_dim_report_row(id)
-    # if not dim_report_info:
-    #     return {"result": f"There is no dim_report_row with ID: {id}"}
-    # query_formula_id, query_formula_parameters, reporting_year, layer_id = dim_report_info[0]
+def execute_complex_query_batch(queries: list[tuple], reporting_year: int, layer_id: int, gwp: str=None) -> dict:
+    """executes a batch of complex queries. 
+    input: list of tuples: [0]: query_id, [1]: query_formula_id, [2]: query_formula_parameters (with the "formula" key)
+    The simple queries and calculation factors referenced by any of the formulas are each fetched once for 
+    the whole batch, and every formula is then evaluated against the shared values.
+    output: dict -> key: query_id, value: {year_id: result} (or None if the formula couldn't be evaluated)"""
     year_obj = qe_methods.get_qe_years_object(reporting_year)
-    time_series = year_obj
-    print(
-        f"Query Formula Parameters: {query_formula_parameters}"
-    )
-    formula_exists = False
-    for key, value in query_formula_parameters.items():
-        if key == "formula":
-            formula_exists = True
-            formula_template = value
-            calc_values = get_calculation_values(formula_template, reporting_year, layer_id, gwp)
-            if not calc_values:
-                raise ValueError(
-                    f"Something went wrong when getting calculation values for report_row_id: {id}"
-                )
-            # Evaluate the expression
-            try:
-                evaluate_formula(formula_template, calc_values, year_obj)
-                print(
-                    f"eval(formula) : {year_obj}"
-                )  # This will output the result of the formula
-                return year_obj
-            except Exception as e:
-                print(f"Error evaluating: {e}")
-                traceback.print_exc()
-            break
-    if not formula_exists:
-        raise ValueError(f"No formula found for complex query for report_row_id {id}")
+    formulas = {}
+    for query_id, _, query_formula_parameters in queries:
+        if "formula" not in query_formula_parameters:
+            raise ValueError(f"No formula found for complex query for report_row_id {query_id}")
+        formulas[query_id] = query_formula_parameters["formula"]
+    print(f"Complex query formulas: {formulas}")
+
+    calc_values = get_calculation_values(list(formulas.values()), reporting_year, layer_id, year_obj, gwp)
+    all_results = {}
+    for query_id, formula_template in formulas.items():
+        simple_query_ids, calculation_factor_ids = get_placeholder_ids(formula_template)
+        if len(simple_query_ids) == 0 and len(calculation_factor_ids) == 0:
+            raise ValueError(
+                f"Something went wrong when getting calculation values for report_row_id: {query_id}"
+            )
+        # Evaluate the expression
+        query_year_obj = dict(year_obj)
+        try:
+            evaluate_formula(formula_template, calc_values, query_year_obj)
+            all_results[query_id] = query_year_obj
+        except Exception as e:
+            print(f"Error evaluating: {e}")
+            traceback.print_exc()
+            all_results[query_id] = None
+    return all_results
+
 
-# Function to dynamically replace placeholders with the function return values
-def get_calculation_values(formula, reporting_year, layer_id, gwp: str=None):
+def get_placeholder_ids(formula) -> tuple[list[int], list[int]]:
+    """returns the simple query IDs and the calculation factor IDs of the formula's placeholders (e.g. [SQ12], [CF3])"""
     # Regular expression to find text within square brackets
     bracket_pattern = re.compile(r"\[([A-Za-z]+)(\d+)\]")
     matches = bracket_pattern.findall(formula)
-    result = {}
     simple_query_ids = []
     calculation_factor_ids = []
-    # Loop over all placeholders and replace them with the return value of the corresponding function
     for match in matches:
         # Each 'match' is a tuple where the first item is the sequence of alphabets
         # and the second item is the sequence of numbers following it
@@ -65,10 +67,24 @@ def get_calculation_values(formula, reporting_year, layer_id, gwp: str=None):
             calculation_factor_ids.append(id)
         else:
             raise ValueError(f"No matching function for placeholder {placeholder}")
-    sq_values = calculate_sq_values(simple_query_ids, reporting_year, layer_id, gwp)
-    if not bool(sq_values) or len(sq_values) != len(simple_query_ids):
-        raise Exception(f"There is issue with getting values for Simple Queries: {simple_query_ids}")
-    cf_values = calculate_cf_values(calculation_factor_ids)
+    return simple_query_ids, calculation_factor_ids
+
+
+# Function to fetch the values of all the placeholders found in the formulas
+def get_calculation_values(formulas: list[str], reporting_year, layer_id, year_obj: dict, gwp: str=None):
+    """returns the year values of every simple query and calculation factor used by any of the formulas,
+    e.g. {"SQ12": {"1": 5.0, ...}, "CF3": {...}}. Each ID is fetched only once, however many formulas use it"""
+    simple_query_ids = set()
+    calculation_factor_ids = set()
+    for formula in formulas:
+        formula_simple_query_ids, formula_calculation_factor_ids = get_placeholder_ids(formula)
+        simple_query_ids.update(formula_simple_query_ids)
+        calculation_factor_ids.update(formula_calculation_factor_ids)
+
+    sq_values = calculate_sq_values(sorted(simple_query_ids), reporting_year, layer_id, gwp)
+    if len(sq_values) != len(simple_query_ids):
+        raise Exception(f"There is issue with getting values for Simple Queries: {sorted(simple_query_ids)}")
+    cf_values = calculate_cf_values(sorted(calculation_factor_ids), year_obj)
     result = {**sq_values, **cf_values}
     print(f"result: {result}")
     return result
@@ -82,7 +98,7 @@ def calculate_sq_values(sq_ids, reporting_year, layer_id, gwp: str=None):
     print(f"sq_qf: {sq_query_formula_dets}")
     return execute_simple_query(sq_query_formula_dets, reporting_year, layer_id, gwp)
     
-def calculate_cf_values(cf_ids):
+def calculate_cf_values(cf_ids, year_obj: dict):
     if not cf_ids:
         return {}
      # get rid of any duplicate ids
@@ -104,7 +120,7 @@ def calculate_cf_values(cf_ids):
                 value = cf_value
             else:
                 value = 0
-            for key in time_series:
+            for key in year_obj:
                 result_dict[outer_key][key] = value
         if not is_constant:
             if year_id:
@@ -112,35 +128,36 @@ def calculate_cf_values(cf_ids):
     return result_dict
 
 def evaluate_formula(formula_template, calc_values, year_obj):
-    # Loop through the years in the 'emission' dictionary.
-    for year in year_obj.keys():
-        # Start with empty calc_val and the original formula template for each calculation
-        calc_val = {}
-        formula = formula_template
-        for key, values in calc_values.items():
-            if year in values:
-                calc_val[key] = values[year]
-            else:
-                raise ValueError(f"Value for year {year} is missing for {key}")
+    """evaluates the formula for all the years of year_obj at once, writing each year's result into year_obj 
+    (None for the years where the formula can't be evaluated, e.g. a division by zero or a missing value).
+    The formula is compiled once per formula text, see formulaCompiler.compile_formula"""
+    years = list(year_obj.keys())
+    try:
+        compiled_formula = compile_formula(formula_template)
+    except ValueError as e:
+        print(f"Error evaluating formula {formula_template}: {e}")
+        for year in years:
+            year_obj[year] = None
+        return
 
-        # Replace each key in the formula with its corresponding value from calc_val
-        for key, value in calc_val.items():
-            formula = formula.replace('['+key+']', str(value))
+    # gather the value of each placeholder for every year as one vector
+    vectors = {}
+    for key in compiled_formula.placeholders:
+        if key not in calc_values:
+            raise ValueError(f"No values found for {key}")
+        values = calc_values[key]
+        for year in years:
+            if year not in values:
+                raise ValueError(f"Value for year {year} is missing for {key}")
+        vectors[key] = np.array([values[year] for year in years], dtype=float) # None becomes NaN
 
-        # Evaluate the formula after replacement and add the result to the results list
-        try:
-            # This safely evaluates an expression node or a string containing a Python expression
-            year_obj[year] = eval(formula)
-        except Exception as e:
-            print(f"Error evaluating formula {formula}: {e}")
-            year_obj[year] = None
+    results = np.broadcast_to(compiled_formula.evaluate(vectors), (len(years),))
+    for year, result in zip(years, results.tolist()):
+        year_obj[year] = None if math.isnan(result) else result
 
 
 def handle_complex_query_request(queries: list[str], reporting_year: int, layer_id: int, user_id: int):
     '''API endpoint logic that exposes the execute_complex_query() function above. Also supports multiple (single-processing) 
-    complex query requests.'''
-    response_object = {}
-    for index, query_formula in enumerate(queries):
-        print("query_formula", query_formula)
-        response_object[f"Query {index + 1}"] = execute_complex_query({"formula": query_formula}, reporting_year, layer_id)
-    return response_object
\ No newline at end of file
+    complex query requests, which are executed as one batch.'''
+    query_info = [(f"Query {index + 1}", None, {"formula": query_formula}) for index, query_formula in enumerate(queries)]
+    return execute_complex_query_batch(query_info, reporting_year, layer_id)
\ No newline at end of file
@@ -3,16 +3,15 @@ import chalicelib.src.database.constants as db_constants
 import chalicelib.src.database.methods as db_methods
 import chalicelib.src.general.helpers as helpers
 import chalicelib.src.general.globals as invdb_globals
+from chalicelib.src.query_engine.simpleQueryResults import SimpleQueryResults
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 import math
 import os
 
 
-query_formulas_info = db_methods.fetch_query_formula_name_mappings(by_query_formula_id=True, include_parameters=True)
-
-
 def prepare_query_parameters(query_info: list[tuple[str, int, dict]], gwp: str=None):
+    query_formulas_info = db_methods.fetch_query_formula_name_mappings(by_query_formula_id=True, include_parameters=True)
     prepared_queries_info = []
     invalid_queries_row_ids = []
 
@@ -41,24 +40,20 @@ def prepare_query_parameters(query_info: list[tuple[str, int, dict]], gwp: str=N
 
     return prepared_queries_info, invalid_queries_row_ids
 
-def format_response_object(results: list[tuple[str, int, float]], invalid_queries_row_ids: list[int], reporting_year: int) -> dict:
+def format_response_object(results: SimpleQueryResults, invalid_queries_row_ids: list[int], reporting_year: int) -> dict:
     '''translate query results data to the format expected by the query_engine.
        input: 
-          results: list of tuples: [0]: custom_query_id_str, [1]: reporting_year, [2]: emissions value
-          invalid_queries_row_ids: list of custom_query_id_strs where valid query logic couldn't be determined'''
-    formatted_results = {}
+          results: the result rows in columnar form ([0]: custom_query_id_str, [1]: reporting_year, [2]: emissions value)
+          invalid_queries_row_ids: list of custom_query_id_strs where valid query logic couldn't be determined
+       The results are pivoted into {custom_query_id_str: {year_id: value}} at once (see SimpleQueryResults.pivot)'''
+    time_axis = db_methods.fetch_time_axis(reporting_year) # memoized, so no database lookups are made per result
 
     # structure results for the valid simple queries
-    for result in results: 
-        if result[0] not in formatted_results:
-            formatted_results[result[0]] = {str(db_methods.fetch_year_id(result[1])): float(result[2])}
-        else: 
-            formatted_results[result[0]].update({str(db_methods.fetch_year_id(result[1])): float(result[2])})
+    formatted_results = results.pivot(time_axis, db_methods.fetch_year_id)
     
     # append results with null values for all quantities of query_ids that didn't express a valid simple query
-    max_year_id = db_methods.fetch_year_id(db_methods.fetch_max_time_series_by_reporting_year(reporting_year))
     for report_row_id in invalid_queries_row_ids:
-        formatted_results[str(report_row_id)] = {**{str(year_id): 0 for year_id in range(1, max_year_id + 1)}}
+        formatted_results[str(report_row_id)] = dict(time_axis.zero_year_object)
     
     return formatted_results
 
@@ -72,7 +67,7 @@ def execute_simple_query(query_info: list[tuple[str, int, dict]], reporting_year
        If report_type_id == 1: return an emissions simple query
        If report_type_id == 2: return a QC simple query'''
     if isinstance(query_info, list) and len(query_info) == 0:
-        return format_response_object({}, [query[0] for query in query_info], reporting_year)
+        return format_response_object(SimpleQueryResults.empty(), [query[0] for query in query_info], reporting_year)
 
     # prepare the queries
     prepared_queries_info, invalid_queries_row_ids_from_prep = prepare_query_parameters(query_info, gwp)
@@ -80,11 +75,11 @@ def execute_simple_query(query_info: list[tuple[str, int, dict]], reporting_year
     if len(invalid_queries_row_ids_from_prep) > 0:
         helpers.tprint(f"handle_load_online_report_request(): WARNING: The following queries have one or more missing parameter values, and thus cannot be executed: {invalid_queries_row_ids_from_prep}")
 
-    # process the queries (in batches if needed)
+    # process the queries (in batches if needed), collecting the columnar results of each batch
     results = []
     all_invalid_queries_row_ids = []
     all_invalid_queries_row_ids += invalid_queries_row_ids_from_prep
-    batch_size = db_constants.QUERIES_PER_REQUEST
+    batch_size = db_constants.SIMPLE_QUERIES_PER_REQUEST
     query_count = len(prepared_queries_info)
     batch_count = math.ceil(query_count / batch_size)
     batch_number = 1
@@ -105,7 +100,7 @@ def execute_simple_query(query_info: list[tuple[str, int, dict]], reporting_year
 
             for future in as_completed(futures):
                 results_this_batch, invalid_queries_this_batch = future.result()
-                results += results_this_batch
+                results.append(results_this_batch)
                 all_invalid_queries_row_ids += invalid_queries_this_batch
 
             executor.shutdown(wait=True)
@@ -118,12 +113,12 @@ def execute_simple_query(query_info: list[tuple[str, int, dict]], reporting_year
                 batch = prepared_queries_info[-(len(prepared_queries_info) % batch_size):]
             helpers.tprint(f"Processing simple query batch {batch_number} of {batch_count}...")
             results_this_batch, invalid_queries_this_batch = queries.process_simple_query_batch(batch, reporting_year, layer_id)
-            results += results_this_batch
+            results.append(results_this_batch)
             all_invalid_queries_row_ids += invalid_queries_this_batch
             batch_number += 1
     #====================================================================
 
-    return format_response_object(results, all_invalid_queries_row_ids, reporting_year)
+    return format_response_object(SimpleQueryResults.concatenate(results), all_invalid_queries_row_ids, reporting_year)
 
 
 def handle_simple_query_request(queries: list[tuple[int, dict]], reporting_year: int, layer_id: int, user_id: int) -> dict:
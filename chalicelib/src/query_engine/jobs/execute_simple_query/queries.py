@@ -1,35 +1,139 @@
 import chalicelib.src.database.constants as db_constants
 import chalicelib.src.database.methods as db_methods
 import chalicelib.src.general.helpers as helpers
+import chalicelib.src.general.globals as invdb_globals
+from chalicelib.src.query_engine.simpleQueryCache import SimpleQueryCache
+from chalicelib.src.query_engine.simpleQueryResults import SimpleQueryResults
 
 
-def process_simple_query_batch(query_batch: [tuple], reporting_year: int, layer_id: int) -> [tuple]:
+# results of the simple query functions, reused until the rollup tables of their pub year and layer are refreshed
+simple_query_cache = SimpleQueryCache(invdb_globals.simple_query_cache_max_entries)
+
+
+def fetch_rollup_refresh_stamp(pub_year_id: int, layer_id: int):
+    """returns the (refresh_status, last_update_date) of the rollup tables of the pub year and layer, which changes
+    with every refresh (see update_refresh_status_rollup_table). Returns None while a refresh is in progress"""
+    query = f"""SELECT refresh_status, last_update_date
+                FROM {db_constants.DB_TABLES["REFRESH_STATUS_ROLLUP_TABLE"]}
+                WHERE pub_year_id = %s AND layer_id = %s
+                LIMIT 1;"""
+    results = db_methods.get_query_results(query, (pub_year_id, layer_id))
+    if not results:
+        return (None, None)
+    if results[0][0] == 'In Progress':
+        return None
+    return tuple(results[0])
+
+
+def fetch_simple_query_results(query_batch: [tuple], pub_year_id: int, layer_id: int) -> ([tuple], bool):
+    """runs the queries and returns their result rows (each prefixed with the query's custom_query_id_str), 
+    ordered by query_id_str and year, along with whether all the queries ran without errors. The queries are 
+    grouped by query function, and each group runs as one set-based prepared statement (see db_methods.execute_query_function_set). Queries that can't run that way 
+    are sent in one UNION ALL statement instead"""
+    queries_by_function = {}
+    for query in query_batch:
+        queries_by_function.setdefault((query[1], len(query[2])), []).append(query)
+
+    results = []
+    union_queries = []
+    is_complete = True
+    conn = db_methods.db_pool.get_connection()
+    try:
+        for (function_name, _), function_queries in queries_by_function.items():
+            function_results = db_methods.execute_query_function_set(
+                conn,
+                function_name,
+                [pub_year_id, layer_id],
+                [(str(query[0]),) + tuple(query[2]) for query in function_queries],
+                "query_id_str",
+                "text",
+                ["year"],
+            )
+            if function_results is None:
+                union_queries += function_queries
+            else:
+                results += function_results
+        conn.rollback() # end the read-only transaction (prepared statements are kept)
+    except Exception as e:
+        conn.rollback()
+        is_complete = False
+        print(
+            f"""An error occurred while executing a simple query batch. See details below: 
+            QUERIES:    {query_batch}
+            ERROR:      {e}""")
+    finally:
+        db_methods.db_pool.return_connection(conn)
+
+    if len(union_queries) > 0:
+        # generate the SQL query statement
+        SQL_statement = ""
+        for query in union_queries:
+            SQL_statement += f"""SELECT '{query[0]}' AS query_id_str, *
+            FROM ggds_invdb.{query[1]}{helpers.get_sql_list_str([pub_year_id, layer_id] + list(query[2]))}
+            UNION ALL\n"""
+        SQL_statement = SQL_statement[:-10] # strip the trailing 'UNION ALL\n'
+        # SQL_statement += f"ORDER BY report_row_id,{' geo_ref, ' if report_type == report_constants.REPORT_TYPES['STATE'] else ' '} year;" # for when state reports are supported
+        SQL_statement += f"ORDER BY query_id_str, year;"
+        union_results = db_methods.get_query_results(SQL_statement)
+        if union_results not in [None, (None, None)]:
+            results += union_results
+        else:
+            is_complete = False # get_query_results() doesn't tell errors and empty results apart
+
+    if len(queries_by_function) > 1 or (len(union_queries) > 0 and len(union_queries) < len(query_batch)):
+        results.sort(key=lambda row: row[0]) # stable, so each query's rows keep their year order
+    return results, is_complete
+
+
+def get_simple_query_cache_statistics() -> dict:
+    """returns the hit/miss statistics of the simple query result cache"""
+    return simple_query_cache.get_statistics()
+
+
+def process_simple_query_batch(query_batch: [tuple], reporting_year: int, layer_id: int) -> (SimpleQueryResults, [str]):
     """based on report processing's process_report_query_batch. 
     INPUT: list of tuples. Each tuple represents a query formula call
     ([0]: custom_query_id_str, 
      [1]: formula_prefix, 
      [2:]: variable number of arguments to pass to the query function.)
-    OUTPUT: dict where keys denote the result report_row_id and map to the row 
-    of values from 1990 to the max time series to write into Query_Results
-    tab of the report"""
-    # generate the SQL query statement
+    OUTPUT: the result rows in columnar form (SimpleQueryResults), and the list of 
+    custom_query_id_strs that didn't get any results.
+    Results are served from simple_query_cache while the rollup tables of the pub year and layer 
+    are unchanged, so only the queries missing from the cache are sent to the database"""
     all_query_ids = [str(query[0]) for query in query_batch]
     pub_year_id = db_methods.fetch_pub_year_id(reporting_year)
-    SQL_statement = ""
+
+    # look up the cached results (the gwp is part of the query's arguments)
+    refresh_stamp = fetch_rollup_refresh_stamp(pub_year_id, layer_id) if simple_query_cache.is_enabled() else None
+    results = []
+    uncached_queries = []
     for query in query_batch:
-        SQL_statement += f"""SELECT '{query[0]}' AS query_id_str, *
-        FROM ggds_invdb.{query[1]}{helpers.get_sql_list_str([pub_year_id, layer_id] + list(query[2]))}
-        UNION ALL\n"""
-    SQL_statement = SQL_statement[:-10] # strip the trailing 'UNION ALL\n'
-    # SQL_statement += f"ORDER BY report_row_id,{' geo_ref, ' if report_type == report_constants.REPORT_TYPES['STATE'] else ' '} year;" # for when state reports are supported
-    SQL_statement += f"ORDER BY query_id_str, year;"
-    results = db_methods.get_query_results(SQL_statement)
+        cached_rows = None
+        if refresh_stamp is not None:
+            cached_rows = simple_query_cache.get((query[1], tuple(query[2]), pub_year_id, layer_id), refresh_stamp)
+        if cached_rows is None:
+            uncached_queries.append(query)
+        else:
+            results += [(str(query[0]),) + row for row in cached_rows]
+
+    if len(uncached_queries) > 0:
+        query_results, is_complete = fetch_simple_query_results(uncached_queries, pub_year_id, layer_id)
+
+        # cache the rows of each query (queries without any rows are cached as well)
+        if refresh_stamp is not None and is_complete:
+            rows_by_query_id = {str(query[0]): [] for query in uncached_queries}
+            for row in query_results:
+                rows_by_query_id[row[0]].append(tuple(row[1:]))
+            for query in uncached_queries:
+                simple_query_cache.put((query[1], tuple(query[2]), pub_year_id, layer_id), refresh_stamp, tuple(rows_by_query_id[str(query[0])]))
+        results += query_results
 
     # No data case
-    if results in [None, (None, None)]:
-        return [], all_query_ids
+    if len(results) == 0:
+        return SimpleQueryResults.empty(), all_query_ids
 
     # gather the query_ids that didn't get results
-    query_ids_with_results = set([query_results[0] for query_results in results])
+    results = SimpleQueryResults.from_rows(results)
+    query_ids_with_results = results.get_query_ids()
     no_results_query_ids = [query_id for query_id in all_query_ids if query_id not in query_ids_with_results]
-    return results, no_results_query_ids
\ No newline at end of file
+    return results, no_results_query_ids
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+import threading
+
+"""in-process cache for the results of the simple query functions (ggds_invdb.<view_name>(pub_year_id, layer_id, ...)).
+The query functions read the rollup tables, which only change when a source file load refreshes them, so every
+entry is stamped with the refresh status row (refresh_status, last_update_date) of its pub year and layer.
+An entry is only served while that row is unchanged, and nothing is cached while a refresh is in progress"""
+class SimpleQueryCache:
+
+    def __init__(self, max_entries: int):
+        """max_entries: the number of query results kept before the least recently used are dropped (0 disables the cache)"""
+        self._max_entries = max_entries
+        self._entries = OrderedDict()  # (formula_prefix, arguments, pub_year_id, layer_id) -> (refresh stamp, result rows)
+        self._lock = threading.Lock()
+        self._statistics = {"hits": 0, "misses": 0}
+
+    def is_enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def get(self, key: tuple, refresh_stamp: tuple):
+        """returns the result rows cached under the key for the given refresh stamp, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != refresh_stamp:
+                self._statistics["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._statistics["hits"] += 1
+            return entry[1]
+
+    def put(self, key: tuple, refresh_stamp: tuple, rows: tuple) -> None:
+        """caches the result rows (without the query ID column) of the query under the key"""
+        if not self.is_enabled():
+            return
+        with self._lock:
+            self._entries[key] = (refresh_stamp, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, pub_year_id: int = None, layer_id: int = None) -> None:
+        """drops the entries of the pub year and layer, or all entries if neither is given"""
+        with self._lock:
+            stale_keys = [
+                key for key in self._entries
+                if (pub_year_id is None or key[2] == pub_year_id) and (layer_id is None or key[3] == layer_id)
+            ]
+            for key in stale_keys:
+                del self._entries[key]
+
+    def get_statistics(self) -> dict:
+        """returns the hit/miss counters and the number of cached query results"""
+        with self._lock:
+            return {**self._statistics, "entries": len(self._entries)}
+
+    def __repr__(self):
+        return f"<SimpleQueryCache Object: {self.get_statistics()}>"
@@ -0,0 +1,89 @@
+from chalicelib.src.general.models.TimeAxis import TimeAxis
+import itertools
+import numpy as np
+
+"""columnar container for the result rows of simple queries. Rows of (query_id_str, year, value) are held
+as three parallel arrays, so batches are combined by concatenating arrays and the query engine's response
+object ({query_id_str: {year_id: value}}) is built with one vectorized pivot instead of a dict update per cell"""
+class SimpleQueryResults:
+
+    def __init__(self, query_ids: np.ndarray, years: np.ndarray, values: np.ndarray):
+        """query_ids: object array of query_id_strs, years: integer array, values: float array (NaN for NULL values)"""
+        self.query_ids = query_ids
+        self.years = years
+        self.values = values
+
+    @classmethod
+    def from_rows(cls, rows: [tuple]):
+        """builds the columns from result rows ([0]: query_id_str, [1]: year, [2]: value)"""
+        if len(rows) == 0:
+            return cls.empty()
+        query_ids, years, values = zip(*[row[0:3] for row in rows])
+        return cls(np.array(query_ids, dtype=object), np.array(years, dtype=np.int64), np.array(values, dtype=float))
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=object), np.empty(0, dtype=np.int64), np.empty(0, dtype=float))
+
+    @classmethod
+    def concatenate(cls, results: list):
+        """combines the results of several batches into one"""
+        results = [result for result in results if len(result) > 0]
+        if len(results) == 0:
+            return cls.empty()
+        if len(results) == 1:
+            return results[0]
+        return cls(
+            np.concatenate([result.query_ids for result in results]),
+            np.concatenate([result.years for result in results]),
+            np.concatenate([result.values for result in results]),
+        )
+
+    def __len__(self):
+        return len(self.query_ids)
+
+    def get_query_ids(self) -> set:
+        """returns the set of query_id_strs that have at least one result row"""
+        return set(self.query_ids.tolist())
+
+    def pivot(self, time_axis: TimeAxis, fetch_year_id) -> dict:
+        """returns the results as {query_id_str: {year_id (str): value}}, with the queries in the order of their
+        first row and the years in time series order. Years outside of the time axis are keyed by fetch_year_id(year).
+        NULL values are given as None"""
+        if len(self) == 0:
+            return {}
+        unique_query_ids, first_rows, query_positions = np.unique(self.query_ids, return_index=True, return_inverse=True)
+        query_order = np.argsort(first_rows, kind="stable")
+
+        # place every value into a (query x year) matrix, with the years outside of the axis in extra columns
+        axis_years = np.asarray(time_axis.years, dtype=np.int64)
+        year_positions = np.searchsorted(axis_years, self.years)
+        in_axis = year_positions < len(axis_years)
+        in_axis[in_axis] = axis_years[year_positions[in_axis]] == self.years[in_axis]
+        year_keys = list(time_axis.year_id_keys)
+        if not in_axis.all():
+            other_years, other_positions = np.unique(self.years[~in_axis], return_inverse=True)
+            year_positions[~in_axis] = len(year_keys) + other_positions
+            year_keys += [str(fetch_year_id(year)) for year in other_years.tolist()]
+        matrix = np.full((len(unique_query_ids), len(year_keys)), np.nan)
+        present = np.zeros((len(unique_query_ids), len(year_keys)), dtype=bool)
+        matrix[query_positions, year_positions] = self.values
+        present[query_positions, year_positions] = True
+
+        # each query's dict is built from its matrix row at once (rows with gaps keep only the years they have)
+        matrix_rows = matrix.tolist()
+        for query_position, year_position in np.argwhere(present & np.isnan(matrix)).tolist(): # NULL values, which have to reach the response as null rather than NaN
+            matrix_rows[query_position][year_position] = None
+        complete_rows = present.all(axis=1).tolist()
+        formatted_results = {}
+        for position in query_order.tolist():
+            if complete_rows[position]:
+                formatted_results[unique_query_ids[position]] = dict(zip(year_keys, matrix_rows[position]))
+            else:
+                formatted_results[unique_query_ids[position]] = dict(zip(
+                    itertools.compress(year_keys, present[position]), itertools.compress(matrix_rows[position], present[position])
+                ))
+        return formatted_results
+
+    def __repr__(self):
+        return f"<SimpleQueryResults Object: {len(self)} rows>"
@@ -7,8 +7,9 @@ from chalicelib.src.jobs.models.Job import Job as Job_Class
 from chalicelib.src.query_engine.methods import execute_queries_by_class
 import chalicelib.src.general.globals as invdb_globals
 import chalicelib.src.general.helpers as helpers
-from concurrent.futures import ThreadPoolExecutor
-from flask import jsonify
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import jsonify, Response, stream_with_context, current_app
+import itertools
 import json
 
 
@@ -57,27 +58,100 @@ def prepare_queries_info_for_processing(report_queries_by_class_and_type: dict)
     return prepared_queries_by_class_and_type
 
 
-def execute_report_queries_with_query_engine(prepared_report_queries_by_class_and_type: list[tuple], reporting_year: int, layer_id: int, gwp: str=None) -> dict:
+def iterate_report_queries_with_query_engine(prepared_report_queries_by_class_and_type: dict, reporting_year: int, layer_id: int, gwp: str=None, in_completion_order: bool=False):
+    """passes each class/type group of the prepared queries (simple emissions, complex QC, etc.) to the query_engine 
+    and yields the results dict of each group. The groups are independent of each other, so they are executed 
+    concurrently (up to invdb_globals.online_report_query_group_workers at a time, each on its own pooled 
+    connections). Results are yielded in class and type priority order, or as soon as each group is done
+    if in_completion_order is set."""
+    query_groups = [
+        (class_name, prepared_report_queries_by_class_and_type[class_name][type_name])
+        for class_name in prepared_report_queries_by_class_and_type
+        for type_name in prepared_report_queries_by_class_and_type[class_name]
+    ]
+
+    if invdb_globals.allow_multithreading and len(query_groups) > 1:
+    #=================== multi-threaded version ========================
+        with ThreadPoolExecutor(max_workers=invdb_globals.online_report_query_group_workers) as executor:
+            futures = [
+                executor.submit(execute_queries_by_class, class_queries, class_name, reporting_year, layer_id, gwp)
+                for class_name, class_queries in query_groups
+            ]
+            for future in (as_completed(futures) if in_completion_order else futures):
+                yield future.result()
+    #=================== single-threaded version ========================
+    else:
+        for class_name, class_queries in query_groups:
+            # send the queries to the appropriate query_engine worker and record the results
+            yield execute_queries_by_class(class_queries, class_name, reporting_year, layer_id, gwp)
+    #====================================================================
+
+
+def execute_report_queries_with_query_engine(prepared_report_queries_by_class_and_type: dict, reporting_year: int, layer_id: int, gwp: str=None) -> dict:
     """takes a list of OnlineReportQuery objects (simple, complex, etc.), passes each query
-    to the query_engine, and attaches the results to each object under the `results` attribute."""
+    to the query_engine, and attaches the results to each object under the `results` attribute.
+    The results of all the class/type groups are merged in class and type priority order."""
     combined_results = {}
-    for class_name in prepared_report_queries_by_class_and_type:
-        # gather all the queries in the current class
-        all_class_queries = []
-        for type_name in prepared_report_queries_by_class_and_type[class_name]:
-            all_class_queries += prepared_report_queries_by_class_and_type[class_name][type_name]
-
-        # send all those queries to the appropriate query_engine worker and record the results in a list
-        results = execute_queries_by_class(all_class_queries, class_name, reporting_year, layer_id, gwp)
+    for results in iterate_report_queries_with_query_engine(prepared_report_queries_by_class_and_type, reporting_year, layer_id, gwp):
         combined_results.update(results)
-
     return combined_results
 
 
-def handle_load_online_report_request(report_id: int, report_type_id: int, user_id: int, gwp: str=None):
+def add_query_results_to_report_rows(report_rows: dict, query_results_by_query_id: dict) -> set:
+    """adds query results (keyed by custom_query_id_str, i.e. `<report_row_id>__<query type>`) to the report row 
+    objects of the response, creating the rows as needed. Returns the custom_query_id_strs that were added"""
+    for query_id, query_results in query_results_by_query_id.items():
+        report_row_id, query_type = query_id.split("__") # parse the custom_query_id_str into its original components
+        if report_row_id not in report_rows:
+            report_rows[report_row_id] = {"report_row_id": report_row_id, db_constants.QUERY_TYPES[query_type.upper()]["time_series_name"]: query_results}
+        else:
+            report_rows[report_row_id].update({db_constants.QUERY_TYPES[query_type.upper()]["time_series_name"]: query_results})
+    return set(query_results_by_query_id.keys())
+
+
+def generate_streamed_online_report(report_id: int, expected_query_ids: list[str], query_results_batches, this_job: Job_Class):
+    """generator for the streaming response of the online report. Writes the same JSON object as the regular 
+    response, but encodes and sends each report row as soon as the results of all its queries are in (rows 
+    therefore arrive in completion order). query_results_batches: iterable of {custom_query_id_str: results} dicts.
+    If an error occurs after the response has started, the object is closed with a "traceback" member instead"""
+    pending_query_ids = {}
+    for query_id in expected_query_ids:
+        pending_query_ids.setdefault(query_id.split("__")[0], set()).add(query_id)
+
+    yield f'{{"report_id": {json.dumps(report_id)}, "query_results": ['
+    report_rows = {}
+    row_separator = ""
+    try:
+        for query_results in query_results_batches:
+            for query_id in add_query_results_to_report_rows(report_rows, query_results):
+                report_row_id = query_id.split("__")[0]
+                pending_query_ids.get(report_row_id, set()).discard(query_id)
+                if report_row_id in report_rows and len(pending_query_ids.get(report_row_id, ())) == 0:
+                    yield row_separator + current_app.json.dumps(report_rows.pop(report_row_id))
+                    row_separator = ", "
+        # send any rows that are still missing the results of some queries
+        for report_row in report_rows.values():
+            yield row_separator + current_app.json.dumps(report_row)
+            row_separator = ", "
+        yield "]}"
+        helpers.tprint("Done.")
+
+    except Exception:
+        from chalicelib.src.database.methods import get_pgdb_connection
+        import traceback
+        this_job.update_status("ERROR")
+        pgdb_connection = get_pgdb_connection()
+        pgdb_connection.rollback()
+        traceback_obj = traceback.format_exc()
+        helpers.tprint(traceback_obj)
+        yield f'], "traceback": {json.dumps(traceback_obj)}}}'
+
+
+def handle_load_online_report_request(report_id: int, report_type_id: int, user_id: int, gwp: str=None, stream: bool=False):
     """Load online report API logic. Will fetch ALL report queries pertaining to the input online report, 
        split the queries by their classes, and direct those sets of queries to the appropriate query engine executors,
-       and then combines the result sets into a single response object."""
+       and then combines the result sets into a single response object.
+       If stream is set, the response is streamed instead, one report row at a time (see generate_streamed_online_report)."""
     this_job = Job_Class(
         job_constants.LOAD_ONLINE_REPORT_NAME,
         job_constants.LOAD_ONLINE_REPORT_DESC,
@@ -114,6 +188,7 @@ def handle_load_online_report_request(report_id: int, report_type_id: int, user_
 
 
         # place any queries with parameters = None to a special list so they return all 0s instead of being processed by the query engine
+        all_query_ids = [f'{query[0]}__{query[6]}' for query in report_queries_info]
         invalid_query_ids = [f'{query[0]}__{query[6]}' for query in report_queries_info if query[2] is None]
         report_queries_info = list(filter(lambda x: x[2] is not None, report_queries_info))
         
@@ -127,6 +202,25 @@ def handle_load_online_report_request(report_id: int, report_type_id: int, user_
         # prepare the query formula info so it can be passed to the batch processor
         prepared_report_queries_by_class_and_type = prepare_queries_info_for_processing(report_queries_by_class_and_type)
        
+        # the invalid queries' all zero data
+        max_year_id = db_methods.fetch_year_id(db_methods.fetch_max_time_series_by_reporting_year(reporting_year))
+        invalid_queries_results = {invalid_query_id: {str(year_id): 0 for year_id in range(1, max_year_id + 1)} for invalid_query_id in invalid_query_ids}
+
+        if stream:
+            helpers.tprint("Processing queries with query engine and streaming the response object...")
+            this_job.post_event(
+                "LOAD_ONLINE_REPORT",
+                "STREAMING_RESPONSE_OBJECT"
+            )
+            query_results_batches = itertools.chain(
+                [invalid_queries_results],
+                iterate_report_queries_with_query_engine(prepared_report_queries_by_class_and_type, reporting_year, layer_id, gwp, in_completion_order=True),
+            )
+            return Response(
+                stream_with_context(generate_streamed_online_report(report_id, all_query_ids, query_results_batches, this_job)),
+                mimetype="application/json",
+            ), 200
+
         helpers.tprint("Processing queries with query engine...")
         this_job.post_event(
             "LOAD_ONLINE_REPORT",
@@ -136,9 +230,7 @@ def handle_load_online_report_request(report_id: int, report_type_id: int, user_
         report_queries_results = execute_report_queries_with_query_engine(prepared_report_queries_by_class_and_type, reporting_year, layer_id, gwp)
         
         # add the invalid queries' all zero data to the result set
-        max_year_id = db_methods.fetch_year_id(db_methods.fetch_max_time_series_by_reporting_year(reporting_year))
-        for invalid_query_id in invalid_query_ids:
-            report_queries_results.update({invalid_query_id: {str(year_id): 0 for year_id in range(1, max_year_id + 1)}})
+        report_queries_results.update(invalid_queries_results)
 
         helpers.tprint("Constructing and sending response object...")
         this_job.post_event(
@@ -148,12 +240,7 @@ def handle_load_online_report_request(report_id: int, report_type_id: int, user_
 
         # construct the response object
         queries_data_obj = {}
-        for query_id, query_results in report_queries_results.items():
-            report_row_id, query_type = query_id.split("__") # parse the custom_query_id_str into its original components
-            if report_row_id not in queries_data_obj:
-                queries_data_obj[report_row_id] = {"report_row_id": report_row_id, db_constants.QUERY_TYPES[query_type.upper()]["time_series_name"]: query_results}
-            else:
-                queries_data_obj[report_row_id].update({db_constants.QUERY_TYPES[query_type.upper()]["time_series_name"]: query_results})
+        add_query_results_to_report_rows(queries_data_obj, report_queries_results)
 
                     
         # convert the data object to a list
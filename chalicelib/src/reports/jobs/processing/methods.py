@@ -33,85 +33,89 @@ def create_reports_by_type(report_query_results: list, reporting_year: int) -> [
     return reports
 
 
+def process_report(report: Report, error_rows: [int], query_formula_info, reporting_year: int, layer_id: int, this_job: Job, connection=None) -> None:
+    """processes a single report and writes its contents back to the database as soon as it is done 
+    (see batch_update_report_content_in_database). The report's queries, content update and job events all go 
+    through the given connection (default: the shared connection). Sets report.process_result to "SUCCESS" or "FAILED" """
+    try:
+        with report as opened_report:
+            helpers.tprint(f"Processing report with report ID: {opened_report.get_report_id()}...")
+            opened_report.process_contents(
+                error_rows[report.get_report_id()],
+                query_formula_info,
+                reporting_year,
+                layer_id,
+                this_job,
+                connection
+            )
+        report.process_result = "SUCCESS"
+        batch_update_report_content_in_database([report], connection)
+        this_job.post_event(
+            "REPORT_PROCESSING",
+            "REPORT_PROCESSING_SUCCESSFUL",
+            report.get_report_id()
+        )
+    except Exception as e:
+        traceback_obj = traceback.format_exc()
+        helpers.tprint(
+            f"Failed to process report with report ID: {report.get_report_id()}. Refer to traceback below:"
+        )
+        report.process_result = "FAILED"
+        this_job.post_event(
+            "REPORT_PROCESSING",
+            "REPORT_PROCESSING_FAILED",
+            report.get_report_id()
+        )
+        helpers.tprint(traceback_obj)
+
+
+def process_report_with_pooled_connection(report: Report, error_rows: [int], query_formula_info, reporting_year: int, layer_id: int, this_job: Job) -> None:
+    """thread task of the multi-threaded mode: processes the report on a connection of its own from the pool, 
+    posting the report's job events through that connection"""
+    connection = db_methods.db_pool.get_connection()
+    try:
+        process_report(report, error_rows, query_formula_info, reporting_year, layer_id, this_job.with_connection(connection), connection)
+    finally:
+        connection.rollback() # leave no open transaction on the pooled connection
+        db_methods.db_pool.return_connection(connection)
+
+
 def batch_process_reports(reports: [Report], error_rows: {int: [int]}, query_formula_info, reporting_year: int, layer_id: int, this_job: Job) -> None:
     """takes a list of reports and the errors rows {report_id: [error_row_numbers]}.
     This method will add a bool attribute to each report object denoting whether
-    it could process to completion"""
-    # assign each thread its own report to edit
+    it could process to completion. The contents of each report are written back 
+    to the database as soon as that report is done"""
     this_job.post_event(
         "REPORT_PROCESSING",
         "OPENING_REPORTS",
     )
     # ===================== multi-threaded mode ==============================
-    if False: #invdb_globals.allow_multithreading:
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            futures = []
-            for report in reports:
-                try:
-                    with report as opened_report:
-                        helpers.tprint(f"Processing report with report ID: {opened_report.get_report_id()}...")
-                        # define the thread task as processing a single report
-                        future = executor.submit(
-                            opened_report.process_contents,
-                            error_rows[report.get_report_id()],
-                            query_formula_info,
-                            reporting_year,
-                            layer_id,
-                            this_job
-                        )
-                        futures.append(future)
-                        report.process_result = "SUCCESS"
-                        this_job.post_event(
-                            "REPORT_PROCESSING",
-                            "REPORT_PROCESSING_SUCCESSFUL",
-                            report.get_report_id()
-                        )
-                except Exception as e:
-                    traceback_obj = traceback.format_exc()
-                    helpers.tprint(
-                        f"Failed to process report with report ID: {report.get_report_id()}. Refer to traceback below:"
-                    )
-                    report.process_result = "FAILED"
-                    this_job.post_event(
-                        "REPORT_PROCESSING",
-                        "REPORT_PROCESSING_FAILED",
-                        report.get_report_id()
-                    )
-                    helpers.tprint(traceback_obj)
-            
-            executor.shutdown(wait=True)
+    if invdb_globals.allow_multithreading and len(reports) > 1:
+        # assign each thread its own report to edit, along with its own pooled connection and job event stream
+        max_workers = min(
+            invdb_globals.report_processing_max_workers or os.cpu_count(), 
+            max(1, invdb_globals.db_pooling_max_connections // 2), # leave room in the pool for the lookups made along the way
+            len(reports)
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    process_report_with_pooled_connection,
+                    report,
+                    error_rows,
+                    query_formula_info,
+                    reporting_year,
+                    layer_id,
+                    this_job
+                )
+                for report in reports
+            ]
+            for future in futures:
+                future.result()
     # ========================= single threaded mode ======================
     else:
         for report in reports:
-            try:
-                with report as opened_report:
-                    # define the thread task as processing a single report
-                    helpers.tprint(f"Processing report with report ID: {opened_report.get_report_id()}...")
-                    opened_report.process_contents(
-                        error_rows[report.get_report_id()],
-                        query_formula_info,
-                        reporting_year,
-                        layer_id,
-                        this_job
-                    )
-                    report.process_result = "SUCCESS"
-                    this_job.post_event(
-                        "REPORT_PROCESSING",
-                        "REPORT_PROCESSING_SUCCESSFUL",
-                        report.get_report_id()
-                    )
-            except Exception as e:
-                traceback_obj = traceback.format_exc()
-                helpers.tprint(
-                    f"Failed to process report with report ID: {report.get_report_id()}. Refer to traceback below:"
-                )
-                report.process_result = "FAILED"
-                this_job.post_event(
-                    "REPORT_PROCESSING",
-                    "REPORT_PROCESSING_FAILED",
-                    report.get_report_id()
-                )
-                helpers.tprint(traceback_obj)
+            process_report(report, error_rows, query_formula_info, reporting_year, layer_id, this_job)
     # =====================================================================
 
 
@@ -157,8 +161,7 @@ def handle_report_processing_request(reporting_year: int,   layer_id: int,   use
         batch_process_reports(reports, error_rows, query_formula_info, reporting_year, layer_id, this_job)
 
         helpers.tprint("Updating reports in the database...")
-        batch_update_report_content_in_database(reports)
-        batch_update_report_processing_dates_in_database(reports, user_id)
+        batch_update_report_processing_dates_in_database(reports, user_id) # (the contents are written as each report finishes)
 
         this_job.update_status("COMPLETE")
         helpers.tprint(f"Done.")
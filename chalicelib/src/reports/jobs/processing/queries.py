@@ -46,36 +46,67 @@ def fetch_report_validation_error_rows(reports: [Report]) -> [(int, int)] or Non
                 error_rows.update({id: []})
     return error_rows
 
-def process_report_query_batch(query_batch: [tuple], query_formula_info: dict, report_type, reporting_year: int, layer_id: int) -> [tuple]:
+def process_report_query_batch(query_batch: [tuple], query_formula_info: dict, report_type, reporting_year: int, layer_id: int, connection=None) -> [tuple]:
     """input: list of tuples. Each tuple represents a query formula call
     ([0]: row number within report, [1]: formula_prefix, [2:]: variable 
     number of arguments to pass to the query function.)
+    The queries run on the given connection (default: the module's shared connection).
     output: dict where keys denote the result row number and map to the row 
     of values from 1990 to the max time series to write into Query_Results
     tab of the report"""
-    # generate the SQL query statement
+    connection = pgdb_connection if connection is None else connection
     pub_year_id = db_methods.fetch_pub_year_id(reporting_year)
-    SQL_statement = ""
+    order_by = ["geo_ref", "year"] if report_type == report_constants.REPORT_TYPES['STATE'] else ["year"]
+
+    # run the queries of each query function as one set-based prepared statement
+    queries_by_function = {}
     for query in query_batch:
-        mapped_function_name = query_formula_info[query[1]]
-        argument_list_str = ", ".join([f"'{arg}'" for arg in query[2:]])
-        SQL_statement += f"""SELECT {query[0]} AS row, *
-        FROM ggds_invdb.{mapped_function_name}{helpers.get_sql_list_str([pub_year_id, layer_id] + list(query[2:]))}
-        UNION ALL\n"""
-    SQL_statement = SQL_statement[:-10] # strip the trailing 'UNION ALL\n'
-    SQL_statement += f"ORDER BY row,{' geo_ref, ' if report_type == report_constants.REPORT_TYPES['STATE'] else ' '} year;"
+        queries_by_function.setdefault((query_formula_info[query[1]], len(query) - 2), []).append(query)
+    results = []
+    union_queries = []
+    for (mapped_function_name, _), function_queries in queries_by_function.items():
+        function_results = db_methods.execute_query_function_set(
+            connection,
+            mapped_function_name,
+            [pub_year_id, layer_id],
+            [(query[0],) + tuple(query[2:]) for query in function_queries],
+            "row",
+            "integer",
+            order_by,
+        )
+        if function_results is None:
+            union_queries += function_queries
+        else:
+            results += function_results
 
-    cursor = pgdb_connection.cursor()
-    cursor.execute(SQL_statement)
-    results = cursor.fetchall()
+    # the queries that can't run that way are sent in one UNION ALL statement
+    if len(union_queries) > 0:
+        # generate the SQL query statement
+        SQL_statement = ""
+        for query in union_queries:
+            mapped_function_name = query_formula_info[query[1]]
+            SQL_statement += f"""SELECT {query[0]} AS row, *
+            FROM ggds_invdb.{mapped_function_name}{helpers.get_sql_list_str([pub_year_id, layer_id] + list(query[2:]))}
+            UNION ALL\n"""
+        SQL_statement = SQL_statement[:-10] # strip the trailing 'UNION ALL\n'
+        SQL_statement += f"ORDER BY row,{' geo_ref, ' if report_type == report_constants.REPORT_TYPES['STATE'] else ' '} year;"
+
+        cursor = connection.cursor()
+        cursor.execute(SQL_statement)
+        results += cursor.fetchall()
+
+    if len(queries_by_function) > 1 or (len(union_queries) > 0 and len(union_queries) < len(query_batch)):
+        results.sort(key=lambda row: row[0]) # stable, so each row's results keep their (geo_ref,) year order
     width = pub_year_id + 22 # width of the time series
     
     return results, width
 
 
-def batch_update_report_content_in_database(reports: [Report]) -> None:
+def batch_update_report_content_in_database(reports: [Report], connection=None) -> None:
     """updates the content field of the database with the file contents including the processed query results.
-    Only applies to reports that could process to completion."""
+    Only applies to reports that could process to completion. Written through the given connection (default: the 
+    module's shared connection)."""
+    connection = pgdb_connection if connection is None else connection
     # Construct the UPDATE query
     reports_thats_processed_successfully = [rep for rep in reports if rep.process_result == "SUCCESS"]
     if len(reports_thats_processed_successfully) == 0:
@@ -98,11 +129,11 @@ def batch_update_report_content_in_database(reports: [Report]) -> None:
         WHERE report_id IN {helpers.get_sql_list_str([report.get_report_id() for report in reports_thats_processed_successfully])}
     """
     try:
-        cursor = pgdb_connection.cursor()
+        cursor = connection.cursor()
         cursor.execute(update_query)
-        pgdb_connection.commit()
+        connection.commit()
     except Exception as error:
-        pgdb_connection.rollback()
+        connection.rollback()
         raise error from None
 
 
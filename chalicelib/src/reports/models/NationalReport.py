@@ -36,9 +36,10 @@ class NationalReport(Report):
     def __repr__(self):
         return "<National " + super().__repr__()[1:]
 
-    def process_contents(self, error_rows: [int], query_formula_info, reporting_year: int, layer_id: int, this_job: Job) -> None:
+    def process_contents(self, error_rows: [int], query_formula_info, reporting_year: int, layer_id: int, this_job: Job, connection=None) -> None:
         """takes a single national report and the list of its validation error rows, and updates the contents
-        of the national report file to include the processed query results in the Query_Results tab"""
+        of the national report file to include the processed query results in the Query_Results tab.
+        The queries run on the given connection (default: the shared connection of the processing queries)"""
         
         # wipe the existing data in the Query_Results tab
         if self.has_query_results_tab():
@@ -90,7 +91,7 @@ class NationalReport(Report):
             
             if len(query_batch) > 0:
                 # send the query batch to the database in one SQL statement and get results back
-                query_batch_results, width = processing_queries.process_report_query_batch(query_batch, query_formula_info, self._report_type, reporting_year, layer_id)
+                query_batch_results, width = processing_queries.process_report_query_batch(query_batch, query_formula_info, self._report_type, reporting_year, layer_id, connection)
                 
                 # write the results into their rows in the Query_Results tab
                 this_job.post_event(
@@ -150,6 +150,19 @@ class Report:
             )
         self._sheet.insert_rows(first_row, row_count)
 
+    def append_rows(self, rows):
+        """writes the rows (lists of values by 0-based column position) underneath the last row of the active tab, in one sequential pass"""
+        if not self._is_open:
+            raise PermissionError(
+                f"{full_class_name(self)}.append_rows: a report must be opened before its contents can be accessed."
+            )
+        if self._is_read_only:
+            raise PermissionError(
+                f"{full_class_name(self)}.append_rows: cannot mutate cells of a read only report object."
+            )
+        for row in rows:
+            self._sheet.append(row)
+
     def open(self):
         if self._is_open:
             tprint(
@@ -64,9 +64,22 @@ class StateReport(Report):
         return return_array
 
 
-    def process_contents(self, error_rows: [int], query_formula_info, reporting_year: int, layer_id: int, this_job: Job) -> None:
+    def _generate_output_row(self, query_info: list, input_row_num, state=None, width: int=0) -> list:
+        """returns a Query_Results row (values by column position) holding the aggregates to, aggregation 
+        sign and factor and formula values of the query, its input row number and state, and empty year columns"""
+        output_row = [None] * (report_constants.STATE_Y1990_QUANTITY_COL_POS + width)
+        output_row[report_constants.STATE_AGGREGATESTO_COL_POS] = query_info[0]
+        output_row[report_constants.STATE_AGGREGATIONSIGNANDFACTOR_COL_POS] = query_info[1]
+        output_row[report_constants.FORMULA_COL_POS] = query_info[2]
+        output_row[report_constants.STATE_ROW_IN_NUMBER_POS] = input_row_num
+        output_row[report_constants.STATE_COL_POS] = state
+        return output_row
+
+
+    def process_contents(self, error_rows: [int], query_formula_info, reporting_year: int, layer_id: int, this_job: Job, connection=None) -> None:
         """takes a single national report and the list of its validation error rows, and updates the contents
-        of the state report file to include the processed query results in the Query_Results tab"""
+        of the state report file to include the processed query results in the Query_Results tab.
+        The queries run on the given connection (default: the shared connection of the processing queries)"""
         self.switch_to_queries_tab()
 
         # wipe the existing data in the Query_Results tab
@@ -90,8 +103,12 @@ class StateReport(Report):
         
         
         self.switch_to_results_tab()
-        output_row_num = report_constants.FIRST_DATA_ROW
-        resultless_query_rows =  []
+        # the output rows are gathered in their final order (error rows, resultless rows, then the results) 
+        # and written into the Query_Results tab in one sequential pass once all the batches are processed
+        error_output_rows = []
+        resultless_query_rows = []
+        result_output_rows = []
+        width = None
         
         # process the queries in batches (batch size based on report_constants.QUERIES_PER_REQUEST)
         batch_number = 1
@@ -120,15 +137,14 @@ class StateReport(Report):
 
             # send the query batch to the database in one SQL statement and get results back
             # query_batch_results returns table with record structure: (row: int, year: int, state: str, total_quantity: Decimal)
-            query_batch_results, width = processing_queries.process_report_query_batch(query_batch, query_formula_info, self._report_type, reporting_year, layer_id)
+            query_batch_results, width = processing_queries.process_report_query_batch(query_batch, query_formula_info, self._report_type, reporting_year, layer_id, connection)
             
             # restructure the results to simplify formating output data row by row
-            rows_with_results = []
+            rows_with_results = set()
             results_by_row = {}
             for row, year, state, total_quantity in query_batch_results:
                 key = (row, state)
-                rows_with_results.append(row)
-                rows_with_results 
+                rows_with_results.add(row)
                 if key not in results_by_row:
                     results_by_row[key] = []
                 results_by_row[key].append((year, total_quantity))
@@ -136,24 +152,11 @@ class StateReport(Report):
             resultless_query_rows += [row for row in input_rows_this_batch if row not in rows_with_results]
 
             if batch_number == 1: # first batch only
-                # write in the Query_Results tab column headers
-                self[1][report_constants.STATE_AGGREGATESTO_COL_POS] = report_constants.STATE_REPORT_AGGREGATESTO_COLUMN_HEADER
-                self[1][report_constants.STATE_AGGREGATIONSIGNANDFACTOR_COL_POS] = report_constants.STATE_REPORT_AGGREGATIONSIGNANDFACTOR_COLUMN_HEADER
-                self[1][report_constants.FORMULA_COL_POS] = report_constants.REPORT_FORMULA_COLUMN_HEADER
-                self[1][report_constants.STATE_ROW_IN_NUMBER_POS] = report_constants.STATE_REPORT_ROW_IN_NUMBER_COLUMN_HEADER
-                self[1][report_constants.STATE_COL_POS] = report_constants.STATE_REPORT_STATE_COLUMN_HEADER
-                for year, i in zip(range(db_constants.EARLIEST_REPORTING_YEAR,db_constants.EARLIEST_REPORTING_YEAR + width), range(1, width+1)):
-                    self[1][report_constants.STATE_COL_POS + i] = f'Y{year}'
-
-                # write in one line for the invalid queries (no state or quantity values)
+                # one line for the invalid queries (no state or quantity values)
                 for errored_query_row_num in error_rows:
-                    self[output_row_num][report_constants.STATE_AGGREGATESTO_COL_POS] = all_queries_info[errored_query_row_num][0]
-                    self[output_row_num][report_constants.STATE_AGGREGATIONSIGNANDFACTOR_COL_POS] = all_queries_info[errored_query_row_num][1]
-                    self[output_row_num][report_constants.FORMULA_COL_POS] = all_queries_info[errored_query_row_num][2]
-                    self[output_row_num][report_constants.STATE_ROW_IN_NUMBER_POS] = errored_query_row_num
-                    output_row_num += 1
+                    error_output_rows.append(self._generate_output_row(all_queries_info[errored_query_row_num], errored_query_row_num))
 
-            # write the results into their corresponding rows in the Query_Results tab
+            # gather the results into their corresponding rows of the Query_Results tab
             this_job.post_event(
                 "REPORT_PROCESSING",
                 "WRITING_BATCH_RESULTS",
@@ -164,30 +167,42 @@ class StateReport(Report):
 
             for key, result_series in results_by_row.items():
                 input_row_num, state = key
-                self[output_row_num][report_constants.STATE_AGGREGATESTO_COL_POS] = all_queries_info[input_row_num][0]
-                self[output_row_num][report_constants.STATE_AGGREGATIONSIGNANDFACTOR_COL_POS] = all_queries_info[input_row_num][1]
-                self[output_row_num][report_constants.FORMULA_COL_POS] = all_queries_info[input_row_num][2]
-                self[output_row_num][report_constants.STATE_ROW_IN_NUMBER_POS] = input_row_num
-                self[output_row_num][report_constants.STATE_COL_POS] = state
+                output_row = self._generate_output_row(all_queries_info[input_row_num], input_row_num, state, width)
+                aggregation_factor = float(all_queries_info[input_row_num][1] if all_queries_info[input_row_num][1] else 1)
                 for year, result in result_series:
-                    self[output_row_num][report_constants.STATE_Y1990_QUANTITY_COL_POS + (year - db_constants.EARLIEST_REPORTING_YEAR)] = float(result if result else 0) * float(all_queries_info[input_row_num][1] if all_queries_info[input_row_num][1] else 1)
-                output_row_num += 1
+                    year_column = report_constants.STATE_Y1990_QUANTITY_COL_POS + (year - db_constants.EARLIEST_REPORTING_YEAR)
+                    if year_column >= len(output_row): # a year past the time series width
+                        output_row += [None] * (year_column + 1 - len(output_row))
+                    output_row[year_column] = float(result if result else 0) * aggregation_factor
+                result_output_rows.append(output_row)
 
             batch_number += 1
             # END OF BATCH PROCESSING
 
-        # underneath the error query lines, write in one line for the resultless queries (no state value and all 0 quantities)
-        if len(resultless_query_rows) > 0:
-            self.insert_rows(report_constants.FIRST_DATA_ROW + len(error_rows), len(resultless_query_rows))
-            output_row_num = report_constants.FIRST_DATA_ROW + len(error_rows)
+        if query_count > 0:
+            # the column headers, followed by the error query lines, then one line for each resultless query 
+            # (no state value and all 0 quantities), then the results
+            header_row = self._generate_output_row(
+                [
+                    report_constants.STATE_REPORT_AGGREGATESTO_COLUMN_HEADER, 
+                    report_constants.STATE_REPORT_AGGREGATIONSIGNANDFACTOR_COLUMN_HEADER, 
+                    report_constants.REPORT_FORMULA_COLUMN_HEADER,
+                ],
+                report_constants.STATE_REPORT_ROW_IN_NUMBER_COLUMN_HEADER,
+                report_constants.STATE_REPORT_STATE_COLUMN_HEADER,
+                width,
+            )
+            header_row[report_constants.STATE_Y1990_QUANTITY_COL_POS:] = [f'Y{year}' for year in range(db_constants.EARLIEST_REPORTING_YEAR, db_constants.EARLIEST_REPORTING_YEAR + width)]
+            resultless_output_rows = []
             for resultless_query_row_num in resultless_query_rows:
-                self[output_row_num][report_constants.STATE_AGGREGATESTO_COL_POS] = all_queries_info[resultless_query_row_num][0]
-                self[output_row_num][report_constants.STATE_AGGREGATIONSIGNANDFACTOR_COL_POS] = all_queries_info[resultless_query_row_num][1]
-                self[output_row_num][report_constants.FORMULA_COL_POS] = all_queries_info[resultless_query_row_num][2]
-                self[output_row_num][report_constants.STATE_ROW_IN_NUMBER_POS] = resultless_query_row_num
-                for year_column in range(report_constants.STATE_Y1990_QUANTITY_COL_POS, report_constants.STATE_Y1990_QUANTITY_COL_POS + width):
-                    self[output_row_num][year_column] = 0
-                output_row_num += 1
+                output_row = self._generate_output_row(all_queries_info[resultless_query_row_num], resultless_query_row_num, width=width)
+                output_row[report_constants.STATE_Y1990_QUANTITY_COL_POS:] = [0] * width
+                resultless_output_rows.append(output_row)
+
+            self.append_rows([header_row])
+            self.append_rows(error_output_rows)
+            self.append_rows(resultless_output_rows)
+            self.append_rows(result_output_rows)
 
         helpers.tprint("Saving the report...")
         self.save()
\ No newline at end of file
@@ -154,3 +154,7 @@ VALIDATION_RESULTS = {
     "FAILED": "failed",
     "NOT_VALIDATED": "not yet validated",
 }
+
+# rough ratio of the memory needed to validate a source file to the size of its (compressed) content,
+# used to budget how many files are validated at the same time
+VALIDATION_MEMORY_PER_CONTENT_BYTE = 30
@@ -2,6 +2,7 @@ from chalicelib.src.source_files.models.SourceFile import SourceFile
 import chalicelib.src.source_files.jobs.crt_extraction.constants as crt 
 import chalicelib.src.general.qc_constants as qc_constants
 import chalicelib.src.general.globals as invdb_globals
+import chalicelib.src.general.executors as executors
 import chalicelib.src.general.helpers as helpers
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import traceback
@@ -187,29 +188,18 @@ def extract_crt_data_from_single_source_file(source_file: SourceFile):
 
 def extract_crt_data_from_source_files(source_files: list[SourceFile]):
     results = []
-    if invdb_globals.allow_multithreading:
-        helpers.tprint("Beginning extraction with multi-threading")
-    #=================== multi-threaded version ========================
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            futures = []
-            for source_file in source_files:
-                future = executor.submit(
-                    extract_crt_data_from_single_source_file,
-                    source_file,
-                )
-                futures.append(future)
-
-            for future in as_completed(futures):
-                results.append(future.result())
-
-            executor.shutdown(wait=True)
-    #=================== single-threaded version ========================
-    else: 
-        helpers.tprint("Beginning extraction with single thread")
+    helpers.tprint(f"Beginning extraction with executor type: {executors.get_executor_type()}")
+    with executors.get_executor() as executor:
+        futures = []
         for source_file in source_files:
-            result = extract_crt_data_from_single_source_file(source_file) # dict of keys and facts (2 more dictionaries)
-            results.append(result)
-    #====================================================================
+            future = executor.submit(
+                extract_crt_data_from_single_source_file,
+                source_file,
+            )
+            futures.append(future)
+
+        for future in futures: # in submission order, so the output doesn't depend on worker timing
+            results.append(future.result())
 
     return results
 
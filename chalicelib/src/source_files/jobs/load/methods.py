@@ -1,10 +1,12 @@
 from chalicelib.src.source_files.jobs.load.queries import *
+from chalicelib.src.source_files.models.SourceFile import strip_whitespace
 import chalicelib.src.source_files.jobs.qc_extraction.methods as qc_extraction_methods
 import chalicelib.src.source_files.jobs.qc_extraction.queries as qc_extraction_queries
 import chalicelib.src.source_files.jobs.crt_extraction.methods as crt_extraction_methods
 import chalicelib.src.source_files.jobs.crt_extraction.queries as crt_extraction_queries
 import chalicelib.src.source_files.constants as source_file_constants
 import chalicelib.src.general.globals as invdb_globals
+import chalicelib.src.general.executors as executors
 from chalicelib.src.jobs.models.Job import Job as Job_Class
 import chalicelib.src.jobs.constants as job_constants
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -13,270 +15,95 @@ import traceback
 import hashlib
 import os
 
-dim_table_foreign_keys = fetch_dim_table_foreign_keys()
-data_type_foreign_keys = {
-    pair[0]: pair[1] for pair in dim_table_foreign_keys.get("data_type")
-}
-sector_foreign_keys = {
-    pair[0]: pair[1] for pair in dim_table_foreign_keys.get("sector")
-}
-subsector_foreign_keys = {
-    pair[0]: pair[1] for pair in dim_table_foreign_keys.get("subsector")
-}
-category_foreign_keys = {
-    pair[0]: pair[1] for pair in dim_table_foreign_keys.get("category")
-}
-fuel_foreign_keys = {pair[0]: pair[1] for pair in dim_table_foreign_keys.get("fuel")}
-ghg_code_foreign_keys = {
-    quintuple[0]: quintuple[4] for quintuple in dim_table_foreign_keys.get("ghg")
-}
-ghg_longname_foreign_keys = {
-    quintuple[1]: quintuple[4] for quintuple in dim_table_foreign_keys.get("ghg")
-}
-ghg_shortname_foreign_keys = {
-    quintuple[2]: quintuple[4] for quintuple in dim_table_foreign_keys.get("ghg")
-}
-cas_no_foreign_keys = {
-    quintuple[3]: quintuple[4] for quintuple in dim_table_foreign_keys.get("ghg")
-}
 
-
-def remove_invalid_lines_from_single_source_file(
-    source_file, numbers_for_lines_with_errors
+# (dimension, column position key, optional) for every source file column that is replaced by its dim table foreign key
+FOREIGN_KEY_COLUMNS = [
+    ("data_type", "DATA_TYPE_COL_POS", True),
+    ("sector", "SECTOR_COL_POS", False),
+    ("subsector", "SUBSECTOR_COL_POS", False),
+    ("category", "CATEGORY_COL_POS", True),
+    ("fuel", "FUEL1_COL_POS", True),
+    ("fuel", "FUEL2_COL_POS", True),
+    ("ghg", "GHG_COL_POS", False),
+]
+
+
+def map_row_values_to_foreign_keys(row_values: list, template: int, dimension_index) -> None:
+    """replaces the dimension values of a source file row (list of raw cell values) with their 
+    foreign keys in place. Unrecognized values are mapped to 999999, empty optional values are kept."""
+    for dimension, col_pos_key, is_optional in FOREIGN_KEY_COLUMNS:
+        col_pos = source_file_constants.POSITIONS[template][col_pos_key]
+        value = strip_whitespace(row_values[col_pos])
+        if is_optional and value in (None, "NULL"):
+            continue
+        if dimension == "ghg": # look into one of 4 different GHG values
+            row_values[col_pos] = dimension_index.get_ghg_id(value, 999999)
+        else:
+            row_values[col_pos] = dimension_index.get_id(dimension, value, 999999)
+
+
+def extract_archive_data_from_single_source_file(
+    source_file: SourceFile, error_row_numbers: set, dimension_index, emission_data_type_ids: set, activity_data_type_ids: set
 ):
     """
+    reads the data rows of a source file once (streaming), skipping the rows with validation errors, and 
+    maps them to the emission/activity key and facts_archive records. Doesn't access the database, so it 
+    can run in a worker process.
     input:
-        workbook: triple -> ([0]: source_file attachment_id, [1]: source_file_content as openpyxl.workbook, [2]: source_file ID)
-        lines_with_errors: a list of ints specifying which rows contain errors and need to be removed.
-    output:
-        None. (only alters the workbook[1] input)
-    """
-    # errors rows must be removed in descending order for correctness.
-    numbers_for_lines_with_errors.sort(reverse=True)
-    for line_number in numbers_for_lines_with_errors:
-        source_file.delete_rows(
-            line_number, 1
-        )  # POTENTIAL OPTIMIZATION: handle consecutive errors rows with a single call to sheet.delete_rows(first row in cluster, cluster size).
-
-
-def remove_invalid_lines_from_source_files(source_files, source_file_errors):
-    """
-    input:
-        workbooks: a list SourceFiles objects
-        source_file_errors: a list of tuples ([0]: source_file attachment_id, [1]: row number of error)
-    output:
-        None. (only alters the workbooks[1] input)
-    """
-
-    # assign each thread its own source file to edit
-    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-        futures = []
-        for source_file in source_files:
-            # select only errors for the current source file
-            errors_for_this_source_file = [
-                error[1]
-                for error in source_file_errors
-                if error[0] == source_file.get_attachment_id()
-            ]
-            # skip the source file if it doesn't have any errors
-            if len(errors_for_this_source_file) == 0:
-                continue
-
-            # define the line removal task for a single source file as a job for the multithreading executor
-            future = executor.submit(
-                remove_invalid_lines_from_single_source_file,
-                source_file,
-                errors_for_this_source_file,
-            )
-            futures.append(future)
-
-        executor.shutdown(wait=True)
-        return
-
-
-def replace_single_source_file_values_with_foreign_keys(source_file: SourceFile):
-    global dim_table_foreign_keys
-    global data_type_foreign_keys
-    global sector_foreign_keys
-    global subsector_foreign_keys
-    global category_foreign_keys
-    global fuel_foreign_keys
-    global ghg_code_foreign_keys
-    global ghg_longname_foreign_keys
-    global ghg_shortname_foreign_keys
-    global cas_no_foreign_keys
-
-    template = source_file.get_template()
-    for row_data in source_file:
-        data_type_col_pos = source_file_constants.POSITIONS[template]['DATA_TYPE_COL_POS']
-        # replace the data type value
-        if (
-            row_data[data_type_col_pos] not in (None, "NULL")
-        ):  # data type is an optional value
-            if row_data[data_type_col_pos] in data_type_foreign_keys:
-                row_data[data_type_col_pos] = data_type_foreign_keys[
-                    row_data[data_type_col_pos]
-                ]
-            else:
-                row_data[data_type_col_pos] = 999999
-
-        # replace the sector value
-        sector_col_pos = source_file_constants.POSITIONS[template]['SECTOR_COL_POS']
-        try:
-            row_data[sector_col_pos] = sector_foreign_keys[
-                row_data[sector_col_pos]
-            ]
-        except KeyError:
-            row_data[sector_col_pos] = 999999
-
-        # replace the subsector value
-        subsector_col_pos = source_file_constants.POSITIONS[template]['SUBSECTOR_COL_POS']
-        try:
-            row_data[subsector_col_pos] = subsector_foreign_keys[
-                row_data[subsector_col_pos]
-            ]
-        except KeyError:
-            row_data[subsector_col_pos] = 999999
-
-        # replace the category value
-        category_col_pos = source_file_constants.POSITIONS[template]['CATEGORY_COL_POS']
-        if (
-            row_data[category_col_pos] not in (None, "NULL")
-        ):  # category is an optional value
-            try:
-                row_data[category_col_pos] = category_foreign_keys[
-                    row_data[category_col_pos]
-                ]
-            except KeyError:
-                row_data[category_col_pos] = 999999
-
-        # replace the fuel values
-        fuel1_col_pos = source_file_constants.POSITIONS[template]['FUEL1_COL_POS']
-        fuel2_col_pos = source_file_constants.POSITIONS[template]['FUEL2_COL_POS']
-        if (
-            row_data[fuel1_col_pos] not in (None, "NULL")
-        ):  # fuel1 is an optional value
-            try:
-                row_data[fuel1_col_pos] = fuel_foreign_keys[
-                    row_data[fuel1_col_pos]
-                ]
-            except KeyError:
-                row_data[fuel1_col_pos] = 999999
-        if (
-            row_data[fuel2_col_pos] not in (None, "NULL")
-        ):  # fuel2 is an optional value
-            try:
-                row_data[fuel2_col_pos] = fuel_foreign_keys[
-                    row_data[fuel2_col_pos]
-                ]
-            except KeyError:
-                row_data[fuel2_col_pos] = 999999
-
-        # replace the GHG value (look into one of 4 different values)
-        ghg_col_pos = source_file_constants.POSITIONS[template]['GHG_COL_POS']
-        if row_data[ghg_col_pos] in ghg_code_foreign_keys:
-            row_data[ghg_col_pos] = ghg_code_foreign_keys[
-                row_data[ghg_col_pos]
-            ]
-        elif row_data[ghg_col_pos] in ghg_longname_foreign_keys:
-            row_data[ghg_col_pos] = ghg_longname_foreign_keys[
-                row_data[ghg_col_pos]
-            ]
-        elif row_data[ghg_col_pos] in ghg_shortname_foreign_keys:
-            row_data[ghg_col_pos] = ghg_shortname_foreign_keys[
-                row_data[ghg_col_pos]
-            ]
-        elif row_data[ghg_col_pos] in cas_no_foreign_keys:
-            row_data[ghg_col_pos] = cas_no_foreign_keys[
-                row_data[ghg_col_pos]
-            ]
-        else:    
-            row_data[ghg_col_pos] = 999999
-
-
-def batch_replace_values_with_foreign_keys(source_files):
-    """
-    uses multithreading to process foreign key substitution operation for multiple source files in parallel
-    input:
-        workbooks: a list of triples -> ([0]: source_file attachment_id, [1]: source_file_content as openpyxl.workbook, [2]: source_file ID)
-        foreign_keys: dict ->   key: column name,
-                                value: dict ->  key: column value
-                                                value: foreign key
-    output:
-        None. (only alters the workbooks[1] input)
-    """
-    if invdb_globals.allow_multithreading:
-    #=================== multi-threaded version ========================
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            futures = []
-            for source_file in source_files:
-                # define the line removal task for a single source file as a job for the executor
-                future = executor.submit(
-                    replace_single_source_file_values_with_foreign_keys,
-                    source_file,
-                )
-                futures.append(future)
-
-            executor.shutdown(wait=True)
-            return
-    #=================== single-threaded version ========================
-    else:
-        for source_file in source_files:
-            replace_single_source_file_values_with_foreign_keys(source_file)
-    #====================================================================
-
-def extract_archive_data_from_single_source_file(source_file: SourceFile):
-    """
-    input:
-        workbook:  triple -> ([0]: source_file attachment_id, [1]: source_file_content as openpyxl.workbook, [2]: source_file ID)
+        source_file: the SourceFile to load (it is read through a streaming copy, the object itself isn't opened)
+        error_row_numbers: set of the row numbers with validation errors for this source file
+        dimension_index: DimensionIndex used to map the dimension values to their foreign keys
+        emission_data_type_ids/activity_data_type_ids: the data_type_ids loaded into the emissions_key/activity_key tables
     """
     try:
         template = source_file.get_template()
-        emission_data_type_ids = fetch_emissions_key_data_type_ids()
-        activity_data_type_ids = fetch_activity_key_data_type_ids()
         source_file_id = source_file.get_source_file_id()
+        attachment_id = source_file.get_attachment_id()
+        num_emission_key_columns = source_file_constants.INFO[template]['NUM_EMISSION_KEY_COLUMNS']
+        data_type_col_pos = source_file_constants.POSITIONS[template]['DATA_TYPE_COL_POS']
+        ghg_category_col_pos = source_file_constants.POSITIONS[template].get('GHG_CATEGORY_COL_POS')
         activity_key_data = [] # activity (AF) data
         emissions_key_data = []  # the blue columns from the source file 2.0 template
         emissions_quantity_data = (
             []
         )  # the gray columns from the source file 2.0 template
-        i = 0
-        for row_data in source_file:
-            num_emission_key_columns = source_file_constants.INFO[template]['NUM_EMISSION_KEY_COLUMNS']
-            data_type_col_pos = source_file_constants.POSITIONS[template]['DATA_TYPE_COL_POS']
-
-            is_emission_row = row_data[data_type_col_pos] in emission_data_type_ids
-            is_activity_row = row_data[data_type_col_pos] in activity_data_type_ids
-
-            if is_emission_row or is_activity_row:
-                # generate the uid for the emission key
-                uid_base = row_data[1 : num_emission_key_columns + 1]
-                if template == 3: # exclude ghg_category from uid hash if template 3
-                    ghg_category_col_pos = source_file_constants.POSITIONS[template]['GHG_CATEGORY_COL_POS']
-                    uid_base = row_data[1 : ghg_category_col_pos] + row_data[ghg_category_col_pos + 1 : num_emission_key_columns + 1]
-                emissions_key_uid = hashlib.md5(
-                    str(tuple(uid_base)).encode(),
-                    usedforsecurity=False,
-                ).hexdigest()
-
-                # add the emission/activity key data as a tuple with its uid
-                (emissions_key_data if is_emission_row else activity_key_data).append(
-                    (row_data[data_type_col_pos], emissions_key_uid)
-                    + tuple(row_data[1 : num_emission_key_columns]) + (source_file_id,)
-                )
+        with source_file.get_streaming_copy() as streamed_source_file:
+            for row_data in streamed_source_file:
+                if row_data.row_number in error_row_numbers: # rows with validation errors are not loaded
+                    continue
+                row_values = row_data[0:]
+                map_row_values_to_foreign_keys(row_values, template, dimension_index)
+
+                is_emission_row = row_values[data_type_col_pos] in emission_data_type_ids
+                is_activity_row = row_values[data_type_col_pos] in activity_data_type_ids
+
+                if is_emission_row or is_activity_row:
+                    # generate the uid for the emission key
+                    uid_base = row_values[1 : num_emission_key_columns + 1]
+                    if template == 3: # exclude ghg_category from uid hash if template 3
+                        uid_base = row_values[1 : ghg_category_col_pos] + row_values[ghg_category_col_pos + 1 : num_emission_key_columns + 1]
+                    emissions_key_uid = hashlib.md5(
+                        str(tuple(uid_base)).encode(),
+                        usedforsecurity=False,
+                    ).hexdigest()
+
+                    # add the emission/activity key data as a tuple with its uid
+                    (emissions_key_data if is_emission_row else activity_key_data).append(
+                        (row_values[data_type_col_pos], emissions_key_uid)
+                        + tuple(row_values[1 : num_emission_key_columns]) + (source_file_id,)
+                    )
 
-                # facts_archive data
-                emissions_quantity_data.append(
-                    (
+                    # facts_archive data
+                    emissions_quantity_data.append(
                         (
-                            emissions_key_uid,
-                            row_data[data_type_col_pos],
-                            source_file.get_attachment_id(),
-                        ),
-                        tuple(row_data[num_emission_key_columns :]),
+                            (
+                                emissions_key_uid,
+                                row_values[data_type_col_pos],
+                                attachment_id,
+                            ),
+                            tuple(row_values[num_emission_key_columns :]),
+                        )
                     )
-                )
-            i += 1
 
     except Exception as e:
         helpers.tprint(
@@ -297,45 +124,49 @@ def extract_archive_data_from_single_source_file(source_file: SourceFile):
     }
 
 
-def extract_archive_data_from_source_files(source_files):
+def extract_archive_data_from_source_files(source_files, source_file_errors):
     """
-    Extract all lines of data from the input source files where data_type == "Emission" and return a dict holding the key data (blue columns) and quantity data (gray columns)
+    Extract all valid lines of data from the input source files where data_type == "Emission" (or an activity type) and return a dict holding the key data (blue columns) and quantity data (gray columns)
     input:
-        workbooks: a list of triples -> ([0]: source_file attachment_id, [1]: source_file_content as openpyxl.workbook, [2]: source_file ID)
+        source_files: a list of SourceFile objects
+        source_file_errors: a list of tuples ([0]: attachment_id, [1]: row_number) for rows with validation errors
     output:
         dict -> {
+                    "activity_key_data": list -> activity key data (blue column data for all source files' rows with an activity data type)
                     "emissions_key_data": list -> emissions key data (blue column data for all source files' rows where data_type == "Emission")
-                    "emissions_quantity_data": list -> emissions quantity data (gray column data for all source files' rows where data_type == "Emission")
+                    "emissions_quantity_data": list -> emissions quantity data (gray column data for all source files' emission and activity rows)
                 }
     """
+    error_row_numbers = {}
+    for attachment_id, row_number in source_file_errors:
+        error_row_numbers.setdefault(attachment_id, set()).add(row_number)
+
+    # fetched once here since the extraction itself may run in worker processes without database access
+    dimension_index = db_methods.fetch_dimension_index() # served from the metadata cache unless a dim table changed
+    emission_data_type_ids = set(fetch_emissions_key_data_type_ids())
+    activity_data_type_ids = set(fetch_activity_key_data_type_ids())
+
     activity_key_data = []
     emissions_key_data = []  # the blue columns from the source file 2.0 template
     emissions_quantity_data = []  # the gray columns from the source file 2.0 template
-    if invdb_globals.allow_multithreading:
-    #=================== multi-threaded version ========================
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            futures = []
-            for source_file in source_files:
-                future = executor.submit(
-                    extract_archive_data_from_single_source_file,
-                    source_file,
-                )
-                futures.append(future)
-
-            for future in as_completed(futures):
-                activity_key_data += future.result()["activity_key_data"]
-                emissions_key_data += future.result()["emissions_key_data"]
-                emissions_quantity_data += future.result()["emissions_quantity_data"]
-
-            executor.shutdown(wait=True)
-    #=================== single-threaded version ========================
-    else: 
+    # runs on the configured executor (see invdb_globals.executor_type)
+    with executors.get_executor() as executor:
+        futures = []
         for source_file in source_files:
-            result = extract_archive_data_from_single_source_file(source_file)
-            activity_key_data += result["activity_key_data"]
-            emissions_key_data += result["emissions_key_data"]
-            emissions_quantity_data += result["emissions_quantity_data"]
-    #====================================================================
+            future = executor.submit(
+                extract_archive_data_from_single_source_file,
+                source_file,
+                error_row_numbers.get(source_file.get_attachment_id(), frozenset()),
+                dimension_index,
+                emission_data_type_ids,
+                activity_data_type_ids,
+            )
+            futures.append(future)
+
+        for future in futures: # in submission order, so the output doesn't depend on worker timing
+            activity_key_data += future.result()["activity_key_data"]
+            emissions_key_data += future.result()["emissions_key_data"]
+            emissions_quantity_data += future.result()["emissions_quantity_data"]
 
     return {
         "activity_key_data": activity_key_data,
@@ -382,32 +213,10 @@ def handle_source_file_archiving_request(reporting_year: int,   layer_id: int,
 
         this_job.post_event(
             "SOURCE_FILE_LOAD",
-            "OPENING_FILES",
-        )
-        helpers.tprint("Opening the source files for editing...")
-        for source_file in source_files:
-            source_file.open()
-
-        this_job.post_event(
-            "SOURCE_FILE_LOAD",
-            "REMOVING_INVALID_DATA",
-        )
-        helpers.tprint("Removing invalid data...")
-        remove_invalid_lines_from_source_files(source_files, errors)
-
-        this_job.post_event(
-            "SOURCE_FILE_LOAD",
-            "MAPPING_DATA",
-        )
-        helpers.tprint("Mapping data to foreign keys...")
-        batch_replace_values_with_foreign_keys(source_files)
-
-        this_job.post_event(
-            "SOURCE_FILE_LOAD",
-            "GATHERING_DATA",
+            "EXTRACTING_DATA",
         )
         helpers.tprint("Gathering emission key and facts data...")
-        archive_data = extract_archive_data_from_source_files(source_files)
+        archive_data = extract_archive_data_from_source_files(source_files, errors)
 
         this_job.post_event(
             "SOURCE_FILE_LOAD",
@@ -420,8 +229,9 @@ def handle_source_file_archiving_request(reporting_year: int,   layer_id: int,
             layer_id,
             [source_file.get_source_file_id() for source_file in source_files]
         )
-        update_emissions_key_table(archive_data["emissions_key_data"], source_file.get_template())
-        update_activity_key_table(archive_data["activity_key_data"], source_file.get_template())
+        template = source_files[0].get_template() # the template follows from the reporting year, so all of the load's source files share it
+        update_emissions_key_table(archive_data["emissions_key_data"], template)
+        update_activity_key_table(archive_data["activity_key_data"], template)
         this_job.post_event(
             "SOURCE_FILE_LOAD",
             "COMPLETED_LOAD",
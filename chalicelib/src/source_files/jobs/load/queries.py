@@ -4,6 +4,7 @@ import chalicelib.src.general.helpers as helpers
 from chalicelib.src.source_files.models.SourceFile import SourceFile
 import chalicelib.src.general.qc_constants as qc_constants
 import chalicelib.src.general.globals as globals
+from chalicelib.src.query_engine.jobs.execute_simple_query.queries import simple_query_cache
 import os
 
 pgdb_connection = db_methods.get_pgdb_connection()
@@ -107,30 +108,6 @@ def fetch_source_file_validation_error_rows(reporting_year, layer_id):
     return cursor.fetchall()
 
 
-def fetch_dim_table_foreign_keys():
-    """
-    output: foreign_keys: dict ->   key: column name,
-                                value: dict ->  key: column value
-                                                value: foreign key
-    """
-    queries = {
-        "data_type": f"""SELECT data_type_name, data_type_id FROM {db_constants.DB_TABLES["DIM_DATA_TYPE"]}""",
-        "sector": f"""SELECT sector_name, sector_id FROM {db_constants.DB_TABLES["DIM_SECTOR"]}""",
-        "subsector": f"""SELECT subsector_name, subsector_id FROM {db_constants.DB_TABLES["DIM_SUBSECTOR"]}""",
-        "category": f"""SELECT category_name, category_id FROM {db_constants.DB_TABLES["DIM_CATEGORY"]}""",
-        "fuel": f"""SELECT fuel_type_name, fuel_type_id FROM {db_constants.DB_TABLES["DIM_FUEL_TYPE"]}""",
-        "ghg": f"""SELECT ghg_code, ghg_longname, ghg_shortname, cas_no, ghg_id FROM {db_constants.DB_TABLES["DIM_GHG"]}""",
-    }
-
-    results = {}
-    with pgdb_connection.cursor() as cursor:
-        for query in queries:
-            cursor.execute(queries[query])
-            result = cursor.fetchall()
-            results[query] = result
-    return results
-
-
 def update_facts_archive_table(emissions_quantity_data: list, reporting_year: int, layer_id: int, source_file_ids: [int]) -> None:
     """removes pre-existing facts_archive records for input source files and adds new facts_archive records gathered by the current source file load request"""
     cursor = pgdb_connection.cursor()
@@ -186,19 +163,14 @@ def update_facts_archive_table(emissions_quantity_data: list, reporting_year: in
         #     cursor.execute(del_key_query)
         #     cursor.execute(del_akey_query)
 
-        # insert the new facts_archive data
-        values_string = ""
-        for data_row in emissions_quantity_data:
-            for quantity, i in zip(data_row[1], range(len(data_row[1]))):
-                if {data_row[0][2]} == 1010:
-                    print("emissions extraction inserting row ", f"""({data_row[0][1]}, '{data_row[0][0]}', {layer_id}, {pub_year_id}, {time_series_id_mappings[i + qc_constants.EARLIEST_REPORTING_YEAR]}, {f"'{quantity}'" if isinstance(quantity, str) else quantity}, '{data_row[0][2]}'), """)
-                values_string += f"""({data_row[0][1]}, '{data_row[0][0]}', {layer_id}, {pub_year_id}, {time_series_id_mappings[i + qc_constants.EARLIEST_REPORTING_YEAR]}, {f"'{quantity}'" if isinstance(quantity, str) else quantity}, '{data_row[0][2]}'), """
-        values_string = values_string[:-2]
-
-        if len(values_string) > 0:
-            cursor.execute(
-                f"""INSERT INTO {db_constants.DB_TABLES['FACTS_ARCHIVE']} VALUES {values_string}"""
-            )
+        # stream the new facts_archive data to the database (one row per emissions key and year)
+        facts_archive_rows = (
+            (data_row[0][1], data_row[0][0], layer_id, pub_year_id, time_series_id_mappings[i + qc_constants.EARLIEST_REPORTING_YEAR], quantity, data_row[0][2])
+            for data_row in emissions_quantity_data
+            for i, quantity in enumerate(data_row[1])
+        )
+        row_count = db_methods.copy_rows_into_table(cursor, db_constants.DB_TABLES['FACTS_ARCHIVE'], facts_archive_rows)
+        helpers.tprint(f"Copied {row_count} rows into {db_constants.DB_TABLES['FACTS_ARCHIVE']}.")
 
         pgdb_connection.commit()
     except Exception as error:
@@ -230,6 +202,26 @@ def fetch_activity_key_data_type_ids():
     return [value[0] for value in cursor.fetchall()]
 
 
+# columns of the emissions_key and activity_key tables filled by the source file load (ghg_category is added for template 3)
+KEY_TABLE_COLUMNS = [
+    "emissions_uid", "sector_id", "sub_sector_id", "category_id", "sub_category_1", "sub_category_2", 
+    "sub_category_3", "sub_category_4", "sub_category_5", "carbon_pool", "fuel_type_id_1", 
+    "fuel_type_id_2", "geo_ref", '"EXCLUDE"', "crt_code", "id", "cbi_activity", "units", 
+    "ghg_id", "gwp", "source_file_id"
+]
+
+
+def format_key_table_row(key_row: tuple) -> list:
+    """drops the leading data_type_id of an emissions/activity key row and converts empty values to NULL"""
+    values = list(key_row)[1:]
+    for i in range(len(values)):
+        if isinstance(values[i], str):
+            values[i] = values[i].strip()
+        if values[i] in (None, "", "NULL"):
+            values[i] = None
+    return values
+
+
 def update_activity_key_table(activity_key_data: list, template: int) -> None:
     """insert new activity keys into the activity keys data into the activity_keys table, skip inserting any activity keys that are already present"""
     cursor = pgdb_connection.cursor()
@@ -258,37 +250,12 @@ def update_activity_key_table(activity_key_data: list, template: int) -> None:
         helpers.tprint("No new activity keys, skipping")
         return
 
-    # build the 'INSERT' SQL command from the activity_key_data
-    values_string = ""
-    for activity_key_row in activity_key_data:
-        temp_list = list(activity_key_row)[1:]
-        temp_list[0] = f"'{temp_list[0]}'::uuid"
-        values_string = values_string + "("
-        for i in range(len(temp_list)):
-            if isinstance(temp_list[i], str):
-                temp_list[i] = temp_list[i].strip()
-            if temp_list[i] in (None, ""):
-                temp_list[i] = "NULL"
-            if (
-                isinstance(temp_list[i], str) and temp_list[i] != "NULL" and i != 0
-            ):  # add string type values with single quotes
-                values_string += f"'{str(temp_list[i])}', "
-            else:
-                values_string += f"{str(temp_list[i])}, "
-
-        values_string = values_string[:-2] + "),\n"
-    values_string = values_string[:-2]
     try:
-        cursor.execute(
-            f"""INSERT INTO {db_constants.DB_TABLES["ACTIVITY_KEY"]} 
-                (emissions_uid, sector_id, sub_sector_id, category_id, sub_category_1, sub_category_2, 
-                sub_category_3, sub_category_4, sub_category_5, carbon_pool, fuel_type_id_1, 
-                fuel_type_id_2, geo_ref, "EXCLUDE", crt_code, id, cbi_activity, units, 
-                {"ghg_category, " if template == 3 else ""}
-                ghg_id, gwp, source_file_id)
-                VALUES
-                {values_string}
-            """
+        db_methods.copy_rows_into_table(
+            cursor,
+            db_constants.DB_TABLES["ACTIVITY_KEY"],
+            map(format_key_table_row, activity_key_data),
+            KEY_TABLE_COLUMNS[:-3] + (["ghg_category"] if template == 3 else []) + KEY_TABLE_COLUMNS[-3:],
         )
 
         pgdb_connection.commit()
@@ -324,37 +291,12 @@ def update_emissions_key_table(emissions_key_data: list, template: int) -> None:
     if len(emissions_key_data) == 0:
         return
 
-    # build the 'INSERT' SQL command from the emissions_key_data
-    values_string = ""
-    for emissions_key_row in emissions_key_data:
-        temp_list = list(emissions_key_row)[1:]
-        temp_list[0] = f"'{temp_list[0]}'::uuid"
-        values_string = values_string + "("
-        for i in range(len(temp_list)):
-            if isinstance(temp_list[i], str):
-                temp_list[i] = temp_list[i].strip()
-            if temp_list[i] in (None, ""):
-                temp_list[i] = "NULL"
-            if (
-                isinstance(temp_list[i], str) and temp_list[i] != "NULL" and i != 0
-            ):  # add string type values with single quotes
-                values_string += f"'{str(temp_list[i])}', "
-            else:
-                values_string += f"{str(temp_list[i])}, "
-
-        values_string = values_string[:-2] + "),\n"
-    values_string = values_string[:-2]
     try:
-        cursor.execute(
-            f"""INSERT INTO {db_constants.DB_TABLES["EMISSIONS_KEY"]} 
-                (emissions_uid, sector_id, sub_sector_id, category_id, sub_category_1, sub_category_2, 
-                sub_category_3, sub_category_4, sub_category_5, carbon_pool, fuel_type_id_1, 
-                fuel_type_id_2, geo_ref, "EXCLUDE", crt_code, id, cbi_activity, units, 
-                {"ghg_category, " if template == 3 else ""}
-                ghg_id, gwp, source_file_id)
-                VALUES
-                {values_string}
-            """
+        db_methods.copy_rows_into_table(
+            cursor,
+            db_constants.DB_TABLES["EMISSIONS_KEY"],
+            map(format_key_table_row, emissions_key_data),
+            KEY_TABLE_COLUMNS[:-3] + (["ghg_category"] if template == 3 else []) + KEY_TABLE_COLUMNS[-3:],
         )
 
         pgdb_connection.commit()
@@ -385,7 +327,10 @@ def update_refresh_status_rollup_table(reporting_year: int, layer_id: int):
 	 ON CONFLICT (pub_year_id, layer_id) 
 	 DO UPDATE 
 	  SET refresh_status = 'In Progress', last_update_date = CURRENT_TIMESTAMP;"""
-    db_methods.perform_query_update(query, db_methods.fetch_pub_year_id(reporting_year), layer_id)
+    pub_year_id = db_methods.fetch_pub_year_id(reporting_year)
+    db_methods.perform_query_update(query, pub_year_id, layer_id)
+    # the cached simple query results of the year and layer can't be served anymore (their refresh stamp changed), so free them
+    simple_query_cache.invalidate(pub_year_id, layer_id)
 
 def update_emissions_rollup_tables(reporting_year: int, layer_id: int):
     db_methods.perform_query_function(db_constants.DB_FUNCTIONS["F_REFRESH_ROLLUP_TABLE"], db_methods.fetch_pub_year_id(reporting_year), layer_id)
\ No newline at end of file
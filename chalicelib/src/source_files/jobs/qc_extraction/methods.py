@@ -1,6 +1,7 @@
 from chalicelib.src.source_files.jobs.qc_extraction.queries import *
 import chalicelib.src.database.constants as source_file_constants
 import chalicelib.src.general.globals as invdb_globals
+import chalicelib.src.general.executors as executors
 import chalicelib.src.general.helpers as helpers
 from chalicelib.src.jobs.models.Job import Job as Job_Class
 import chalicelib.src.jobs.constants as job_constants
@@ -27,7 +28,9 @@ def col_to_ascii(letters):
     return result - 1
 
 
-def extract_qc_data_from_single_source_file(source_file: SourceFile):
+def extract_qc_data_from_single_source_file(source_file: SourceFile, load_targets: list[QCLoadTarget] = None):
+    """load_targets: the source file's QC load targets, fetched from the database if not given
+    (they are passed in when this runs in a worker process)"""
     try:
         if source_file.get_extension() == '.csv' or source_file.get_extension() == '.json':
             helpers.tprint(f"Skipping QC extraction for {source_file.get_extension()} file...")
@@ -38,7 +41,8 @@ def extract_qc_data_from_single_source_file(source_file: SourceFile):
             }
         helpers.tprint(f"Extracting QC data from source file with attachment ID {source_file.get_attachment_id()} and reporting year {source_file.get_reporting_year()}")
         current_target_sheet = None
-        load_targets = fetch_qc_load_targets_by_id(source_file.get_source_name_id(), source_file.get_reporting_year())
+        if load_targets is None:
+            load_targets = fetch_qc_load_targets_by_id(source_file.get_source_name_id(), source_file.get_reporting_year())
         keys = []
         facts = []
         errors = []
@@ -131,29 +135,25 @@ def extract_qc_data_from_single_source_file(source_file: SourceFile):
 
 def extract_qc_data_from_source_files(source_files: list[SourceFile]):
     results = []
-    if invdb_globals.allow_multithreading:
-        helpers.tprint("Beginning extraction with multi-threading")
-    #=================== multi-threaded version ========================
-        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-            futures = []
-            for source_file in source_files:
-                future = executor.submit(
-                    extract_qc_data_from_single_source_file,
-                    source_file,
-                )
-                futures.append(future)
-
-            for future in as_completed(futures):
-                results.append(future.result())
-
-            executor.shutdown(wait=True)
-    #=================== single-threaded version ========================
-    else: 
-        helpers.tprint("Beginning extraction with single thread")
+    # the QC load targets are fetched here since the extraction itself may run in worker processes without database access
+    load_targets_by_attachment_id = {
+        source_file.get_attachment_id(): fetch_qc_load_targets_by_id(source_file.get_source_name_id(), source_file.get_reporting_year())
+        for source_file in source_files
+        if source_file.get_extension() not in ('.csv', '.json') # skipped by the QC extraction
+    }
+    helpers.tprint(f"Beginning extraction with executor type: {executors.get_executor_type()}")
+    with executors.get_executor() as executor:
+        futures = []
         for source_file in source_files:
-            result = extract_qc_data_from_single_source_file(source_file) # dict of keys and facts (2 more dictionaries)
-            results.append(result)
-    #====================================================================
+            future = executor.submit(
+                extract_qc_data_from_single_source_file,
+                source_file,
+                load_targets_by_attachment_id.get(source_file.get_attachment_id()),
+            )
+            futures.append(future)
+
+        for future in futures: # in submission order, so the output doesn't depend on worker timing
+            results.append(future.result())
 
     return results
 
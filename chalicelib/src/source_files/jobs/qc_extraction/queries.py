@@ -163,26 +163,20 @@ def update_qc_facts_archive_table(facts: list) -> None:
         #     cursor.execute(del_facts_query)
         #     cursor.execute(del_key_query)
 
-        # insert the new facts_archive data
-        values = []
-        for fact in facts:
-            data_type_id = fact["data_type_id"]
-            key_id = fact["hash"]
-            layer_id = fact["layer_id"]
-            pub_year_id = pub_year_map[fact["time_series"]]
-            attachment_id = fact["attachment_id"]
-
-            for index, year_value in enumerate(fact["years"]):
-                year_id = time_series_id_mappings[qc_constants.EARLIEST_REPORTING_YEAR + index]
-                if attachment_id == 1010:
-                    print("qc extraction inserting row ", f"({data_type_id}, '{key_id}'::uuid, {layer_id}, {pub_year_id}, {year_id}, '{str(year_value)}', {attachment_id})")
-                values.append(f"({data_type_id}, '{key_id}'::uuid, {layer_id}, {pub_year_id}, {year_id}, '{str(year_value)}', {attachment_id})")
-
-        values_string = ', '.join(values)
+        # stream the new facts_archive data to the database (one row per fact and year)
+        def generate_facts_archive_rows():
+            for fact in facts:
+                data_type_id = fact["data_type_id"]
+                key_id = fact["hash"]
+                layer_id = fact["layer_id"]
+                pub_year_id = pub_year_map[fact["time_series"]]
+                attachment_id = fact["attachment_id"]
 
-        cursor.execute(
-            f"""INSERT INTO {db_constants.DB_TABLES['FACTS_ARCHIVE']} VALUES {values_string}"""
-        )
+                for index, year_value in enumerate(fact["years"]):
+                    year_id = time_series_id_mappings[qc_constants.EARLIEST_REPORTING_YEAR + index]
+                    yield (data_type_id, key_id, layer_id, pub_year_id, year_id, str(year_value), attachment_id)
+
+        db_methods.copy_rows_into_table(cursor, db_constants.DB_TABLES['FACTS_ARCHIVE'], generate_facts_archive_rows())
 
         pgdb_connection.commit()
     except Exception as error:
@@ -289,24 +283,17 @@ def update_emissionsqc_key_table(keys: list) -> None:
     if len(emissionsqc_key_data) == 0:
         return
 
-    # build the 'INSERT' SQL command from the emissions_key_data
-    values = []
-
-    for row in emissionsqc_key_data:
-        emissionsqc_uid = row['hash']
-        parameters_json = json.dumps(row['parameters'])
-        emissionsqc_load_targets_id = row['load_target_id']
-        source_file_id = row['source_file_id']
-        values.append(f"('{emissionsqc_uid}'::uuid, '{parameters_json}', {emissionsqc_load_targets_id}, {source_file_id})")
-
-    values_string = ', '.join(values)
+    emissionsqc_key_rows = (
+        (row['hash'], json.dumps(row['parameters']), row['load_target_id'], row['source_file_id'])
+        for row in emissionsqc_key_data
+    )
 
     try:
-        cursor.execute(
-            f"""INSERT INTO {db_constants.DB_TABLES["EMISSIONSQC_KEY"]} (emissionsqc_uid, parameters, emissionsqc_load_targets_id, source_file_id)
-                VALUES
-                {values_string}
-            """
+        db_methods.copy_rows_into_table(
+            cursor,
+            db_constants.DB_TABLES["EMISSIONSQC_KEY"],
+            emissionsqc_key_rows,
+            ["emissionsqc_uid", "parameters", "emissionsqc_load_targets_id", "source_file_id"],
         )
 
         pgdb_connection.commit()
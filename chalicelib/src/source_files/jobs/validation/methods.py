@@ -1,6 +1,7 @@
 from chalicelib.src.source_files.jobs.validation.queries import *
 from chalicelib.src.source_files.models.ValidationReport import ValidationReport
 from chalicelib.src.source_files.models.DataQualityError import DataQualityError
+from chalicelib.src.source_files.models.ValidationResultCache import ValidationResultCache
 import chalicelib.src.source_files.constants as source_file_constants
 import chalicelib.src.general.qc_constants as qc_constants
 import chalicelib.src.database.methods as db_methods
@@ -15,34 +16,28 @@ from flask import jsonify
 # globals. => invdb_invdb_globals.
 import chalicelib.src.general.helpers as helpers
 import chalicelib.src.general.globals as invdb_globals
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import chalicelib.src.general.executors as executors
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from openpyxl.utils import get_column_letter
+import pandas as pd
+import numpy as np
 import traceback
 import os
 
 
+# values accepted for the optional data_type, category, and fuel fields during validation
+NULL_VALUES = (None, "NULL")
+
+# validation results of previously validated source files, reused when the same content is validated against unchanged dim tables
+validation_result_cache = ValidationResultCache(invdb_globals.source_file_validation_cache_size)
+
+
 # define global variables for the file
-# fetch the dim table values and max reporting year
+# fetch the dim table lookup index (reused from the metadata cache while the dim tables are unchanged)
 def redefine_globals(): 
-    global data_type_values
-    global sector_values
-    global subsector_values
-    global category_values
-    global fuel_values
-    global ghg_values
-    
-    dim_table_values = db_methods.fetch_dim_table_validation_values()
-    data_type_values = dim_table_values.get("data_type")
-    sector_values = dim_table_values.get("sector")
-    subsector_values = dim_table_values.get("subsector")
-    category_values = dim_table_values.get("category")
-    fuel_values = dim_table_values.get("fuel")
-    ghg_values = dim_table_values.get("ghg")
-
-    # allow Null values for data_type, category, and fuel_values during validation
-    data_type_values += [None, "NULL"]
-    category_values += [None, "NULL"]
-    fuel_values += [None, "NULL"]
+    global dimension_index
+
+    dimension_index = db_methods.fetch_dimension_index()
 
 
 def validate_source_file_line(
@@ -50,16 +45,10 @@ def validate_source_file_line(
     attachment_id: int, template: int, created_by: int = None
 ) -> [DataQualityError]: 
     """takes a row from a source file and returns a list of found validation errors"""
-    global data_type_values
-    global sector_values
-    global subsector_values
-    global category_values
-    global fuel_values
-    global ghg_values
-
     errors_on_this_row = []
     data_type_col_pos = source_file_constants.POSITIONS[template]['DATA_TYPE_COL_POS']
-    if source_file_line_data[data_type_col_pos] not in data_type_values:
+    data_type_value = source_file_line_data[data_type_col_pos]
+    if data_type_value not in NULL_VALUES and not dimension_index.contains("data_type", data_type_value):
         errors_on_this_row.append(
             DataQualityError(
                 "Data Type",
@@ -70,13 +59,13 @@ def validate_source_file_line(
                     row_number=row_num,
                     column_label=source_file_constants.LABELS[template]['DATA_TYPE_COL_LABEL'],
                     field_value=data_type_col_pos,
-                    dim_values=str(data_type_values).replace("'", ""),
+                    dim_values=str(list(dimension_index.get_names("data_type")) + list(NULL_VALUES)).replace("'", ""),
                 ),
                 created_by=created_by,
             )
         )
     sector_col_pos = source_file_constants.POSITIONS[template]['SECTOR_COL_POS']
-    if source_file_line_data[sector_col_pos] not in sector_values:
+    if not dimension_index.contains("sector", source_file_line_data[sector_col_pos]):
         errors_on_this_row.append(
             DataQualityError(
                 "Sector",
@@ -92,7 +81,7 @@ def validate_source_file_line(
             )
         )
     subsector_col_pos = source_file_constants.POSITIONS[template]['SUBSECTOR_COL_POS']
-    if source_file_line_data[subsector_col_pos] not in subsector_values:
+    if not dimension_index.contains("subsector", source_file_line_data[subsector_col_pos]):
         errors_on_this_row.append(
             DataQualityError(
                 "Subsector",
@@ -108,7 +97,7 @@ def validate_source_file_line(
             )
         )
     category_col_pos = source_file_constants.POSITIONS[template]['CATEGORY_COL_POS']
-    if source_file_line_data[category_col_pos] not in category_values:
+    if source_file_line_data[category_col_pos] not in NULL_VALUES and not dimension_index.contains("category", source_file_line_data[category_col_pos]):
         errors_on_this_row.append(
             DataQualityError(
                 "Category",
@@ -124,7 +113,7 @@ def validate_source_file_line(
             )
         )
     fuel1_col_pos = source_file_constants.POSITIONS[template]['FUEL1_COL_POS']
-    if source_file_line_data[fuel1_col_pos] not in fuel_values:
+    if source_file_line_data[fuel1_col_pos] not in NULL_VALUES and not dimension_index.contains("fuel", source_file_line_data[fuel1_col_pos]):
         errors_on_this_row.append(
             DataQualityError(
                 "Fuel1",
@@ -140,7 +129,7 @@ def validate_source_file_line(
             )
         )
     fuel2_col_pos = source_file_constants.POSITIONS[template]['FUEL2_COL_POS']
-    if source_file_line_data[fuel2_col_pos] not in fuel_values:
+    if source_file_line_data[fuel2_col_pos] not in NULL_VALUES and not dimension_index.contains("fuel", source_file_line_data[fuel2_col_pos]):
         errors_on_this_row.append(
             DataQualityError(
                 "Fuel2",
@@ -155,14 +144,9 @@ def validate_source_file_line(
                 created_by=created_by,
             )
         )
-    # check the list of ghg chemicals for a match
-    match_found = False
+    # check the ghg chemical identifiers (code, long name, short name, and CAS number) for a match
     ghg_col_pos = source_file_constants.POSITIONS[template]['GHG_COL_POS']
-    for chemical in ghg_values:
-        if source_file_line_data[ghg_col_pos] in chemical:
-            match_found = True
-            break
-    if not match_found:
+    if not dimension_index.contains_ghg(source_file_line_data[ghg_col_pos]):
         errors_on_this_row.append(
             DataQualityError(
                 "GHG",
@@ -511,11 +495,154 @@ def validate_source_file_line(
     return errors_on_this_row
 
 
+def get_invalid_text_mask(column: pd.Series, column_types: pd.Series, max_length: int) -> pd.Series:
+    """returns a mask of the non-null cells in the column that are not strings or are longer than max_length"""
+    is_string = column_types == str
+    is_too_long = (column[is_string].map(len) > max_length).reindex(column.index, fill_value=False)
+    return column.notna() & (~is_string | is_too_long)
+
+
+def validate_source_file_columnar(source_file: SourceFile) -> ValidationReport:
+    """takes a single source file object and returns the same validation report as validate_source_file_line
+    would produce line by line, but loads the data sheet into a columnar frame once and evaluates each
+    validation rule as a vectorized mask over all the rows"""
+    template = source_file.get_template()
+    positions = source_file_constants.POSITIONS[template]
+    labels = source_file_constants.LABELS[template]
+    attachment_id = source_file.get_attachment_id()
+    created_by = source_file.get_created_by()
+    error_report = ValidationReport(source_file.get_source_file_id(), attachment_id)
+
+    # read each row of the data sheet once (iterating a row strips the whitespace of its values)
+    row_numbers = []
+    records = []
+    for row_data in source_file:
+        row_values = tuple(row_data)[: len(row_data) + 1]
+        row_numbers.append(row_data.row_number)
+        records.append(row_values + (None,) * (len(row_data) + 1 - len(row_values)))
+    if len(records) == 0:
+        return error_report
+
+    frame = pd.DataFrame(records, dtype=object)
+    frame_types = frame.map(type)
+    errors_by_row = {}
+
+    def add_errors(mask, field_name, col_pos, error_msg, column_label, field_value=None, dim_values=None):
+        """creates a DataQualityError for every row flagged by the mask"""
+        for index in np.flatnonzero(mask.to_numpy()):
+            row_num = row_numbers[index]
+            value = frame.iat[index, col_pos] if field_value is None else field_value
+            errors_by_row.setdefault(row_num, []).append(
+                DataQualityError(
+                    field_name,
+                    row_num,
+                    value,
+                    attachment_id,
+                    error_msg.format(
+                        row_number=row_num,
+                        column_label=column_label,
+                        field_value=value,
+                        dim_values=dim_values,
+                    ),
+                    created_by=created_by,
+                )
+            )
+
+    # dim table lookups
+    data_type_col_pos = positions['DATA_TYPE_COL_POS']
+    add_errors(
+        ~frame[data_type_col_pos].isin(dimension_index.get_values("data_type").union(NULL_VALUES)), "Data Type", data_type_col_pos,
+        qc_constants.DATA_TYPE_INVALID_ERROR_MSG, labels['DATA_TYPE_COL_LABEL'],
+        field_value=data_type_col_pos, dim_values=str(list(dimension_index.get_names("data_type")) + list(NULL_VALUES)).replace("'", ""),
+    )
+    for field_name, position_key, label_key, valid_values, error_msg in [
+        ("Sector", 'SECTOR_COL_POS', 'SECTOR_COL_LABEL', dimension_index.get_values("sector"), qc_constants.SECTOR_INVALID_ERROR_MSG),
+        ("Subsector", 'SUBSECTOR_COL_POS', 'SUBSECTOR_COL_LABEL', dimension_index.get_values("subsector"), qc_constants.SUBSECTOR_INVALID_ERROR_MSG),
+        ("Category", 'CATEGORY_COL_POS', 'CATEGORY_COL_LABEL', dimension_index.get_values("category").union(NULL_VALUES), qc_constants.CATEGORY_INVALID_ERROR_MSG),
+        ("Fuel1", 'FUEL1_COL_POS', 'FUEL1_COL_LABEL', dimension_index.get_values("fuel").union(NULL_VALUES), qc_constants.FUEL1_INVALID_ERROR_MSG),
+        ("Fuel2", 'FUEL2_COL_POS', 'FUEL2_COL_LABEL', dimension_index.get_values("fuel").union(NULL_VALUES), qc_constants.FUEL2_INVALID_ERROR_MSG),
+        ("GHG", 'GHG_COL_POS', 'GHG_COL_LABEL', dimension_index.get_ghg_values(), qc_constants.GHG_INVALID_ERROR_MSG),
+    ]:
+        add_errors(
+            ~frame[positions[position_key]].isin(valid_values), field_name, positions[position_key], 
+            error_msg, labels[label_key],
+        )
+
+    # data type and length checks for the remaining emission key columns
+    for field_name, position_key, label_key, max_length, error_msg in [
+        ("Subcategory1", 'SUB_CATEGORY_1_COL_POS', 'SUB_CATEGORY_1_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.SUB_CATEGORY_INVALID_ERROR_MSG),
+        ("Subcategory2", 'SUB_CATEGORY_2_COL_POS', 'SUB_CATEGORY_2_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.SUB_CATEGORY_INVALID_ERROR_MSG),
+        ("Subcategory3", 'SUB_CATEGORY_3_COL_POS', 'SUB_CATEGORY_3_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.SUB_CATEGORY_INVALID_ERROR_MSG),
+        ("Subcategory4", 'SUB_CATEGORY_4_COL_POS', 'SUB_CATEGORY_4_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.SUB_CATEGORY_INVALID_ERROR_MSG),
+        ("Subcategory5", 'SUB_CATEGORY_5_COL_POS', 'SUB_CATEGORY_5_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.SUB_CATEGORY_INVALID_ERROR_MSG),
+        ("Carbon Pool", 'CARBON_POOL_COL_POS', 'CARBON_POOL_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.CARBON_POOL_INVALID_ERROR_MSG),
+        ("GeoRef", 'GEO_REF_COL_POS', 'GEO_REF_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.GEO_REF_INVALID_ERROR_MSG),
+        ("Exclude", 'EXCLUDE_COL_POS', 'EXCLUDE_COL_LABEL', None, qc_constants.EXCLUDE_INVALID_ERROR_MSG),
+        ("CRT Code", 'CRT_CODE_COL_POS', 'CRT_CODE_COL_LABEL', qc_constants.CRT_CODE_MAX_LENGTH, qc_constants.CRT_CODE_INVALID_ERROR_MSG),
+        ("ID", 'ID_COL_POS', 'ID_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.ID_INVALID_ERROR_MSG),
+        ("CBI Activity / Sensitive", 'CBI_ACTIVITY_COL_POS', 'CBI_ACTIVITY_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.CBI_ACTIVITY_INVALID_ERROR_MSG),
+        ("Units", 'UNITS_COL_POS', 'UNITS_COL_LABEL', qc_constants.SUB_CATEGORY_MAX_LENGTH, qc_constants.UNITS_INVALID_ERROR_MSG),
+    ]:
+        col_pos = positions[position_key]
+        if field_name == "Exclude":
+            mask = ~frame[col_pos].isin(["Y", "y", "N", "n", None, "", "NULL"])
+        else:
+            mask = get_invalid_text_mask(frame[col_pos], frame_types[col_pos], max_length)
+        add_errors(mask, field_name, col_pos, error_msg, labels[label_key])
+
+    # check ghg category length
+    if template == 3:
+        ghg_cat_pos = positions['GHG_CATEGORY_COL_POS']
+        ghg_categories = frame[ghg_cat_pos][frame_types[ghg_cat_pos] == str] # non-text cells (e.g. numbers or dates) have no length to check
+        add_errors(
+            (ghg_categories.map(len) > qc_constants.GHG_CATEGORY_MAX_LENGTH).reindex(frame.index, fill_value=False),
+            "GHG Category", ghg_cat_pos, qc_constants.GHG_CATEGORY_INVALID_ERROR_MSG, labels['GHG_CATEGORY_COL_LABEL'],
+        )
+
+    # check gwp data type
+    gwp_col_pos = positions['GWP_COL_POS']
+    add_errors(
+        ~frame[gwp_col_pos].isin([None, "NULL"]) & ~frame_types[gwp_col_pos].isin([int, float, bool]),
+        "GWP", gwp_col_pos, qc_constants.GWP_INVALID_ERROR_MSG, labels['GWP_COL_LABEL'],
+    )
+
+    # year values must be non-null: numeric or from list constants.YEAR_ALPHA_VALUES
+    first_year_col_pos = source_file_constants.INFO[template]['NUM_EMISSION_KEY_COLUMNS']
+    year_frame = frame.iloc[:, first_year_col_pos:]
+    invalid_years = ~(frame_types.iloc[:, first_year_col_pos:].isin([int, float, bool]) | year_frame.isin(qc_constants.YEAR_ALPHA_VALUES))
+    year_dim_values = str(qc_constants.YEAR_ALPHA_VALUES).replace("'", "")
+    for index, i in zip(*np.nonzero(invalid_years.to_numpy())):
+        row_num = row_numbers[index]
+        value = year_frame.iat[index, i]
+        errors_by_row.setdefault(row_num, []).append(
+            DataQualityError(
+                f"{1990 + i}",
+                row_num,
+                value,
+                attachment_id,
+                qc_constants.YEAR_INVALID_ERROR_MSG.format(
+                    row_number=row_num,
+                    column_label=get_column_letter(positions['Y1990_COL_POS'] + 1 + i),
+                    field_value=value,
+                    dim_values=year_dim_values,
+                ),
+                created_by=created_by,
+            )
+        )
+
+    for row_num in sorted(errors_by_row.keys()):
+        error_report.add_row(errors_by_row[row_num])
+    return error_report
+
+
 def validate_source_file(source_file: SourceFile) -> ValidationReport:
     """takes a single source file object an returns a validation report object containing 
     information on the validation errors found within the source file's contents"""
-    if invdb_globals.allow_multithreading:
+    if invdb_globals.source_file_validation_engine == "columnar":
+    # =================== columnar (vectorized) version ========================
+        error_report = validate_source_file_columnar(source_file)
     # =================== multi-threaded version ========================
+    elif invdb_globals.allow_multithreading:
         with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
             futures = []
             for row_data in source_file:
@@ -558,36 +685,112 @@ def validate_source_file(source_file: SourceFile) -> ValidationReport:
     return error_report
 
 
-def execute_batch_source_file_validation(source_files: [SourceFile]) -> BatchValidationReport:
+def validate_single_source_file(source_file: SourceFile, file_dimension_index=None) -> ValidationReport:
+    """opens and validates a single source file, returning its validation report with a "SUCCESS" 
+    result, or an empty report with a "FAILED" result if the validation process raised an error.
+    file_dimension_index: the dim table lookup index to validate against, passed in by the caller
+    when this runs in a worker process (which must not use the database, see get_executor)"""
+    global dimension_index
+    if file_dimension_index is not None:
+        dimension_index = file_dimension_index
+    try:
+        with source_file as opened_source_file: #this can raise Errors
+            source_file_validation_report = validate_source_file(opened_source_file) # this is can raise Errors
+            source_file_validation_report.set_validation_result("SUCCESS") #this can raise ValueError
+            helpers.tprint(
+                f"Done validating attachment ID {source_file.get_attachment_id()}. ({len(source_file_validation_report.generate_error_list())} {helpers.plurality_agreement('error', 'errors', len(source_file_validation_report.generate_error_list()))} found)"
+            )
+            return source_file_validation_report
+    except Exception as e:
+        traceback_obj = traceback.format_exc()
+        helpers.tprint(
+            f"Failed to validate source file with attachment ID: {source_file.get_attachment_id()}. Refer to traceback below:"
+        )
+        helpers.tprint(traceback_obj)
+        failed_source_file_validation_report = ValidationReport(
+            source_file.get_source_file_id(), source_file.get_attachment_id()
+        )
+        failed_source_file_validation_report.set_validation_result("FAILED")
+        return failed_source_file_validation_report
+
+
+def estimate_validation_memory(source_file: SourceFile) -> int:
+    """returns a rough estimate of the memory (in bytes) needed to validate the source file"""
+    return source_file.get_content_size() * source_file_constants.VALIDATION_MEMORY_PER_CONTENT_BYTE
+
+
+def execute_batch_source_file_validation(source_files: [SourceFile], this_job: Job_Class = None) -> BatchValidationReport:
     """takes a list of source files and generates a batch validation report, which has the
-    validation reports for all source files passed in the input"""
-    # iterate through the source files, generate the validation report for it, and add it to the batch validation report
+    validation reports for all source files passed in the input. 
+    The files are validated concurrently on the configured executor (see invdb_globals.executor_type), 
+    with at most invdb_globals.source_file_validation_max_workers files at a time and only as many as 
+    fit in invdb_globals.source_file_validation_memory_budget_mb (a file that exceeds the budget on its 
+    own is validated by itself). Each report is added to the batch report as soon as its file is done,
+    and the progress is posted to this_job (if given).
+    Files whose content, template and dim tables are unchanged since they were last validated reuse
+    the stored report from validation_result_cache instead of being validated again."""
     redefine_globals()
     batch_validation_report = BatchValidationReport()
-    for source_file, i in zip(source_files, range(1, len(source_files) + 1)):
+    max_workers = invdb_globals.source_file_validation_max_workers or os.cpu_count()
+    memory_budget = invdb_globals.source_file_validation_memory_budget_mb * 1024 * 1024
+    running = {} # future -> estimated memory of its source file
+    memory_in_use = 0
+    done_count = 0
+
+    def report_progress(source_file_validation_report: ValidationReport) -> None:
+        nonlocal done_count
+        batch_validation_report.add_report(source_file_validation_report)
+        done_count += 1
+        if this_job is not None:
+            this_job.post_event(
+                "SOURCE_FILE_VALIDATION",
+                "VALIDATED_FILE",
+                source_file_validation_report.get_attachment_id(),
+                done_count,
+                len(source_files),
+            )
+
+    # reuse the reports of unchanged source files
+    cache_keys = {} # future -> cache key of its source file
+    pending_source_files = []
+    for source_file in source_files:
+        cache_key = ValidationResultCache.get_key(source_file, dimension_index)
+        cached_validation_report = validation_result_cache.get(cache_key, source_file)
+        if cached_validation_report is None:
+            pending_source_files.append((source_file, cache_key))
+            continue
         helpers.tprint(
-            f"Validating source file with attachment ID {source_file.get_attachment_id()}. (file {i} of {len(source_files)})"
+            f"Reusing the validation report of unchanged source file with attachment ID {source_file.get_attachment_id()}. ({len(cached_validation_report.generate_error_list())} {helpers.plurality_agreement('error', 'errors', len(cached_validation_report.generate_error_list()))} found)"
         )
-        # open the source file for reading and generate the validation report
-        try:
-            with source_file as opened_source_file: #this can raise Errors
-                source_file_validation_report = validate_source_file(opened_source_file) # this is can raise Errors
-                source_file_validation_report.set_validation_result("SUCCESS") #this can raise ValueError
-                batch_validation_report.add_report(source_file_validation_report)
+        report_progress(cached_validation_report)
+    pending_source_files.reverse() # popped from the end, so files are started in input order
+    file_count = len(pending_source_files)
+
+    with executors.get_executor(max_workers) as executor:
+        while pending_source_files or running:
+            # start as many files as the worker count and memory budget allow
+            while (
+                pending_source_files 
+                and len(running) < max_workers 
+                and (len(running) == 0 or memory_in_use + estimate_validation_memory(pending_source_files[-1][0]) <= memory_budget)
+            ):
+                source_file, cache_key = pending_source_files.pop()
                 helpers.tprint(
-                    f"Done. ({len(source_file_validation_report.generate_error_list())} {helpers.plurality_agreement('error', 'errors', len(source_file_validation_report.generate_error_list()))} found)"
+                    f"Validating source file with attachment ID {source_file.get_attachment_id()}. (file {file_count - len(pending_source_files)} of {file_count})"
                 )
-        except Exception as e:
-            traceback_obj = traceback.format_exc()
-            helpers.tprint(
-                f"Failed to validate source file with attachment ID: {source_file.get_attachment_id()}. Refer to traceback below:"
-            )
-            failed_source_file_validation_report = ValidationReport(
-                source_file.get_source_file_id(), source_file.get_attachment_id()
-            )
-            failed_source_file_validation_report.set_validation_result("FAILED")
-            batch_validation_report.add_report(failed_source_file_validation_report)
-            helpers.tprint(traceback_obj)
+                future = executor.submit(validate_single_source_file, source_file, dimension_index)
+                cache_keys[future] = cache_key
+                running[future] = estimate_validation_memory(source_file)
+                memory_in_use += running[future]
+
+            # merge the reports of the files that finished
+            finished_futures, _ = wait(running.keys(), return_when=FIRST_COMPLETED)
+            for future in finished_futures:
+                memory_in_use -= running.pop(future)
+                source_file_validation_report = future.result()
+                if source_file_validation_report.get_validation_result() == source_file_constants.VALIDATION_RESULTS["SUCCESS"]:
+                    validation_result_cache.put(cache_keys.pop(future), source_file_validation_report)
+                report_progress(source_file_validation_report)
 
     return batch_validation_report
 
@@ -616,7 +819,7 @@ def handle_source_file_validation_request(reporting_year: int,   layer_id: int,
             return jsonify({"result": result_str}), 200
 
         helpers.tprint(f"\tSource files found: {source_files}\n")
-        batch_validation_report = execute_batch_source_file_validation(source_files)
+        batch_validation_report = execute_batch_source_file_validation(source_files, this_job)
         helpers.tprint(f"The results are:\n{batch_validation_report}")
         source_file_ids = [
             source_file.get_source_file_id() for source_file in source_files
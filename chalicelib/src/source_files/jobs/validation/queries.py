@@ -1,10 +1,12 @@
 from chalicelib.src.general.models.BatchValidationReport import *
 import chalicelib.src.database.constants as db_constants
 import chalicelib.src.source_files.constants as qc_constants
+import chalicelib.src.general.qc_constants as general_qc_constants
 import chalicelib.src.database.methods as db_methods
 from chalicelib.src.source_files.models.SourceFile import SourceFile
 import chalicelib.src.general.globals as globals
 import chalicelib.src.general.helpers as helpers
+from psycopg2.extras import execute_values
 import os
 
 pgdb_connection = db_methods.get_pgdb_connection()
@@ -58,7 +60,8 @@ def fetch_unvalidated_source_files(reporting_year: int, layer_id: int, ids: [int
                 reporting_year,
                 created_by=source_file[1],
                 read_only=True,
-                extension=extension
+                extension=extension,
+                streaming=True
             )
         )
     return source_files
@@ -118,35 +121,48 @@ def batch_update_attachment_has_errors_flags(batch_validation_report: BatchValid
         raise error from None
 
 
+def format_validation_log_row(error: tuple) -> tuple:
+    """returns the validation_log_load parameters for an error tuple of ValidationReport.generate_error_list().
+    The field value is logged as text, cut off at general_qc_constants.VALIDATION_LOG_FIELD_VALUE_MAX_LENGTH"""
+    field_value = str(error[2])
+    if len(field_value) >= general_qc_constants.VALIDATION_LOG_FIELD_VALUE_MAX_LENGTH:
+        field_value = f"{field_value[0:general_qc_constants.VALIDATION_LOG_FIELD_VALUE_MAX_LENGTH - 3]}..."
+    return (error[0], error[1], field_value, error[3], error[4], error[5])
+
+
 def batch_update_validation_logs(batch_validation_report: BatchValidationReport) -> None:
     """add a row into the validation_log_load table of the database for each 
-    validation error contained in the input batch validation report"""
-    new_validation_logs = batch_validation_report.generate_error_list()
+    validation error contained in the input batch validation report.
+    The rows are sent as parameterized INSERTs of globals.validation_log_insert_page_size rows each.
+    If globals.validation_log_max_errors_per_field is set, only that many errors are logged per field 
+    of each source file, followed by a summary row (see ValidationReport.generate_error_list)"""
+    # generated one report at a time, so the full list of formatted rows is never held in memory
+    new_validation_logs = (
+        format_validation_log_row(error)
+        for validation_report in batch_validation_report
+        for error in validation_report.generate_error_list(globals.validation_log_max_errors_per_field)
+    )
 
     # delete the old rows validation logs from the validation_log_load table for the same source files
     try:
         cursor = pgdb_connection.cursor()
         cursor.execute(
             f"""DELETE FROM {db_constants.DB_TABLES['VALIDATION_LOG_LOAD']} 
-              WHERE attachment_id IN ({str(batch_validation_report.reports.keys())[11:-2]});"""
+              WHERE attachment_id = ANY(%s);""",
+            (list(batch_validation_report.reports.keys()),)
         )
 
         # add the new validation error logs if there are any
-        if len(new_validation_logs) > 0:
-            # create the SQL literal string for all the new rows
-            values_string = ", ".join(
-                [
-                    f"""({error[0]}, '{error[1]}', '{error[2] if not (isinstance(error[2], str) and len(error[2]) >= 250) else f"{error[2][0:247]}..."}', {error[3]}, '{error[4]}', LOCALTIMESTAMP(6), {error[5] if error[5] is not None else 'NULL'})"""
-                    for error in new_validation_logs
-                ]
-            )
-            # insert the new rows into the validation log load table
-            cursor.execute(
-                f"""INSERT INTO {db_constants.DB_TABLES['VALIDATION_LOG_LOAD']} (attachment_id, field_name, field_value, 
-                                                                                row_number, description, created_date, 
-                                                                                created_user_id) 
-                    VALUES {values_string};"""
-            )
+        execute_values(
+            cursor,
+            f"""INSERT INTO {db_constants.DB_TABLES['VALIDATION_LOG_LOAD']} (attachment_id, field_name, field_value, 
+                                                                            row_number, description, created_date, 
+                                                                            created_user_id) 
+                VALUES %s;""",
+            new_validation_logs,
+            template="(%s, %s, %s, %s, %s, LOCALTIMESTAMP(6), %s)",
+            page_size=globals.validation_log_insert_page_size,
+        )
 
         pgdb_connection.commit()
     except Exception as error:
@@ -10,6 +10,7 @@ import os
 import tempfile
 import csv
 import json
+import hashlib
 
 def strip_whitespace(value):
     """strip all trailing and leading whitespace from read string values. 
@@ -93,6 +94,45 @@ class SourceFileRow:
         return f"<SourceFileRow Object: {[cell.value for cell in self._sheet[self.row_number][: self._width + 1]]}>"
 
 
+class StreamedSourceFileRow:
+    """immutable, tuple-backed row produced by a streaming (read_only) source file. 
+    The cell values are read once from the sheet, so no per-cell sheet access or copying is needed."""
+    __slots__ = ("row_number", "_values", "_width")
+
+    def __init__(self, values, row_number, width):
+        # pad short rows so every emission key and year column can be indexed
+        if len(values) <= width:
+            values = tuple(values) + (None,) * (width + 1 - len(values))
+        self._values = values
+        self.row_number = row_number
+        self._width = width
+
+    def __getitem__(self, slice_obj):
+        if isinstance(slice_obj, slice):
+            start = 1 if slice_obj.start is None else slice_obj.start
+            stop = self._width + 1 if slice_obj.stop is None else slice_obj.stop
+            return list(self._values[start:stop:slice_obj.step])
+        else:  # if only retrieving one element
+            try:
+                return strip_whitespace(self._values[slice_obj])
+            except IndexError:
+                return None
+
+    def __setitem__(self, slice_obj, value):
+        raise PermissionError(
+            f"{full_class_name(self)}.__setitem__: cannot mutate cells of a read only source file object."
+        )
+
+    def __iter__(self):
+        yield from [strip_whitespace(value) for value in self._values[: self._width + 1]]
+
+    def __len__(self):
+        return self._width
+
+    def __repr__(self):
+        return f"<StreamedSourceFileRow Object: {list(self._values[: self._width + 1])}>"
+
+
 class SourceFile:
     def __init__(
         self,
@@ -105,14 +145,20 @@ class SourceFile:
         read_only=False,
         source_file_name=None,
         extension=None,
-        layer_id=None
+        layer_id=None,
+        streaming=False
     ):
+        if streaming and not read_only:
+            raise ValueError(
+                f"{full_class_name(self)}.__init__: only read only source files can be opened in streaming mode."
+            )
         self._source_file_id = source_file_id
         self._attachment_id = attachment_id
         self._content = content
         self._max_time_series = max_time_series
         self._created_by = created_by
         self._is_read_only = read_only
+        self._is_streaming = streaming
         self.source_file_name = source_file_name
         self._reporting_year = reporting_year
         self._template = source_file_constants.TEMPLATE(reporting_year)
@@ -142,6 +188,14 @@ class SourceFile:
     def get_template(self):
         return self._template
 
+    def get_content_size(self):
+        """returns the size of the source file's (compressed) content in bytes"""
+        return len(self._content) if self._content is not None else 0
+
+    def get_content_digest(self):
+        """returns the SHA-256 hex digest of the source file's content"""
+        return hashlib.sha256(self._content if self._content is not None else b"").hexdigest()
+
     def get_max_time_series(self):
         return self._max_time_series
 
@@ -151,8 +205,30 @@ class SourceFile:
     def is_read_only(self):
         return self._is_read_only
 
+    def is_streaming(self):
+        return self._is_streaming
+
     def get_source_name_id(self):
         return self._source_name_id
+
+    def get_streaming_copy(self):
+        """returns a read only, streaming SourceFile over the same content, so the data rows can be 
+        read once without loading (or altering) the workbook of this source file"""
+        streaming_copy = SourceFile(
+            self._source_file_id,
+            self._attachment_id,
+            self._content,
+            self._max_time_series,
+            self._reporting_year,
+            created_by=self._created_by,
+            read_only=True,
+            source_file_name=self.source_file_name,
+            extension=self._extension,
+            layer_id=self._layer_id,
+            streaming=True
+        )
+        streaming_copy.set_source_name_id(self._source_name_id)
+        return streaming_copy
     
     def set_source_name_id(self, id: int):
         self._source_name_id = id
@@ -312,7 +388,9 @@ class SourceFile:
                 f"{full_class_name(self)}.__iter__: a source file must be opened before it can be iterated."
             )
         row_num = 1
-        for row in self._sheet.iter_rows(values_only=True, max_row=self._sheet.max_row):
+        # streaming files are read once with their values bound to the rows, so cap the columns at the row width
+        max_col = self._width + 1 if self._is_streaming else None
+        for row in self._sheet.iter_rows(values_only=True, max_row=self._sheet.max_row, max_col=max_col):
             if row_num < source_file_constants.INFO[self.get_template()]['FIRST_DATA_ROW']:
                 row_num += 1
                 continue
@@ -327,7 +405,10 @@ class SourceFile:
                     row_num += 1
                     continue
             # return the next row
-            yield SourceFileRow(self._sheet, row_num, self._width, self._is_read_only)
+            if self._is_streaming:
+                yield StreamedSourceFileRow(row, row_num, self._width)
+            else:
+                yield SourceFileRow(self._sheet, row_num, self._width, self._is_read_only)
             row_num += 1
 
     def __getitem__(self, row):
@@ -340,6 +421,11 @@ class SourceFile:
             raise TypeError(
                 f"{full_class_name(self)}.__getitem__: a source file indexes must be integers"
             )
+        if self._is_streaming:
+            # random access is supported, but each lookup re-reads the sheet up to the requested row
+            for values in self._sheet.iter_rows(min_row=row, max_row=row, max_col=self._width + 1, values_only=True):
+                return StreamedSourceFileRow(values, row, self._width)
+            return StreamedSourceFileRow((), row, self._width)
         return SourceFileRow(self._sheet, row, self._width, self._is_read_only)
 
     def __setitem__(self, _):
@@ -364,7 +450,8 @@ class SourceFile:
             elif self.get_extension() == ".json":
                 self.prepare_json()
             else:
-                self._workbook = load_workbook(self._temp_file.name, data_only=True)
+                # streaming files are parsed lazily row by row instead of materializing the whole workbook
+                self._workbook = load_workbook(self._temp_file.name, read_only=self._is_streaming, data_only=True)
                 sheet_name = sheet_name or source_file_constants.SOURCE_FILE_DATA_SHEET_NAME
                 found_sheet_name = self.get_sheet_name_if_exists(sheet_name)
                 if found_sheet_name is None:
@@ -381,7 +468,8 @@ class SourceFile:
     def __exit__(self, exc_type, exc_value, traceback):
         try:
             if self._workbook is not None:
-                self._workbook.save(self._temp_file.name)
+                if not self._workbook.read_only: # openpyxl cannot save workbooks loaded in read_only mode
+                    self._workbook.save(self._temp_file.name)
                 self._workbook.close()
                 self._is_open = False
         except Exception as e:
@@ -395,5 +483,12 @@ class SourceFile:
         # if self._temp_file is not None and os.path.exists(self._temp_file.name):
         #     os.remove(self._temp_file.name)
 
+    def __getstate__(self):
+        """only the (closed) source file's content and metadata are pickled, e.g. when a source file
+        is sent to a worker process. The workbook is re-opened from the content on the other side"""
+        state = self.__dict__.copy()
+        state.update({"_workbook": None, "_sheet": None, "_temp_file": None, "_is_open": False})
+        return state
+
     def __repr__(self):
         return f"""<SourceFile Object: source file ID: {self._source_file_id}, attachment ID: {self._attachment_id}>"""
@@ -1,6 +1,7 @@
 from chalicelib.src.source_files.models.DataQualityError import DataQualityError
 from chalicelib.src.general.helpers import full_class_name
 import chalicelib.src.source_files.constants as qc_constants
+import chalicelib.src.general.qc_constants as general_qc_constants
 import chalicelib.src.general.helpers as helpers
 
 class ValidationReport:
@@ -37,11 +38,25 @@ class ValidationReport:
         """adds all the errors from another ValidationReport to this object"""
         self.errors.update(input_validation_report.errors)
 
-    def generate_error_list(self) -> [tuple]:
-        """returns a list of tuples. Each tuple is used to populate a row in the validation_log_load table"""
+    def generate_error_list(self, max_errors_per_field: int = None) -> [tuple]:
+        """returns a list of tuples. Each tuple is used to populate a row in the validation_log_load table.
+        If max_errors_per_field is given, only the first max_errors_per_field errors of each field are
+        listed, followed by one summary tuple per field that counts the errors left out. A row with
+        errors always keeps at least one of them, since the load job skips the rows found in the log"""
         validation_logs = []
+        logged_counts = {}
+        omitted_errors = {}  # field_name -> [omitted error count, first row number, last row number]
         for row_num in self.errors.keys():
-            for error in self.errors[row_num]:
+            row_is_logged = False
+            for position, error in enumerate(self.errors[row_num]):
+                if max_errors_per_field is not None and logged_counts.get(error.field_name, 0) >= max_errors_per_field:
+                    if row_is_logged or position < len(self.errors[row_num]) - 1:
+                        omitted = omitted_errors.setdefault(error.field_name, [0, row_num, row_num])
+                        omitted[0] += 1
+                        omitted[2] = row_num
+                        continue
+                logged_counts[error.field_name] = logged_counts.get(error.field_name, 0) + 1
+                row_is_logged = True
                 validation_logs.append(
                     (
                         error.attachment_id,
@@ -52,6 +67,24 @@ class ValidationReport:
                         error.created_by,
                     )
                 )
+
+        for field_name, (error_count, first_row_num, last_row_num) in omitted_errors.items():
+            created_by = self.errors[first_row_num][0].created_by
+            validation_logs.append(
+                (
+                    self._attachment_id,
+                    field_name,
+                    error_count,
+                    first_row_num,
+                    general_qc_constants.VALIDATION_LOG_SUMMARY_MSG.format(
+                        error_count=error_count,
+                        field_name=field_name,
+                        first_row_number=first_row_num,
+                        last_row_number=last_row_num,
+                    ),
+                    created_by,
+                )
+            )
         return validation_logs
 
     def get_id(self):
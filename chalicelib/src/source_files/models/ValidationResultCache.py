@@ -0,0 +1,79 @@
+from chalicelib.src.source_files.models.ValidationReport import ValidationReport
+from chalicelib.src.source_files.models.DataQualityError import DataQualityError
+from collections import OrderedDict
+import threading
+
+"""in-process store of source file validation results, keyed by a digest of everything the validation
+depends on: the attachment content, the template, the time series width and the dim table values.
+Re-uploads of an identical attachment (or re-runs of the same file) are served from the store
+instead of being validated again. The least recently used entries are dropped once it is full"""
+class ValidationResultCache:
+
+    def __init__(self, max_entries: int):
+        """max_entries: the number of validation results kept (0 disables the cache)"""
+        self._max_entries = max_entries
+        self._entries = OrderedDict()  # key -> ((field_name, row_number, field_value, description, created_date), ...)
+        self._lock = threading.Lock()
+        self._statistics = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def get_key(source_file, dimension_index) -> tuple:
+        """returns the cache key of the source file when validated against the dimension index"""
+        return (
+            source_file.get_content_digest(),
+            source_file.get_extension(),
+            source_file.get_template(),
+            source_file.get_max_time_series(),
+            dimension_index.get_fingerprint(),
+        )
+
+    def get(self, key, source_file) -> ValidationReport:
+        """returns a "SUCCESS" validation report for the source file rebuilt from the stored errors,
+        or None if nothing is stored under the key"""
+        with self._lock:
+            errors = self._entries.get(key)
+            if errors is None:
+                self._statistics["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._statistics["hits"] += 1
+
+        # the errors are stamped with the attachment and author of the file being validated now
+        validation_report = ValidationReport(source_file.get_source_file_id(), source_file.get_attachment_id())
+        for field_name, row_number, field_value, description, created_date in errors:
+            validation_report.errors.setdefault(row_number, []).append(
+                DataQualityError(
+                    field_name,
+                    row_number,
+                    field_value,
+                    source_file.get_attachment_id(),
+                    description,
+                    created_date,
+                    source_file.get_created_by(),
+                )
+            )
+        validation_report.set_validation_result("SUCCESS")
+        return validation_report
+
+    def put(self, key, validation_report: ValidationReport) -> None:
+        """stores the errors of a validation report that ran to completion under the key"""
+        if self._max_entries <= 0:
+            return
+        errors = tuple(
+            (error.field_name, error.row_number, error.field_value, error.description, error.created_date)
+            for row_errors in validation_report.errors.values()
+            for error in row_errors
+        )
+        with self._lock:
+            self._entries[key] = errors
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def get_statistics(self) -> dict:
+        """returns the hit/miss counters and the number of stored validation results"""
+        with self._lock:
+            return {**self._statistics, "entries": len(self._entries)}
+
+    def __repr__(self):
+        return f"<ValidationResultCache Object: {self.get_statistics()}>"